@@ -43,11 +43,18 @@ from blueprints.nooks_club.routes import nooks_club_bp
 from blueprints.mini_modules.routes import mini_modules_bp
 from blueprints.analytics import analytics_bp, configure_cache
 from blueprints.donations.routes import donations_bp
+from blueprints.integrations.payment import DEFAULT_BASE_URL, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES
 from blueprints.testimonials.routes import testimonials_bp
 
 # Import breadcrumb helper
 from utils.breadcrumbs import register_breadcrumbs
 
+# Import static asset fingerprinting and service worker
+from utils.assets import register_assets
+
+# Import background job worker
+from utils.jobs import init_job_worker
+
 # Configure logging
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
@@ -70,6 +77,17 @@ def create_app():
     app.config['WTF_CSRF_TIME_LIMIT'] = 7200
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
     app.config['CACHE_TYPE'] = 'simple'
+    app.config['JOB_WORKER_ENABLED'] = os.environ.get('JOB_WORKER_ENABLED', 'true').lower() == 'true'
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+    # Shared with the Socket.IO server so web workers can push to its clients
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    # Opay checkout; OPAY_MERCHANT_KEY is the name used in older deployments
+    app.config['OPAY_API_KEY'] = os.environ.get('OPAY_API_KEY') or os.environ.get('OPAY_MERCHANT_KEY')
+    app.config['OPAY_SECRET_KEY'] = os.environ.get('OPAY_SECRET_KEY')
+    app.config['OPAY_BASE_URL'] = os.environ.get('OPAY_BASE_URL', DEFAULT_BASE_URL)
+    app.config['OPAY_CONNECT_TIMEOUT'] = float(os.environ.get('OPAY_CONNECT_TIMEOUT', CONNECT_TIMEOUT))
+    app.config['OPAY_READ_TIMEOUT'] = float(os.environ.get('OPAY_READ_TIMEOUT', READ_TIMEOUT))
+    app.config['OPAY_MAX_RETRIES'] = int(os.environ.get('OPAY_MAX_RETRIES', MAX_RETRIES))
     
     # Initialize MongoDB Client
     client = MongoClient(app.config['MONGO_URI'])
@@ -110,6 +128,8 @@ def create_app():
     
     # Initialize CSRF protection
     csrf = CSRFProtect(app)
+    # Payment provider webhooks are authenticated by their signature instead
+    csrf.exempt('blueprints.donations.routes.payment_callback')
     
     # Initialize Flask-Caching for analytics blueprint
     configure_cache(app)
@@ -117,6 +137,9 @@ def create_app():
     # Register breadcrumb helper
     register_breadcrumbs(app)
     
+    # Fingerprint static assets and serve the service worker
+    register_assets(app)
+    
     # Debug MongoDB connection
     @app.route('/debug_mongo')
     def debug_mongo():
@@ -183,6 +206,9 @@ def create_app():
     with app.app_context():
         DatabaseManager.initialize_database()
     
+    # Start background job worker
+    init_job_worker(app)
+    
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(general_bp, url_prefix='/general')
@@ -0,0 +1,300 @@
+from flask import current_app
+from datetime import datetime, timedelta
+from array import array
+from utils.jobs import register_job, JobQueue
+import numpy as np
+import json
+import os
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Event types stored in the type column
+SIGNUP = 0
+READING = 1
+TASK = 2
+POINTS = 3
+BOOK_ADDED = 4
+ACTIVE_TYPES = [READING, TASK, POINTS, BOOK_ADDED]
+
+COLUMNS = ['user', 'day', 'type', 'value']
+SNAPSHOT_MAX_AGE_HOURS = 6
+RETENTION_WEEKS = 12
+PERCENTILES = [50, 75, 90, 99]
+
+
+def get_analytics_folder():
+    """Directory holding columnar analytics snapshots"""
+    folder = current_app.config.get('ANALYTICS_FOLDER') or os.path.join(current_app.instance_path, 'analytics')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _day(value):
+    """Proleptic ordinal day of a datetime, or None"""
+    return value.toordinal() if isinstance(value, datetime) else None
+
+
+def _date_id(day):
+    """The {'year', 'month', 'day'} group key the admin charts already use"""
+    date = datetime.fromordinal(int(day))
+    return {'year': date.year, 'month': date.month, 'day': date.day}
+
+
+class CohortEngine:
+    """Admin analytics computed with NumPy from a columnar snapshot of the main collections.
+
+    A background job streams users, daily rollups and books into four
+    parallel columns (user index, day, event type, value) saved as .npy
+    files. Pages memory-map the latest snapshot and compute everything
+    vectorized instead of running collection-wide $group scans per view.
+    """
+
+    _loaded = {}
+
+    @staticmethod
+    def _pointer_path():
+        return os.path.join(get_analytics_folder(), 'current.json')
+
+    @staticmethod
+    def extract(job=None):
+        """Build a new snapshot and make it current, returns its name"""
+        db = current_app.mongo.db
+        users = {}
+        columns = {'user': array('i'), 'day': array('i'), 'type': array('b'), 'value': array('d')}
+
+        def add(user, day, event_type, value):
+            columns['user'].append(user)
+            columns['day'].append(day)
+            columns['type'].append(event_type)
+            columns['value'].append(value)
+
+        if job:
+            job.update_progress(0, 4, 'Extracting users')
+        for user in db.users.find({}, {'created_at': 1}).sort('_id', 1).batch_size(1000):
+            users[user['_id']] = len(users)
+            day = _day(user.get('created_at'))
+            if day is not None:
+                add(users[user['_id']], day, SIGNUP, 1)
+
+        if job:
+            job.update_progress(1, 4, 'Extracting daily activity')
+        for rollup in db.daily_rollups.find({}, {'user_id': 1, 'day': 1, 'pages': 1, 'tasks': 1, 'points': 1}).batch_size(1000):
+            user = users.get(rollup['user_id'])
+            if user is None:
+                continue
+            day = datetime.strptime(rollup['day'], '%Y-%m-%d').toordinal()
+            if rollup.get('pages'):
+                add(user, day, READING, rollup['pages'])
+            if rollup.get('tasks'):
+                add(user, day, TASK, rollup['tasks'])
+            if rollup.get('points'):
+                add(user, day, POINTS, rollup['points'])
+
+        if job:
+            job.update_progress(2, 4, 'Extracting books')
+        for book in db.books.find({}, {'user_id': 1, 'added_at': 1}).batch_size(1000):
+            user = users.get(book.get('user_id'))
+            day = _day(book.get('added_at'))
+            if user is not None and day is not None:
+                add(user, day, BOOK_ADDED, 1)
+
+        if job:
+            job.update_progress(3, 4, 'Writing snapshot')
+        name = datetime.utcnow().strftime('snapshot_%Y%m%d_%H%M%S')
+        folder = get_analytics_folder()
+        path = os.path.join(folder, name)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'user.npy'), np.frombuffer(columns['user'], dtype=np.int32))
+        np.save(os.path.join(path, 'day.npy'), np.frombuffer(columns['day'], dtype=np.int32))
+        np.save(os.path.join(path, 'type.npy'), np.frombuffer(columns['type'], dtype=np.int8))
+        np.save(os.path.join(path, 'value.npy'), np.frombuffer(columns['value'], dtype=np.float64))
+
+        # Categorical breakdowns do not fit the numeric columns, store them precomputed
+        meta = {
+            'name': name,
+            'created_at': datetime.utcnow().isoformat(),
+            'user_count': len(users),
+            'event_count': len(columns['type']),
+            'reward_analytics': CohortEngine._reward_breakdowns(),
+            'popular_content': CohortEngine._popular_content()
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, default=str)
+
+        pointer = CohortEngine._pointer_path()
+        previous = CohortEngine._current_name()
+        with open(pointer + '.tmp', 'w') as f:
+            json.dump({'name': name}, f)
+        os.replace(pointer + '.tmp', pointer)
+
+        if previous and previous != name:
+            shutil.rmtree(os.path.join(folder, previous), ignore_errors=True)
+
+        if job:
+            job.update_progress(4, 4, 'Done')
+        return name
+
+    @staticmethod
+    def _reward_breakdowns():
+        def by(field):
+            return list(current_app.mongo.db.rewards.aggregate([
+                {'$group': {'_id': f'${field}', 'total_points': {'$sum': '$points'}, 'count': {'$sum': 1}}}
+            ]))
+        return {'points_by_source': by('source'), 'points_by_category': by('category')}
+
+    @staticmethod
+    def _popular_content():
+        popular_books = list(current_app.mongo.db.books.aggregate([
+            {'$group': {'_id': '$title', 'count': {'$sum': 1}, 'avg_rating': {'$avg': '$rating'}}},
+            {'$sort': {'count': -1}},
+            {'$limit': 10}
+        ]))
+        popular_authors = list(current_app.mongo.db.books.aggregate([
+            {'$unwind': '$authors'},
+            {'$group': {'_id': '$authors', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}},
+            {'$limit': 10}
+        ]))
+        return {'popular_books': popular_books, 'popular_authors': popular_authors}
+
+    @staticmethod
+    def _current_name():
+        try:
+            with open(CohortEngine._pointer_path()) as f:
+                return json.load(f)['name']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @staticmethod
+    def load():
+        """Memory-map the current snapshot, returns (columns, meta) or (None, None)"""
+        name = CohortEngine._current_name()
+        if not name:
+            return None, None
+        if name not in CohortEngine._loaded:
+            path = os.path.join(get_analytics_folder(), name)
+            try:
+                columns = {column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode='r') for column in COLUMNS}
+                with open(os.path.join(path, 'meta.json')) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error loading analytics snapshot {name}: {str(e)}")
+                return None, None
+            meta['results'] = CohortEngine.compute(columns, meta['user_count'])
+            CohortEngine._loaded = {name: (columns, meta)}
+        return CohortEngine._loaded[name]
+
+    @staticmethod
+    def is_stale(meta):
+        if not meta:
+            return True
+        created_at = datetime.fromisoformat(meta['created_at'])
+        return datetime.utcnow() - created_at > timedelta(hours=SNAPSHOT_MAX_AGE_HOURS)
+
+    @staticmethod
+    def schedule_refresh(created_by=None):
+        """Queue a snapshot unless one is already pending or running"""
+        if current_app.mongo.db.jobs.find_one({'job_type': 'analytics_snapshot', 'status': {'$in': ['pending', 'running']}}):
+            return None
+        job_id, _ = JobQueue.enqueue('analytics_snapshot', {}, created_by=created_by, max_attempts=1)
+        return job_id
+
+    @staticmethod
+    def compute(columns, user_count):
+        """All admin analytics from the snapshot columns"""
+        user = np.asarray(columns['user'])
+        day = np.asarray(columns['day'])
+        kind = np.asarray(columns['type'])
+        value = np.asarray(columns['value'])
+        today = datetime.utcnow().toordinal()
+
+        signup = kind == SIGNUP
+        signup_day = np.full(user_count, -1, dtype=np.int64)
+        signup_day[user[signup]] = day[signup]
+
+        active = np.isin(kind, ACTIVE_TYPES)
+        active_user = user[active]
+        active_day = day[active]
+
+        def daily(mask, days=30, weighted=False):
+            # Weighted sums event values, e.g. the tasks of each user-day rollup
+            start = today - days
+            selected = mask & (day > start) & (day <= today)
+            offsets = day[selected] - start - 1
+            counts = np.bincount(offsets, weights=value[selected] if weighted else None, minlength=days)
+            return [{'_id': _date_id(start + 1 + i), 'count': int(round(c))} for i, c in enumerate(counts) if c]
+
+        def active_users(days):
+            return int(np.unique(active_user[active_day > today - days]).size)
+
+        # Week-over-week signup growth
+        this_week = int(np.count_nonzero(signup & (day > today - 7)))
+        last_week = int(np.count_nonzero(signup & (day > today - 14) & (day <= today - 7)))
+        if last_week == 0:
+            growth_rate = 100 if this_week > 0 else 0
+        else:
+            growth_rate = round(((this_week - last_week) / last_week) * 100, 1)
+
+        # Weekly cohort retention: share of each signup week active N weeks later
+        first_week = (today - 1) // 7 - RETENTION_WEEKS + 1
+        cohort = (signup_day[active_user] - 1) // 7 - first_week
+        offset = (active_day - 1) // 7 - (signup_day[active_user] - 1) // 7
+        keep = (signup_day[active_user] >= 0) & (cohort >= 0) & (offset >= 0)
+        retained = np.zeros((RETENTION_WEEKS, RETENTION_WEEKS), dtype=np.int64)
+        if keep.any():
+            # Count each user once per (cohort, week offset)
+            pairs = np.unique(np.stack([active_user[keep], cohort[keep], offset[keep]]), axis=1)
+            np.add.at(retained, (pairs[1], np.minimum(pairs[2], RETENTION_WEEKS - 1)), 1)
+        cohort_of_user = (signup_day[signup_day >= 0] - 1) // 7 - first_week
+        sizes = np.bincount(cohort_of_user[cohort_of_user >= 0], minlength=RETENTION_WEEKS)[:RETENTION_WEEKS]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = np.where(sizes[:, None] > 0, retained / sizes[:, None] * 100, 0)
+        cohorts = [
+            {
+                'week_start': datetime.fromordinal(int((first_week + i) * 7 + 1)).strftime('%Y-%m-%d'),
+                'size': int(sizes[i]),
+                'retention': [round(float(r), 1) for r in rates[i][:RETENTION_WEEKS - i]]
+            }
+            for i in range(RETENTION_WEEKS)
+        ]
+
+        # Per-user distributions
+        def distribution(event_type):
+            mask = kind == event_type
+            totals = np.bincount(user[mask], weights=value[mask], minlength=user_count)
+            if not totals.size:
+                return {f'p{p}': 0 for p in PERCENTILES}
+            return {f'p{p}': round(float(v), 1) for p, v in zip(PERCENTILES, np.percentile(totals, PERCENTILES))}
+
+        dau = active_users(1)
+        mau = active_users(30)
+        return {
+            'user_growth': {
+                'daily_registrations': daily(signup),
+                'total_users': user_count,
+                'growth_rate': growth_rate
+            },
+            'activity_analytics': {
+                'daily_books': daily(kind == BOOK_ADDED),
+                'daily_tasks': daily(kind == TASK, weighted=True),
+                'dau': dau,
+                'wau': active_users(7),
+                'mau': mau,
+                'stickiness': round(dau / mau * 100, 1) if mau else 0
+            },
+            'cohorts': cohorts,
+            'distributions': {
+                'points': distribution(POINTS),
+                'pages': distribution(READING),
+                'tasks': distribution(TASK)
+            }
+        }
+
+
+@register_job('analytics_snapshot')
+def analytics_snapshot_job(job):
+    """Job handler that rebuilds the columnar analytics snapshot"""
+    name = CohortEngine.extract(job=job)
+    job.set_result({'snapshot': name})
@@ -0,0 +1,141 @@
+from flask import current_app
+from bson import json_util
+from datetime import datetime
+import zipfile
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Exportable collections, with the timestamp fields used for incremental exports
+# and fields that must never leave the database
+EXPORT_COLLECTIONS = {
+    'users': {'timestamps': ['created_at', 'updated_at'], 'exclude': ['password_hash']},
+    'books': {'timestamps': ['added_at', 'updated_at'], 'exclude': []},
+    'book_takeaways': {'timestamps': ['date'], 'exclude': []},
+    'book_quotes': {'timestamps': ['date'], 'exclude': []},
+    'reading_sessions': {'timestamps': ['date', 'created_at'], 'exclude': []},
+    'completed_tasks': {'timestamps': ['completed_at'], 'exclude': []},
+    'rewards': {'timestamps': ['date'], 'exclude': []},
+    'quotes': {'timestamps': ['submitted_at', 'updated_at', 'verified_at'], 'exclude': []},
+    'donations': {'timestamps': ['created_at', 'updated_at'], 'exclude': []}
+}
+
+EXPORT_FORMATS = ['ndjson.gz', 'zip']
+DEFAULT_BATCH_SIZE = 1000
+
+
+class _StreamBuffer:
+    """Write-only file object that hands written bytes back to the caller.
+
+    zipfile treats it as unseekable and writes data descriptors, so the
+    archive can be produced front to back without holding it in memory.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class DataExporter:
+    """Streams collections out of Mongo as NDJSON, bounded by the cursor batch size"""
+
+    def __init__(self, collections=None, since=None, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+        self.collections = [c for c in (collections or EXPORT_COLLECTIONS) if c in EXPORT_COLLECTIONS]
+        self.since = since
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self.counts = {}
+
+    @staticmethod
+    def parse_since(value):
+        """Parse an ISO date or datetime string, returns None when empty or invalid"""
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def filename(export_format, since=None):
+        stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        suffix = f"_since_{since.strftime('%Y%m%d')}" if since else ''
+        return f'nooks_export_{stamp}{suffix}.{export_format}'
+
+    def _query(self, name):
+        if not self.since:
+            return {}
+        return {'$or': [
+            {field: {'$gte': self.since}}
+            for field in EXPORT_COLLECTIONS[name]['timestamps']
+        ]}
+
+    def _projection(self, name):
+        excluded = EXPORT_COLLECTIONS[name]['exclude']
+        return {field: 0 for field in excluded} or None
+
+    def iter_lines(self, name, tagged=False):
+        """Yield one collection as encoded NDJSON lines, batch by batch"""
+        cursor = (current_app.mongo.db[name]
+                  .find(self._query(name), self._projection(name))
+                  .sort('_id', 1)
+                  .batch_size(self.batch_size))
+        self.counts[name] = 0
+        lines = []
+        for doc in cursor:
+            record = {'collection': name, 'document': doc} if tagged else doc
+            lines.append(json_util.dumps(record))
+            self.counts[name] += 1
+            if len(lines) >= self.batch_size:
+                yield ('\n'.join(lines) + '\n').encode('utf-8')
+                lines = []
+                if self.on_batch:
+                    self.on_batch(name, self.counts[name])
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def iter_ndjson_gzip(self):
+        """Yield a single gzip stream where each line is {'collection', 'document'}"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for name in self.collections:
+            for chunk in self.iter_lines(name, tagged=True):
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+        yield compressor.flush()
+
+    def iter_zip(self):
+        """Yield a zip archive with one NDJSON file per collection"""
+        buffer = _StreamBuffer()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name in self.collections:
+                with archive.open(f'{name}.ndjson', 'w', force_zip64=True) as entry:
+                    for chunk in self.iter_lines(name):
+                        entry.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+                yield buffer.drain()
+        yield buffer.drain()
+
+    def iter_export(self, export_format):
+        if export_format == 'zip':
+            return self.iter_zip()
+        return self.iter_ndjson_gzip()
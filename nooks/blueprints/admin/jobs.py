@@ -0,0 +1,72 @@
+from flask import current_app
+from utils.jobs import register_job
+from models import AdminUtils, QuoteModel
+from .exports import DataExporter
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_export_folder():
+    """Directory for generated export files, outside of the static folder"""
+    folder = current_app.config.get('EXPORT_FOLDER') or os.path.join(current_app.instance_path, 'exports')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+@register_job('reset_user_progress')
+def reset_user_progress_job(job, user_id, reset_type='all'):
+    """Job handler for admin progress resets"""
+    job.update_progress(0, 1, f'Resetting {reset_type}')
+    # Each finished step renews the lease, a slow reset is not reclaimed mid-way
+    if not AdminUtils.reset_user_progress(user_id, reset_type, on_step=lambda step: job.update_progress(message=f'Reset {step}')):
+        raise RuntimeError(f'Failed to reset progress for user {user_id}')
+    job.update_progress(1, 1, 'Done')
+
+
+@register_job('export_data')
+def export_data_job(job, collections=None, export_format='ndjson.gz', since=None):
+    """Job handler that streams an export to a file in the export folder"""
+    since = DataExporter.parse_since(since)
+    exporter = DataExporter(
+        collections=collections,
+        since=since,
+        on_batch=lambda name, count: job.update_progress(message=f'Exporting {name}: {count} documents')
+    )
+    filename = DataExporter.filename(export_format, since)
+    path = os.path.join(get_export_folder(), filename)
+
+    with open(path, 'wb') as output:
+        for chunk in exporter.iter_export(export_format):
+            output.write(chunk)
+
+    job.set_result({'filename': filename, 'counts': exporter.counts})
+    job.update_progress(message='Done')
+
+
+@register_job('bulk_verify_quotes')
+def bulk_verify_quotes_job(job, quote_ids, admin_id, approved, rejection_reason=None):
+    """Job handler for bulk quote verification"""
+    success_count = 0
+    error_count = 0
+    total = len(quote_ids)
+
+    for index, quote_id in enumerate(quote_ids):
+        # Quotes already handled on an earlier attempt are skipped by verify_quote
+        success, error = QuoteModel.verify_quote(
+            quote_id=quote_id,
+            admin_id=admin_id,
+            approved=approved,
+            rejection_reason=rejection_reason if not approved else None
+        )
+
+        if success:
+            success_count += 1
+        else:
+            error_count += 1
+            logger.error(f"Failed to verify quote {quote_id}: {error}")
+
+        job.update_progress(index + 1, total)
+
+    job.set_result({'success_count': success_count, 'error_count': error_count})
@@ -0,0 +1,382 @@
+from flask import current_app
+from bson import ObjectId
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from utils.jobs import JobQueue, register_job, LEASE_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# User-owned collections checked for orphans. The flag marks collections that
+# store the owner as a string (club, flashcard and quiz data) rather than an ObjectId.
+ORPHAN_COLLECTIONS = {
+    'rewards': False,
+    'user_badges': False,
+    'user_goals': False,
+    'books': False,
+    'book_takeaways': False,
+    'book_quotes': False,
+    'reading_sessions': False,
+    'completed_tasks': False,
+    'quotes': False,
+    'transactions': False,
+    'user_purchases': False,
+    'club_posts': True,
+    'club_chat_messages': True,
+    'flashcards': True,
+    'quiz_answers': True,
+    'user_progress': True
+}
+
+# Fields that identify a duplicate; the earliest document of each group is kept
+DUPLICATE_KEYS = {
+    'user_badges': ['user_id', 'badge_id']
+}
+
+DEFAULT_BATCH_SIZE = 500
+ACTIVITY_LOG_RETENTION_DAYS = 90
+
+# A pending or running run with no progress for this long lost its worker
+STALE_RUN_SECONDS = LEASE_SECONDS
+
+
+class CleanupService:
+    """Resumable, batched data cleanup for the admin maintenance tools"""
+
+    @staticmethod
+    def get_cleanup_types():
+        """Get the cleanup types accepted by start_cleanup"""
+        types = ['old_activity_logs', 'orphaned_records']
+        types += [f'orphaned_{name}' for name in ORPHAN_COLLECTIONS]
+        types += [f'duplicate_{name}' for name in DUPLICATE_KEYS]
+        # Kept for the original maintenance form
+        types.append('duplicate_badges')
+        return types
+
+    @staticmethod
+    def _plan_steps(cleanup_type):
+        """Expand a cleanup type into the list of (kind, collection) steps it runs"""
+        if cleanup_type == 'old_activity_logs':
+            return [('expired', 'activity_log')]
+        if cleanup_type == 'orphaned_records':
+            return [('orphaned', name) for name in ORPHAN_COLLECTIONS]
+        if cleanup_type == 'duplicate_badges':
+            return [('duplicate', 'user_badges')]
+        if cleanup_type.startswith('orphaned_') and cleanup_type[len('orphaned_'):] in ORPHAN_COLLECTIONS:
+            return [('orphaned', cleanup_type[len('orphaned_'):])]
+        if cleanup_type.startswith('duplicate_') and cleanup_type[len('duplicate_'):] in DUPLICATE_KEYS:
+            return [('duplicate', cleanup_type[len('duplicate_'):])]
+        return []
+
+    @staticmethod
+    def create_run(cleanup_type, admin_id=None, batch_size=DEFAULT_BATCH_SIZE):
+        """Create a progress document for a cleanup run, returns (run_id, error)"""
+        try:
+            steps = CleanupService._plan_steps(cleanup_type)
+            if not steps:
+                return None, 'Invalid cleanup type selected'
+
+            run_data = {
+                'cleanup_type': cleanup_type,
+                'status': 'pending',
+                # Unique per cleanup_type until the run completes
+                'active': True,
+                'batch_size': batch_size,
+                'steps': [
+                    {
+                        'kind': kind,
+                        'collection': collection,
+                        'last_id': None,
+                        'scanned': 0,
+                        'removed': 0,
+                        'done': False
+                    }
+                    for kind, collection in steps
+                ],
+                'scanned': 0,
+                'removed': 0,
+                'created_by': ObjectId(admin_id) if admin_id else None,
+                'created_at': datetime.utcnow(),
+                'updated_at': datetime.utcnow(),
+                'finished_at': None,
+                'error': None
+            }
+            result = current_app.mongo.db.maintenance_runs.insert_one(run_data)
+            return result.inserted_id, None
+
+        except DuplicateKeyError:
+            return None, 'A cleanup of this type is already in progress or failed, resume it from Recent Runs'
+        except Exception as e:
+            logger.error(f"Error creating cleanup run: {str(e)}")
+            return None, str(e)
+
+    @staticmethod
+    def start_cleanup(cleanup_type, admin_id=None, batch_size=DEFAULT_BATCH_SIZE):
+        """Create a cleanup run and queue it as a background job, returns (run_id, error)"""
+        run_id, error = CleanupService.create_run(cleanup_type, admin_id, batch_size)
+        if error:
+            return None, error
+        job_id, error = JobQueue.enqueue('cleanup_data', {'run_id': str(run_id)}, created_by=admin_id)
+        if error:
+            current_app.mongo.db.maintenance_runs.delete_one({'_id': run_id})
+            return None, error
+        current_app.mongo.db.maintenance_runs.update_one({'_id': run_id, 'job_id': None}, {'$set': {'job_id': job_id}})
+        return run_id, None
+
+    @staticmethod
+    def run(run_id, job=None):
+        """Process a cleanup run, resuming each step from its last scanned _id"""
+        db = current_app.mongo.db
+        run_id = ObjectId(run_id)
+        run = db.maintenance_runs.find_one({'_id': run_id})
+        if not run:
+            logger.error(f"Cleanup run {run_id} not found")
+            return False
+        if run['status'] == 'completed':
+            return True
+
+        claim = {'_id': run_id, 'status': {'$ne': 'completed'}}
+        update = {'status': 'running', 'error': None, 'updated_at': datetime.utcnow()}
+        if job:
+            # The first job to run claims the run; a job it was resumed away from stops here
+            claim['job_id'] = {'$in': [None, job.id]}
+            update['job_id'] = job.id
+        if not db.maintenance_runs.update_one(claim, {'$set': update}).matched_count:
+            logger.warning(f"Cleanup run {run_id} is owned by another job, skipping")
+            return False
+
+        try:
+            for index, step in enumerate(run['steps']):
+                if step.get('done'):
+                    continue
+                if job:
+                    job.update_progress(index, len(run['steps']), f"Scanning {step['collection']}")
+                CleanupService._run_step(run_id, index, step, run.get('batch_size', DEFAULT_BATCH_SIZE), job)
+
+            db.maintenance_runs.update_one(
+                {'_id': run_id},
+                {
+                    '$set': {
+                        'status': 'completed',
+                        'finished_at': datetime.utcnow(),
+                        'updated_at': datetime.utcnow()
+                    },
+                    '$unset': {'active': ''}
+                }
+            )
+            logger.info(f"Cleanup run {run_id} ({run['cleanup_type']}) completed")
+            return True
+
+        except Exception as e:
+            logger.error(f"Cleanup run {run_id} failed: {str(e)}")
+            db.maintenance_runs.update_one(
+                {'_id': run_id},
+                {'$set': {'status': 'failed', 'error': str(e), 'updated_at': datetime.utcnow()}}
+            )
+            raise
+
+    @staticmethod
+    def _run_step(run_id, index, step, batch_size, job=None):
+        """Scan one collection in _id order, deleting matches one batch at a time"""
+        scanners = {
+            'orphaned': CleanupService._scan_orphans,
+            'duplicate': CleanupService._scan_duplicates,
+            'expired': CleanupService._scan_expired_logs
+        }
+        scan = scanners[step['kind']]
+        collection = current_app.mongo.db[step['collection']]
+        last_id = step.get('last_id')
+
+        while True:
+            scanned_ids, doomed_ids = scan(step['collection'], last_id, batch_size)
+            if not scanned_ids:
+                break
+
+            removed = 0
+            if doomed_ids:
+                removed = collection.delete_many({'_id': {'$in': doomed_ids}}).deleted_count
+
+            last_id = scanned_ids[-1]
+            CleanupService._record_progress(run_id, index, last_id, len(scanned_ids), removed)
+            if job:
+                job.update_progress()
+
+            if len(scanned_ids) < batch_size:
+                break
+
+        current_app.mongo.db.maintenance_runs.update_one(
+            {'_id': run_id},
+            {'$set': {f'steps.{index}.done': True, 'updated_at': datetime.utcnow()}}
+        )
+
+    @staticmethod
+    def _record_progress(run_id, index, last_id, scanned, removed):
+        """Persist the resume point and counters after each batch"""
+        current_app.mongo.db.maintenance_runs.update_one(
+            {'_id': run_id},
+            {
+                '$set': {f'steps.{index}.last_id': last_id, 'updated_at': datetime.utcnow()},
+                '$inc': {
+                    f'steps.{index}.scanned': scanned,
+                    f'steps.{index}.removed': removed,
+                    'scanned': scanned,
+                    'removed': removed
+                }
+            }
+        )
+
+    @staticmethod
+    def _range_match(last_id):
+        """Match stage for the next _id range after last_id"""
+        return {'$match': {'_id': {'$gt': last_id}}} if last_id else {'$match': {}}
+
+    @staticmethod
+    def _scan_orphans(collection_name, last_id, batch_size):
+        """Anti-join one batch against users, returns (scanned_ids, orphan_ids)"""
+        string_owner = ORPHAN_COLLECTIONS[collection_name]
+        pipeline = [
+            CleanupService._range_match(last_id),
+            {'$sort': {'_id': 1}},
+            {'$limit': batch_size},
+            {'$project': {'owner_id': '$user_id'}}
+        ]
+        if string_owner:
+            pipeline.append({'$set': {'owner_id': {
+                '$convert': {'input': '$owner_id', 'to': 'objectId', 'onError': None, 'onNull': None}
+            }}})
+        pipeline += [
+            {'$lookup': {
+                'from': 'users',
+                'localField': 'owner_id',
+                'foreignField': '_id',
+                'pipeline': [{'$project': {'_id': 1}}],
+                'as': 'owner'
+            }},
+            {'$project': {'orphan': {'$eq': [{'$size': '$owner'}, 0]}}}
+        ]
+
+        docs = list(current_app.mongo.db[collection_name].aggregate(pipeline))
+        scanned_ids = [doc['_id'] for doc in docs]
+        orphan_ids = [doc['_id'] for doc in docs if doc['orphan']]
+        return scanned_ids, orphan_ids
+
+    @staticmethod
+    def _scan_duplicates(collection_name, last_id, batch_size):
+        """Find documents in one batch that have an earlier twin, returns (scanned_ids, duplicate_ids)"""
+        keys = DUPLICATE_KEYS[collection_name]
+        let_vars = {f'k{i}': f'${key}' for i, key in enumerate(keys)}
+        let_vars['doc_id'] = '$_id'
+        conditions = [{'$eq': [f'${key}', f'$$k{i}']} for i, key in enumerate(keys)]
+        conditions.append({'$lt': ['$_id', '$$doc_id']})
+
+        pipeline = [
+            CleanupService._range_match(last_id),
+            {'$sort': {'_id': 1}},
+            {'$limit': batch_size},
+            {'$lookup': {
+                'from': collection_name,
+                'let': let_vars,
+                'pipeline': [
+                    {'$match': {'$expr': {'$and': conditions}}},
+                    {'$limit': 1},
+                    {'$project': {'_id': 1}}
+                ],
+                'as': 'earlier'
+            }},
+            {'$project': {'duplicate': {'$gt': [{'$size': '$earlier'}, 0]}}}
+        ]
+
+        docs = list(current_app.mongo.db[collection_name].aggregate(pipeline))
+        scanned_ids = [doc['_id'] for doc in docs]
+        duplicate_ids = [doc['_id'] for doc in docs if doc['duplicate']]
+        return scanned_ids, duplicate_ids
+
+    @staticmethod
+    def _scan_expired_logs(collection_name, last_id, batch_size):
+        """Select one batch of activity log entries past retention, returns (scanned_ids, expired_ids)"""
+        cutoff = datetime.utcnow() - timedelta(days=ACTIVITY_LOG_RETENTION_DAYS)
+        query = {'timestamp': {'$lt': cutoff}}
+        if last_id:
+            query['_id'] = {'$gt': last_id}
+
+        docs = list(current_app.mongo.db[collection_name].find(query, {'_id': 1})
+                    .sort('_id', 1)
+                    .limit(batch_size))
+        ids = [doc['_id'] for doc in docs]
+        return ids, ids
+
+    @staticmethod
+    def get_run(run_id):
+        """Get a cleanup run progress document"""
+        try:
+            return current_app.mongo.db.maintenance_runs.find_one({'_id': ObjectId(run_id)})
+        except Exception as e:
+            logger.error(f"Error getting cleanup run: {str(e)}")
+            return None
+
+    @staticmethod
+    def _resumable_filter():
+        """Matches failed runs and pending or running runs that stopped making progress"""
+        cutoff = datetime.utcnow() - timedelta(seconds=STALE_RUN_SECONDS)
+        return {'$or': [
+            {'status': 'failed'},
+            {'status': {'$in': ['pending', 'running']}, 'updated_at': {'$lt': cutoff}}
+        ]}
+
+    @staticmethod
+    def display_status(run):
+        """The run's status, with 'stale' for a pending or running run that lost its worker"""
+        cutoff = datetime.utcnow() - timedelta(seconds=STALE_RUN_SECONDS)
+        if run['status'] in ('pending', 'running') and run.get('updated_at') and run['updated_at'] < cutoff:
+            return 'stale'
+        return run['status']
+
+    @staticmethod
+    def get_recent_runs(limit=20):
+        """Get the most recent cleanup runs"""
+        try:
+            runs = list(current_app.mongo.db.maintenance_runs.find()
+                        .sort('created_at', -1)
+                        .limit(limit))
+            for run in runs:
+                run['status'] = CleanupService.display_status(run)
+            return runs
+        except Exception as e:
+            logger.error(f"Error getting cleanup runs: {str(e)}")
+            return []
+
+    @staticmethod
+    def resume_run(run_id, admin_id=None):
+        """Queue a failed or stale run to continue from its recorded position.
+
+        The run is claimed by moving it back to pending with no job, so only
+        one of several concurrent resumes queues a job, and the job that used
+        to own it can no longer claim it.
+        """
+        try:
+            run_id = ObjectId(run_id)
+        except Exception:
+            return False, 'Cleanup run not found'
+        query = {'_id': run_id}
+        query.update(CleanupService._resumable_filter())
+        run = current_app.mongo.db.maintenance_runs.find_one_and_update(
+            query,
+            {'$set': {'status': 'pending', 'job_id': None, 'error': None, 'updated_at': datetime.utcnow()}}
+        )
+        if not run:
+            return False, 'Only failed or stale cleanup runs can be resumed'
+        job_id, error = JobQueue.enqueue('cleanup_data', {'run_id': str(run_id)}, created_by=admin_id)
+        if error:
+            current_app.mongo.db.maintenance_runs.update_one(
+                {'_id': run_id, 'job_id': None},
+                {'$set': {'status': 'failed', 'error': error}}
+            )
+            return False, error
+        current_app.mongo.db.maintenance_runs.update_one({'_id': run_id, 'job_id': None}, {'$set': {'job_id': job_id}})
+        return True, None
+
+
+@register_job('cleanup_data')
+def cleanup_data_job(job, run_id):
+    """Job handler for queued cleanup runs"""
+    CleanupService.run(run_id, job)
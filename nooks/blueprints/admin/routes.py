@@ -1,10 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file, Response, stream_with_context
 from flask_login import login_required, current_user
 from bson import ObjectId
 from datetime import datetime, timedelta
+import os
 from utils.decorators import admin_required
+from utils.jobs import JobQueue, JOB_HANDLERS
 from blueprints.rewards.services import RewardService
-from models import AdminUtils, UserModel, ActivityLogger
+from models import AdminUtils, UserModel, BookModel, ActivityLogger
+from .maintenance import CleanupService
+from .jobs import get_export_folder
+from .exports import DataExporter, EXPORT_COLLECTIONS, EXPORT_FORMATS
+from .cohorts import CohortEngine
+from blueprints.integrations.payment import get_payment_client
 
 admin_bp = Blueprint('admin', __name__, template_folder='templates')
 
@@ -19,7 +26,7 @@ def index():
     
     # Get recent activity
     recent_users = list(current_app.mongo.db.users.find({}).sort('created_at', -1).limit(10))
-    recent_books = list(current_app.mongo.db.books.find({}).sort('added_at', -1).limit(10))
+    recent_books = list(current_app.mongo.db.books.find({}, BookModel.SUMMARY_PROJECTION).sort('added_at', -1).limit(10))
     
     return render_template('admin/index.html',
                          stats=stats,
@@ -82,7 +89,7 @@ def users():
                          current_status=status_filter,
                          current_search=search_query,
                          page=page,
-                         has_next=len(users) == per_page)
+                         has_next=page * per_page < total_users)
 
 @admin_bp.route('/user/<user_id>')
 @admin_required
@@ -98,7 +105,7 @@ def user_detail(user_id):
     # Get recent activity
     recent_books = list(current_app.mongo.db.books.find({
         'user_id': ObjectId(user_id)
-    }).sort('added_at', -1).limit(10))
+    }, BookModel.SUMMARY_PROJECTION).sort('added_at', -1).limit(10))
     
     recent_tasks = list(current_app.mongo.db.completed_tasks.find({
         'user_id': ObjectId(user_id)
@@ -121,23 +128,47 @@ def user_detail(user_id):
 @admin_bp.route('/analytics')
 @admin_required
 def analytics():
-    # User growth analytics
-    user_growth = get_user_growth_analytics()
-    
-    # Activity analytics
-    activity_analytics = get_activity_analytics()
-    
-    # Reward analytics
-    reward_analytics = get_reward_analytics()
-    
-    # Popular books and categories
-    popular_content = get_popular_content_analytics()
+    # Served from the latest columnar snapshot; a stale or missing one is
+    # rebuilt in the background while the page keeps what it has
+    columns, snapshot = CohortEngine.load()
+    if CohortEngine.is_stale(snapshot):
+        CohortEngine.schedule_refresh(created_by=current_user.id)
+
+    if snapshot:
+        results = snapshot['results']
+        user_growth = results['user_growth']
+        activity_analytics = results['activity_analytics']
+        reward_analytics = snapshot['reward_analytics']
+        popular_content = snapshot['popular_content']
+        cohort_analytics = {
+            'cohorts': results['cohorts'],
+            'distributions': results['distributions'],
+            'snapshot_at': snapshot['created_at']
+        }
+    else:
+        # No snapshot yet, fall back to live aggregation
+        user_growth = get_user_growth_analytics()
+        activity_analytics = get_activity_analytics()
+        reward_analytics = get_reward_analytics()
+        popular_content = get_popular_content_analytics()
+        cohort_analytics = None
     
     return render_template('admin/analytics.html',
                          user_growth=user_growth,
                          activity_analytics=activity_analytics,
                          reward_analytics=reward_analytics,
-                         popular_content=popular_content)
+                         popular_content=popular_content,
+                         cohort_analytics=cohort_analytics)
+
+@admin_bp.route('/analytics/refresh', methods=['POST'])
+@admin_required
+def refresh_analytics():
+    job_id = CohortEngine.schedule_refresh(created_by=current_user.id)
+    if job_id:
+        flash('Analytics snapshot queued, the page will update when it finishes.', 'success')
+    else:
+        flash('An analytics snapshot is already being built.', 'info')
+    return redirect(url_for('admin.analytics'))
 
 @admin_bp.route('/content')
 @admin_required
@@ -156,7 +187,7 @@ def content():
     popular_books = get_popular_books()
     
     # Get recent content
-    recent_books = list(current_app.mongo.db.books.find({}).sort('added_at', -1).limit(20))
+    recent_books = list(current_app.mongo.db.books.find({}, BookModel.SUMMARY_PROJECTION).sort('added_at', -1).limit(20))
     
     return render_template('admin/content.html',
                          stats=content_stats,
@@ -211,15 +242,19 @@ def award_points():
 @admin_bp.route('/reset_user_progress/<user_id>', methods=['POST'])
 @admin_required
 def reset_user_progress(user_id):
-    """Reset user progress with different options"""
+    """Queue a user progress reset with different options"""
     reset_type = request.form.get('reset_type', 'all')
     
-    success = AdminUtils.reset_user_progress(user_id, reset_type)
+    job_id, error = JobQueue.enqueue(
+        'reset_user_progress',
+        {'user_id': user_id, 'reset_type': reset_type},
+        created_by=current_user.id
+    )
     
-    if success:
-        flash(f'Successfully reset user progress: {reset_type}', 'success')
+    if job_id:
+        flash(f'Progress reset ({reset_type}) queued as job {job_id}', 'success')
     else:
-        flash('Failed to reset user progress. Please try again.', 'error')
+        flash('Failed to queue progress reset. Please try again.', 'error')
     
     return redirect(url_for('admin.user_detail', user_id=user_id))
 
@@ -298,68 +333,90 @@ def user_activity(user_id):
 @admin_required
 def system_maintenance():
     """System maintenance and cleanup tools"""
-    return render_template('admin/system_maintenance.html')
+    runs = CleanupService.get_recent_runs()
+    cleanup_types = CleanupService.get_cleanup_types()
+    return render_template('admin/system_maintenance.html', runs=runs, cleanup_types=cleanup_types)
 
 @admin_bp.route('/cleanup_data', methods=['POST'])
 @admin_required
 def cleanup_data():
-    """Perform data cleanup operations"""
+    """Start a batched data cleanup run in the background"""
     cleanup_type = request.form.get('cleanup_type')
     
-    try:
-        if cleanup_type == 'old_activity_logs':
-            # Remove activity logs older than 90 days
-            ninety_days_ago = datetime.now() - timedelta(days=90)
-            result = current_app.mongo.db.activity_log.delete_many({
-                'timestamp': {'$lt': ninety_days_ago}
-            })
-            flash(f'Removed {result.deleted_count} old activity log entries', 'success')
-        
-        elif cleanup_type == 'orphaned_rewards':
-            # Remove rewards for non-existent users
-            user_ids = set(current_app.mongo.db.users.distinct('_id'))
-            result = current_app.mongo.db.rewards.delete_many({
-                'user_id': {'$nin': list(user_ids)}
-            })
-            flash(f'Removed {result.deleted_count} orphaned reward records', 'success')
-        
-        elif cleanup_type == 'orphaned_books':
-            # Remove books for non-existent users
-            user_ids = set(current_app.mongo.db.users.distinct('_id'))
-            result = current_app.mongo.db.books.delete_many({
-                'user_id': {'$nin': list(user_ids)}
-            })
-            flash(f'Removed {result.deleted_count} orphaned book records', 'success')
-        
-        elif cleanup_type == 'duplicate_badges':
-            # Remove duplicate badge entries
-            pipeline = [
-                {'$group': {
-                    '_id': {'user_id': '$user_id', 'badge_id': '$badge_id'},
-                    'ids': {'$push': '$_id'},
-                    'count': {'$sum': 1}
-                }},
-                {'$match': {'count': {'$gt': 1}}}
-            ]
-            
-            duplicates = list(current_app.mongo.db.user_badges.aggregate(pipeline))
-            removed_count = 0
-            
-            for duplicate in duplicates:
-                # Keep the first one, remove the rest
-                ids_to_remove = duplicate['ids'][1:]
-                current_app.mongo.db.user_badges.delete_many({
-                    '_id': {'$in': ids_to_remove}
-                })
-                removed_count += len(ids_to_remove)
-            
-            flash(f'Removed {removed_count} duplicate badge entries', 'success')
-        
-        else:
-            flash('Invalid cleanup type selected', 'error')
+    run_id, error = CleanupService.start_cleanup(cleanup_type, admin_id=current_user.id)
+    
+    if error:
+        flash(f'Cleanup failed: {error}', 'error')
+    else:
+        flash(f'Cleanup started ({cleanup_type}). Progress is shown below.', 'success')
     
-    except Exception as e:
-        flash(f'Cleanup failed: {str(e)}', 'error')
+    return redirect(url_for('admin.system_maintenance'))
+
+@admin_bp.route('/rebuild_rollups', methods=['POST'])
+@admin_required
+def rebuild_rollups():
+    """Queue a rebuild of the daily chart rollups from raw sessions, tasks and rewards"""
+    job_id, error = JobQueue.enqueue('rollup_backfill', {}, created_by=current_user.id)
+    
+    if job_id:
+        flash(f'Rollup rebuild queued as job {job_id}', 'success')
+    else:
+        flash(f'Failed to queue rollup rebuild: {error}', 'error')
+    
+    return redirect(url_for('admin.system_maintenance'))
+
+@admin_bp.route('/audit_entitlements', methods=['POST'])
+@admin_required
+def audit_entitlements():
+    """Queue a check of every user's entitlement set against their purchases"""
+    repair = request.form.get('repair') == 'on'
+    job_id, error = JobQueue.enqueue('entitlement_audit', {'repair': repair}, created_by=current_user.id)
+    
+    if job_id:
+        flash(f'Entitlement audit queued as job {job_id}', 'success')
+    else:
+        flash(f'Failed to queue entitlement audit: {error}', 'error')
+    
+    return redirect(url_for('admin.system_maintenance'))
+
+@admin_bp.route('/cleanup_data/<run_id>')
+@admin_required
+def cleanup_status(run_id):
+    """API endpoint for cleanup run progress"""
+    run = CleanupService.get_run(run_id)
+    if not run:
+        return jsonify({'error': 'Cleanup run not found'}), 404
+    
+    return jsonify({
+        'id': str(run['_id']),
+        'cleanup_type': run['cleanup_type'],
+        'status': CleanupService.display_status(run),
+        'scanned': run.get('scanned', 0),
+        'removed': run.get('removed', 0),
+        'steps': [
+            {
+                'collection': step['collection'],
+                'kind': step['kind'],
+                'scanned': step.get('scanned', 0),
+                'removed': step.get('removed', 0),
+                'done': step.get('done', False)
+            }
+            for step in run.get('steps', [])
+        ],
+        'error': run.get('error'),
+        'updated_at': run['updated_at'].isoformat() if run.get('updated_at') else None
+    })
+
+@admin_bp.route('/cleanup_data/<run_id>/resume', methods=['POST'])
+@admin_required
+def resume_cleanup(run_id):
+    """Resume a failed or interrupted cleanup run"""
+    success, error = CleanupService.resume_run(run_id, admin_id=current_user.id)
+    
+    if success:
+        flash('Cleanup resumed', 'success')
+    else:
+        flash(f'Could not resume cleanup: {error}', 'error')
     
     return redirect(url_for('admin.system_maintenance'))
 
@@ -371,13 +428,7 @@ def api_user_search():
     if len(query) < 2:
         return jsonify([])
     
-    users = list(current_app.mongo.db.users.find({
-        '$or': [
-            {'username': {'$regex': query, '$options': 'i'}},
-            {'email': {'$regex': query, '$options': 'i'}},
-            {'profile.display_name': {'$regex': query, '$options': 'i'}}
-        ]
-    }).limit(10))
+    users = AdminUtils.search_users(query, limit=10)
     
     results = []
     for user in users:
@@ -427,37 +478,151 @@ def system_settings():
     
     return render_template('admin/system_settings.html', config=system_config)
 
-@admin_bp.route('/export_data')
+@admin_bp.route('/export_data', methods=['GET', 'POST'])
 @admin_required
 def export_data():
-    # This would implement data export functionality
-    # For now, just return a success message
-    flash('Data export functionality would be implemented here', 'info')
-    return redirect(url_for('admin.index'))
+    """Stream a data export, or queue it as a background job on POST"""
+    values = request.form if request.method == 'POST' else request.args
+    collections = values.getlist('collections') or None
+    export_format = values.get('format', 'ndjson.gz')
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'ndjson.gz'
+    since_value = values.get('since', '').strip()
+    since = DataExporter.parse_since(since_value)
+    if since_value and not since:
+        flash('Invalid "since" date, expected YYYY-MM-DD', 'error')
+        return redirect(url_for('admin.jobs'))
+    
+    if request.method == 'POST':
+        job_id, error = JobQueue.enqueue(
+            'export_data',
+            {'collections': collections, 'export_format': export_format, 'since': since_value or None},
+            created_by=current_user.id
+        )
+        if job_id:
+            flash(f'Data export queued as job {job_id}', 'success')
+        else:
+            flash(f'Failed to queue data export: {error}', 'error')
+        return redirect(url_for('admin.jobs'))
+    
+    exporter = DataExporter(collections=collections, since=since)
+    filename = DataExporter.filename(export_format, since)
+    mimetype = 'application/zip' if export_format == 'zip' else 'application/gzip'
+    
+    ActivityLogger.log_activity(
+        user_id=current_user.id,
+        action='admin_data_export',
+        description=f'Admin exported {", ".join(exporter.collections)}',
+        metadata={'format': export_format, 'since': since_value or None}
+    )
+    
+    return Response(
+        stream_with_context(exporter.iter_export(export_format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@admin_bp.route('/export_data/<job_id>/download')
+@admin_required
+def download_export(job_id):
+    """Download the file produced by a completed export job"""
+    job = JobQueue.get_job(job_id)
+    if not job or job['job_type'] != 'export_data' or job['status'] != 'completed':
+        flash('Export not available', 'error')
+        return redirect(url_for('admin.jobs'))
+    
+    path = os.path.join(get_export_folder(), job['result']['filename'])
+    if not os.path.exists(path):
+        flash('Export file no longer exists', 'error')
+        return redirect(url_for('admin.jobs'))
+    
+    return send_file(path, as_attachment=True, download_name=job['result']['filename'])
+
+@admin_bp.route('/jobs')
+@admin_required
+def jobs():
+    """Background job queue overview"""
+    status = request.args.get('status') or None
+    job_type = request.args.get('job_type') or None
+    page = int(request.args.get('page', 1))
+    per_page = 50
+    
+    job_list, total_jobs = JobQueue.get_recent_jobs(status=status, job_type=job_type, page=page, per_page=per_page)
+    
+    return render_template('admin/jobs.html',
+                         jobs=job_list,
+                         total_jobs=total_jobs,
+                         job_types=sorted(JOB_HANDLERS.keys()),
+                         export_collections=list(EXPORT_COLLECTIONS.keys()),
+                         export_formats=EXPORT_FORMATS,
+                         current_status=status,
+                         current_job_type=job_type,
+                         page=page,
+                         has_next=page * per_page < total_jobs)
+
+@admin_bp.route('/api/jobs/<job_id>')
+@admin_required
+def api_job_status(job_id):
+    """API endpoint for job status and progress"""
+    job = JobQueue.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(JobQueue.serialize(job))
+
+@admin_bp.route('/api/payment_metrics')
+@admin_required
+def api_payment_metrics():
+    """Latency and error counts of this process's payment provider client"""
+    client = get_payment_client()
+    return jsonify({'circuit': client.breaker.state, **client.metrics.snapshot()})
+
+@admin_bp.route('/jobs/<job_id>/retry', methods=['POST'])
+@admin_required
+def retry_job(job_id):
+    if JobQueue.retry_job(job_id):
+        flash('Job requeued', 'success')
+    else:
+        flash('Only failed or cancelled jobs can be retried', 'error')
+    return redirect(url_for('admin.jobs'))
+
+@admin_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+@admin_required
+def cancel_job(job_id):
+    if JobQueue.cancel_job(job_id):
+        flash('Job cancelled', 'success')
+    else:
+        flash('Only pending jobs can be cancelled', 'error')
+    return redirect(url_for('admin.jobs'))
 
 @admin_bp.route('/books')
 @admin_required
 def books():
     q = request.args.get('q', '').strip()
     status = request.args.get('status', '').strip()
-    query = {'pdf_path': {'$ne': None}}
-    if q:
-        query['$or'] = [
-            {'title': {'$regex': q, '$options': 'i'}},
-            {'authors': {'$elemMatch': {'$regex': q, '$options': 'i'}}},
-            {'user_email': {'$regex': q, '$options': 'i'}},
-            {'user_id': {'$regex': q, '$options': 'i'}}
-        ]
+    page = max(int(request.args.get('page', 1)), 1)
+    per_page = 50
+    filters = {'pdf_path': {'$ne': None}}
     if status:
-        query['status'] = status
-    books = list(current_app.mongo.db.books.find(query).sort('added_at', -1))
+        filters['status'] = status
+    
+    # A user id or email narrows the search to that user's books
+    user_id = None
+    if q and ObjectId.is_valid(q):
+        user_id, q = q, ''
+    elif '@' in q:
+        owner = current_app.mongo.db.users.find_one({'email': q}, {'_id': 1})
+        user_id = str(owner['_id']) if owner else str(ObjectId())
+        q = ''
+    
+    books, total_books = BookModel.search_books(q, user_id=user_id, filters=filters, page=page, per_page=per_page)
     # Attach user email if possible
     user_ids = list(set([b['user_id'] for b in books if 'user_id' in b]))
-    users = {str(u['_id']): u for u in current_app.mongo.db.users.find({'_id': {'$in': user_ids}})}
+    users = {str(u['_id']): u for u in current_app.mongo.db.users.find({'_id': {'$in': user_ids}}, {'email': 1})}
     for b in books:
         uid = str(b.get('user_id'))
         b['user_email'] = users.get(uid, {}).get('email', uid)
-    return render_template('admin/books.html', books=books)
+    has_next = page * per_page < total_books
+    return render_template('admin/books.html', books=books, page=page, has_next=has_next, total_books=total_books)
 
 # Helper functions
 
@@ -664,19 +829,11 @@ def get_popular_content_analytics():
 
 def get_total_quotes():
     """Get total number of quotes across all books"""
-    result = list(current_app.mongo.db.books.aggregate([
-        {'$project': {'quote_count': {'$size': {'$ifNull': ['$quotes', []]}}}},
-        {'$group': {'_id': None, 'total': {'$sum': '$quote_count'}}}
-    ]))
-    return result[0]['total'] if result else 0
+    return current_app.mongo.db.book_quotes.estimated_document_count()
 
 def get_total_takeaways():
     """Get total number of takeaways across all books"""
-    result = list(current_app.mongo.db.books.aggregate([
-        {'$project': {'takeaway_count': {'$size': {'$ifNull': ['$key_takeaways', []]}}}},
-        {'$group': {'_id': None, 'total': {'$sum': '$takeaway_count'}}}
-    ]))
-    return result[0]['total'] if result else 0
+    return current_app.mongo.db.book_takeaways.estimated_document_count()
 
 def get_average_book_rating():
     """Get average book rating"""
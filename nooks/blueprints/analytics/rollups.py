@@ -0,0 +1,165 @@
+from flask import current_app
+from bson import ObjectId
+from datetime import datetime, timedelta
+from utils.jobs import register_job
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Counters kept on each daily_rollups document, keyed by (user_id, day)
+ROLLUP_FIELDS = ['pages', 'reading_minutes', 'reading_sessions', 'tasks', 'focus_minutes', 'points']
+
+
+def day_key(when=None):
+    """UTC calendar day used as the rollup key, e.g. '2024-03-09'"""
+    return (when or datetime.utcnow()).strftime('%Y-%m-%d')
+
+
+def _field_key(value):
+    """Category names become sub-document keys, so keep them Mongo-safe"""
+    return str(value or 'general').replace('.', '_').lstrip('$') or 'general'
+
+
+class DailyRollups:
+    """Per-user daily counters for charts, maintained with $inc on every write"""
+
+    @staticmethod
+    def record(user_id, when=None, category=None, **counters):
+        """Add counters (see ROLLUP_FIELDS) to the user's rollup for the day of ``when``.
+
+        ``category`` splits tasks and focus minutes by task category, and points
+        by reward category.
+        """
+        increments = {field: value for field, value in counters.items() if field in ROLLUP_FIELDS and value}
+        if not increments:
+            return
+        if category is not None:
+            key = _field_key(category)
+            if 'tasks' in increments:
+                increments[f'tasks_by_category.{key}'] = increments['tasks']
+            if 'focus_minutes' in increments:
+                increments[f'focus_by_category.{key}'] = increments['focus_minutes']
+            if 'points' in increments:
+                increments[f'points_by_category.{key}'] = increments['points']
+
+        try:
+            current_app.mongo.db.daily_rollups.update_one(
+                {'user_id': ObjectId(user_id), 'day': day_key(when)},
+                {'$inc': increments, '$set': {'updated_at': datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            # Charts can be rebuilt by the backfill job, never fail the write itself
+            logger.error(f"Error updating daily rollup for user {user_id}: {str(e)}")
+
+    @staticmethod
+    def get_days(user_id, days=30):
+        """Rollup documents for the last ``days`` days, oldest first"""
+        start = day_key(datetime.utcnow() - timedelta(days=days))
+        return list(current_app.mongo.db.daily_rollups.find(
+            {'user_id': ObjectId(user_id), 'day': {'$gte': start}},
+            {'_id': 0, 'user_id': 0, 'updated_at': 0}
+        ).sort('day', 1))
+
+    @staticmethod
+    def series(rollups, field):
+        """{day: value} for days where ``field`` is non-zero, as the charts expect"""
+        return {doc['day']: doc[field] for doc in rollups if doc.get(field)}
+
+    @staticmethod
+    def category_totals(rollups, field):
+        """Sum a per-category sub-document across days"""
+        totals = {}
+        for doc in rollups:
+            for category, value in doc.get(field, {}).items():
+                totals[category] = totals.get(category, 0) + value
+        return totals
+
+    @staticmethod
+    def rebuild(user_id=None, job=None):
+        """Recompute rollups from sessions, tasks and rewards, for one user or everyone.
+
+        Each source collection is grouped server-side and $merge'd into
+        daily_rollups, so only the fields owned by that source are replaced.
+        """
+        match = {'user_id': ObjectId(user_id)} if user_id else {}
+        day = lambda field: {'$dateToString': {'format': '%Y-%m-%d', 'date': f'${field}'}}
+        merge = {'$merge': {
+            'into': 'daily_rollups',
+            'on': ['user_id', 'day'],
+            'whenMatched': 'merge',
+            'whenNotMatched': 'insert'
+        }}
+        db = current_app.mongo.db
+
+        if job:
+            job.update_progress(0, 3, 'Rolling up reading sessions')
+        db.reading_sessions.aggregate([
+            {'$match': {**match, 'date': {'$type': 'date'}}},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'day': day('date')},
+                'pages': {'$sum': {'$ifNull': ['$pages_read', 0]}},
+                'reading_minutes': {'$sum': {'$ifNull': ['$duration_minutes', {'$ifNull': ['$duration', 0]}]}},
+                'reading_sessions': {'$sum': 1}
+            }},
+            {'$project': {
+                '_id': 0, 'user_id': '$_id.user_id', 'day': '$_id.day',
+                'pages': 1, 'reading_minutes': 1, 'reading_sessions': 1
+            }},
+            merge
+        ])
+
+        if job:
+            job.update_progress(1, 3, 'Rolling up completed tasks')
+        db.completed_tasks.aggregate([
+            {'$match': {**match, 'completed_at': {'$type': 'date'}}},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'day': day('completed_at'), 'category': {'$ifNull': ['$category', 'general']}},
+                'tasks': {'$sum': 1},
+                'focus_minutes': {'$sum': {'$ifNull': ['$duration', 0]}}
+            }},
+            {'$group': {
+                '_id': {'user_id': '$_id.user_id', 'day': '$_id.day'},
+                'tasks': {'$sum': '$tasks'},
+                'focus_minutes': {'$sum': '$focus_minutes'},
+                'tasks_by_category': {'$push': {'k': '$_id.category', 'v': '$tasks'}},
+                'focus_by_category': {'$push': {'k': '$_id.category', 'v': '$focus_minutes'}}
+            }},
+            {'$project': {
+                '_id': 0, 'user_id': '$_id.user_id', 'day': '$_id.day',
+                'tasks': 1, 'focus_minutes': 1,
+                'tasks_by_category': {'$arrayToObject': '$tasks_by_category'},
+                'focus_by_category': {'$arrayToObject': '$focus_by_category'}
+            }},
+            merge
+        ])
+
+        if job:
+            job.update_progress(2, 3, 'Rolling up rewards')
+        db.rewards.aggregate([
+            {'$match': {**match, 'date': {'$type': 'date'}}},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'day': day('date'), 'category': {'$ifNull': ['$category', 'general']}},
+                'points': {'$sum': {'$ifNull': ['$points', 0]}}
+            }},
+            {'$group': {
+                '_id': {'user_id': '$_id.user_id', 'day': '$_id.day'},
+                'points': {'$sum': '$points'},
+                'points_by_category': {'$push': {'k': '$_id.category', 'v': '$points'}}
+            }},
+            {'$project': {
+                '_id': 0, 'user_id': '$_id.user_id', 'day': '$_id.day',
+                'points': 1,
+                'points_by_category': {'$arrayToObject': '$points_by_category'}
+            }},
+            merge
+        ])
+
+        if job:
+            job.update_progress(3, 3, 'Done')
+
+
+@register_job('rollup_backfill')
+def rollup_backfill_job(job, user_id=None):
+    """Job handler that rebuilds daily rollups from the raw collections"""
+    DailyRollups.rebuild(user_id, job=job)
@@ -0,0 +1,175 @@
+from flask import current_app
+from utils.versioning import bump_data_version
+from . import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how long per-user analytics are served from cache;
+# writes invalidate them sooner through AnalyticsService.invalidate
+ANALYTICS_CACHE_SECONDS = 600
+
+ANALYTICS_KINDS = ['books', 'sessions', 'tasks']
+
+
+def _counts(field, default=None):
+    """$facet branch counting documents per value of a field"""
+    key = {'$ifNull': [f'${field}', default]} if default is not None else f'${field}'
+    return [{'$group': {'_id': key, 'count': {'$sum': 1}}}]
+
+
+def _histogram(rows, size, offset=0):
+    """Turn [{'_id': n, 'count': c}] into a fixed-length list"""
+    values = [0] * size
+    for row in rows:
+        if row['_id'] is not None:
+            values[row['_id'] - offset] = row['count']
+    return values
+
+
+class AnalyticsService:
+    """Per-user analytics computed by one $facet pipeline per collection and cached"""
+
+    @staticmethod
+    def _cache_key(kind, user_id):
+        return f'analytics:{kind}:{user_id}'
+
+    @staticmethod
+    def _cached(kind, user_id, compute):
+        key = AnalyticsService._cache_key(kind, user_id)
+        result = cache.get(key)
+        if result is None:
+            result = compute(user_id)
+            cache.set(key, result, timeout=ANALYTICS_CACHE_SECONDS)
+        return result
+
+    @staticmethod
+    def invalidate(user_id, *kinds):
+        """Drop cached analytics for a user, for the given kinds or all of them.
+
+        Every book, session and task write lands here, so this also bumps the
+        user's data version that conditional API responses are keyed on.
+        """
+        try:
+            cache.delete_many(*[AnalyticsService._cache_key(kind, user_id) for kind in (kinds or ANALYTICS_KINDS)])
+        except Exception as e:
+            logger.error(f"Error invalidating analytics cache: {str(e)}")
+        bump_data_version(user_id)
+
+    @staticmethod
+    def book_stats(user_id):
+        """Status, genre and author histograms plus page and rating totals for a user's books"""
+        return AnalyticsService._cached('books', user_id, AnalyticsService._compute_book_stats)
+
+    @staticmethod
+    def session_stats(user_id):
+        """Weekday and hour histograms plus totals for a user's reading sessions"""
+        return AnalyticsService._cached('sessions', user_id, AnalyticsService._compute_session_stats)
+
+    @staticmethod
+    def task_stats(user_id):
+        """Category, mood, weekday and hour histograms plus totals for a user's completed tasks"""
+        return AnalyticsService._cached('tasks', user_id, AnalyticsService._compute_task_stats)
+
+    @staticmethod
+    def _compute_book_stats(user_id):
+        result = list(current_app.mongo.db.books.aggregate([
+            {'$match': {'user_id': user_id}},
+            {'$project': {'status': 1, 'genre': 1, 'authors': 1, 'current_page': 1, 'rating': 1}},
+            {'$facet': {
+                'by_status': _counts('status', 'unknown'),
+                'by_genre': _counts('genre'),
+                'top_authors': [
+                    {'$unwind': '$authors'},
+                    {'$group': {'_id': '$authors', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1, '_id': 1}},
+                    {'$limit': 10}
+                ],
+                'totals': [
+                    {'$group': {
+                        '_id': None,
+                        'count': {'$sum': 1},
+                        'pages': {'$sum': {'$ifNull': ['$current_page', 0]}}
+                    }}
+                ],
+                'ratings': [
+                    {'$match': {'rating': {'$gt': 0}}},
+                    {'$group': {'_id': None, 'avg': {'$avg': '$rating'}}}
+                ]
+            }}
+        ]))[0]
+
+        totals = result['totals'][0] if result['totals'] else {'count': 0, 'pages': 0}
+        return {
+            'total_books': totals['count'],
+            'total_pages': totals['pages'],
+            'avg_rating': result['ratings'][0]['avg'] if result['ratings'] else 0,
+            'by_status': {row['_id']: row['count'] for row in result['by_status']},
+            'by_genre': {row['_id']: row['count'] for row in result['by_genre']},
+            'top_authors': [(row['_id'], row['count']) for row in result['top_authors']]
+        }
+
+    @staticmethod
+    def _compute_session_stats(user_id):
+        result = list(current_app.mongo.db.reading_sessions.aggregate([
+            {'$match': {'user_id': user_id}},
+            {'$project': {'date': 1, 'pages_read': 1}},
+            {'$facet': {
+                'by_weekday': [{'$group': {'_id': {'$isoDayOfWeek': '$date'}, 'count': {'$sum': 1}}}],
+                'by_hour': [{'$group': {'_id': {'$hour': '$date'}, 'count': {'$sum': 1}}}],
+                'totals': [
+                    {'$group': {
+                        '_id': None,
+                        'count': {'$sum': 1},
+                        'pages': {'$sum': {'$ifNull': ['$pages_read', 0]}}
+                    }}
+                ]
+            }}
+        ]))[0]
+
+        totals = result['totals'][0] if result['totals'] else {'count': 0, 'pages': 0}
+        return {
+            'total_sessions': totals['count'],
+            'total_pages': totals['pages'],
+            # Monday = 0, Sunday = 6
+            'by_weekday': _histogram(result['by_weekday'], 7, offset=1),
+            'by_hour': _histogram(result['by_hour'], 24)
+        }
+
+    @staticmethod
+    def _compute_task_stats(user_id):
+        result = list(current_app.mongo.db.completed_tasks.aggregate([
+            {'$match': {'user_id': user_id}},
+            {'$project': {'category': 1, 'mood': 1, 'duration': 1, 'completed_at': 1}},
+            {'$facet': {
+                'by_category': [
+                    {'$group': {
+                        '_id': {'$ifNull': ['$category', 'general']},
+                        'count': {'$sum': 1},
+                        'time': {'$sum': {'$ifNull': ['$duration', 0]}}
+                    }}
+                ],
+                'by_mood': _counts('mood', '😊'),
+                'by_weekday': [{'$group': {'_id': {'$isoDayOfWeek': '$completed_at'}, 'count': {'$sum': 1}}}],
+                'by_hour': [{'$group': {'_id': {'$hour': '$completed_at'}, 'count': {'$sum': 1}}}],
+                'totals': [
+                    {'$group': {
+                        '_id': None,
+                        'count': {'$sum': 1},
+                        'time': {'$sum': {'$ifNull': ['$duration', 0]}}
+                    }}
+                ]
+            }}
+        ]))[0]
+
+        totals = result['totals'][0] if result['totals'] else {'count': 0, 'time': 0}
+        return {
+            'total_tasks': totals['count'],
+            'total_time': totals['time'],
+            'category_counts': {row['_id']: row['count'] for row in result['by_category']},
+            'category_time': {row['_id']: row['time'] for row in result['by_category']},
+            'by_mood': {row['_id']: row['count'] for row in result['by_mood']},
+            # Monday = 0, Sunday = 6
+            'by_weekday': _histogram(result['by_weekday'], 7, offset=1),
+            'by_hour': _histogram(result['by_hour'], 24)
+        }
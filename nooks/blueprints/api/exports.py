@@ -0,0 +1,181 @@
+from flask import current_app
+from bson import ObjectId
+from datetime import datetime, timedelta
+from utils.jobs import register_job
+import json
+import zlib
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ['json', 'ndjson']
+DEFAULT_BATCH_SIZE = 500
+
+# Prepared exports can be downloaded for this long, then their files are removed
+EXPORT_RETENTION_HOURS = 24
+
+
+def _json_default(value):
+    """Encode ObjectIds and datetimes the same way the original export did"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class UserDataExporter:
+    """Streams everything stored for one user without building it in memory"""
+
+    def __init__(self, user_id, export_format='json', batch_size=DEFAULT_BATCH_SIZE, on_section=None):
+        self.user_id = ObjectId(user_id)
+        self.export_format = export_format if export_format in EXPORT_FORMATS else 'json'
+        self.batch_size = batch_size
+        self.on_section = on_section
+
+    def sections(self):
+        """(name, collection, query, projection) for every section of the export"""
+        user_oid = self.user_id
+        user_str = str(self.user_id)
+        return [
+            ('books', 'books', {'user_id': user_oid}, None),
+            ('takeaways', 'book_takeaways', {'user_id': user_oid}, None),
+            ('book_quotes', 'book_quotes', {'user_id': user_oid}, None),
+            ('tasks', 'completed_tasks', {'user_id': user_oid}, None),
+            ('rewards', 'rewards', {'user_id': user_oid}, None),
+            ('badges', 'user_badges', {'user_id': user_oid}, None),
+            ('reading_sessions', 'reading_sessions', {'user_id': user_oid}, None),
+            ('quotes', 'quotes', {'user_id': user_oid}, None),
+            ('transactions', 'transactions', {'user_id': user_oid}, None),
+            ('purchases', 'user_purchases', {'user_id': user_oid}, None),
+            ('clubs', 'club_memberships', {'user_id': user_str}, {'club_id': 1, 'role': 1, 'joined_at': 1}),
+            ('club_posts', 'club_posts', {'user_id': user_str}, None),
+            ('club_chat_messages', 'club_chat_messages', {'user_id': user_str}, None),
+            ('flashcards', 'flashcards', {'user_id': user_str}, None),
+            ('quiz_answers', 'quiz_answers', {'user_id': user_str}, None)
+        ]
+
+    def _dumps(self, value):
+        return json.dumps(value, default=_json_default)
+
+    def _iter_documents(self, collection, query, projection):
+        return (current_app.mongo.db[collection]
+                .find(query, projection)
+                .sort('_id', 1)
+                .batch_size(self.batch_size))
+
+    def iter_text(self):
+        """Yield the export as text chunks, at most one cursor batch at a time"""
+        user = current_app.mongo.db.users.find_one({'_id': self.user_id}, {'password_hash': 0})
+        export_date = datetime.utcnow().isoformat()
+
+        if self.export_format == 'ndjson':
+            yield self._dumps({'section': 'meta', 'export_date': export_date}) + '\n'
+            yield self._dumps({'section': 'user', 'document': user}) + '\n'
+            for name, collection, query, projection in self.sections():
+                if self.on_section:
+                    self.on_section(name)
+                lines = []
+                for doc in self._iter_documents(collection, query, projection):
+                    lines.append(self._dumps({'section': name, 'document': doc}))
+                    if len(lines) >= self.batch_size:
+                        yield '\n'.join(lines) + '\n'
+                        lines = []
+                if lines:
+                    yield '\n'.join(lines) + '\n'
+            return
+
+        yield '{"export_date": ' + self._dumps(export_date)
+        yield ', "user": ' + self._dumps(user)
+        for name, collection, query, projection in self.sections():
+            if self.on_section:
+                self.on_section(name)
+            yield ', ' + self._dumps(name) + ': ['
+            lines = []
+            first = True
+            for doc in self._iter_documents(collection, query, projection):
+                lines.append(('' if first else ', ') + self._dumps(doc))
+                first = False
+                if len(lines) >= self.batch_size:
+                    yield ''.join(lines)
+                    lines = []
+            yield ''.join(lines) + ']'
+        yield '}'
+
+    def iter_bytes(self, compress=False):
+        """Yield the export encoded as UTF-8, optionally as a gzip stream"""
+        if not compress:
+            for text in self.iter_text():
+                yield text.encode('utf-8')
+            return
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for text in self.iter_text():
+            data = compressor.compress(text.encode('utf-8'))
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def filename(self, compress=False):
+        stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        return f"nooks_data_{stamp}.{self.export_format}{'.gz' if compress else ''}"
+
+    @staticmethod
+    def mimetype(export_format, compress=False):
+        if compress:
+            return 'application/gzip'
+        return 'application/x-ndjson' if export_format == 'ndjson' else 'application/json'
+
+
+def get_user_export_folder():
+    """Directory for prepared user exports, outside of the static folder"""
+    base = current_app.config.get('EXPORT_FOLDER') or os.path.join(current_app.instance_path, 'exports')
+    folder = os.path.join(base, 'users')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def remove_expired_exports():
+    """Delete prepared exports older than EXPORT_RETENTION_HOURS, returns how many were removed"""
+    folder = get_user_export_folder()
+    cutoff = datetime.utcnow() - timedelta(hours=EXPORT_RETENTION_HOURS)
+    removed = 0
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            if os.path.isfile(path) and datetime.utcfromtimestamp(os.path.getmtime(path)) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            logger.error(f"Error removing expired export {name}: {str(e)}")
+    if removed:
+        logger.info(f"Removed {removed} expired user exports")
+    return removed
+
+
+@register_job('user_data_export')
+def user_data_export_job(job, user_id, export_format='json', compress=True):
+    """Job handler that prepares a user's export for later download"""
+    # Every new export sweeps out the old ones
+    remove_expired_exports()
+
+    exporter = UserDataExporter(
+        user_id,
+        export_format,
+        on_section=lambda name: job.update_progress(message=f'Exporting {name}')
+    )
+    filename = f'{user_id}_{job.id}_{exporter.filename(compress)}'
+    path = os.path.join(get_user_export_folder(), filename)
+
+    with open(path, 'wb') as output:
+        for chunk in exporter.iter_bytes(compress):
+            output.write(chunk)
+
+    job.set_result({
+        'filename': filename,
+        'download_name': exporter.filename(compress),
+        'mimetype': UserDataExporter.mimetype(exporter.export_format, compress),
+        'expires_at': datetime.utcnow() + timedelta(hours=EXPORT_RETENTION_HOURS)
+    })
+    job.update_progress(message='Done')
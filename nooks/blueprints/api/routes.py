@@ -1,13 +1,20 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context, send_file, url_for
 from flask_login import login_required, current_user
 from bson import ObjectId
 from datetime import datetime, timedelta
+import os
 from blueprints.rewards.services import RewardService
+from blueprints.hook.timers import TimerStore
+from blueprints.analytics.rollups import DailyRollups
+from utils.jobs import JobQueue
+from utils.versioning import etag_by_data_version
+from .exports import UserDataExporter, get_user_export_folder
 
 api_bp = Blueprint('api', __name__)
 
 @api_bp.route('/user/stats')
 @login_required
+@etag_by_data_version(daily=True)
 def user_stats():
     user_id = ObjectId(current_user.id)
     
@@ -49,22 +56,10 @@ def user_stats():
 def reading_progress():
     user_id = ObjectId(current_user.id)
     
-    # Get reading sessions for the last 30 days
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    sessions = list(current_app.mongo.db.reading_sessions.find({
-        'user_id': user_id,
-        'date': {'$gte': thirty_days_ago}
-    }).sort('date', 1))
-    
-    # Group by date
-    daily_progress = {}
-    for session in sessions:
-        date_str = session['date'].strftime('%Y-%m-%d')
-        if date_str not in daily_progress:
-            daily_progress[date_str] = 0
-        daily_progress[date_str] += session.get('pages_read', 0)
+    # Get reading progress for the last 30 days
+    rollups = DailyRollups.get_days(user_id, days=30)
     
-    return jsonify(daily_progress)
+    return jsonify(DailyRollups.series(rollups, 'pages'))
 
 @api_bp.route('/tasks/analytics')
 @login_required
@@ -72,32 +67,19 @@ def task_analytics():
     user_id = ObjectId(current_user.id)
     
     # Get tasks for the last 30 days
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    tasks = list(current_app.mongo.db.completed_tasks.find({
-        'user_id': user_id,
-        'completed_at': {'$gte': thirty_days_ago}
-    }))
+    rollups = DailyRollups.get_days(user_id, days=30)
     
     # Group by category
-    category_stats = {}
-    for task in tasks:
-        category = task.get('category', 'general')
-        if category not in category_stats:
-            category_stats[category] = {'count': 0, 'time': 0}
-        category_stats[category]['count'] += 1
-        category_stats[category]['time'] += task['duration']
-    
-    # Daily completion
-    daily_completions = {}
-    for task in tasks:
-        date_str = task['completed_at'].strftime('%Y-%m-%d')
-        if date_str not in daily_completions:
-            daily_completions[date_str] = 0
-        daily_completions[date_str] += 1
+    category_counts = DailyRollups.category_totals(rollups, 'tasks_by_category')
+    category_time = DailyRollups.category_totals(rollups, 'focus_by_category')
+    category_stats = {
+        category: {'count': count, 'time': category_time.get(category, 0)}
+        for category, count in category_counts.items()
+    }
     
     return jsonify({
         'categories': category_stats,
-        'daily': daily_completions
+        'daily': DailyRollups.series(rollups, 'tasks')
     })
 
 @api_bp.route('/rewards/recent')
@@ -134,6 +116,7 @@ def search_books():
 
 @api_bp.route('/dashboard/summary')
 @login_required
+@etag_by_data_version(daily=True)
 def dashboard_summary():
     user_id = ObjectId(current_user.id)
     
@@ -163,33 +146,11 @@ def dashboard_summary():
 @login_required
 def timer_status():
     user_id = ObjectId(current_user.id)
-    timer = current_app.mongo.db.active_timers.find_one({'user_id': user_id})
-    
-    if timer:
-        now = datetime.utcnow()
-        elapsed = (now - timer['start_time']).total_seconds()
-        
-        # Account for paused time
-        if timer.get('is_paused', False) and 'pause_start' in timer:
-            elapsed -= (now - timer['pause_start']).total_seconds()
-        
-        elapsed -= timer.get('paused_time', 0)
-        remaining = (timer['duration'] * 60) - elapsed
-        
-        return jsonify({
-            'active': True,
-            'task_name': timer['task_name'],
-            'remaining': max(0, remaining),
-            'is_paused': timer.get('is_paused', False),
-            'timer_type': timer['timer_type'],
-            'category': timer['category'],
-            'priority': timer.get('priority', 'medium')
-        })
-    
-    return jsonify({'active': False})
+    return jsonify(TimerStore.serialize(TimerStore.get(user_id)))
 
 @api_bp.route('/achievements/progress')
 @login_required
+@etag_by_data_version()
 def achievements_progress():
     user_id = ObjectId(current_user.id)
     
@@ -243,44 +204,88 @@ def achievements_progress():
 @api_bp.route('/export/user_data')
 @login_required
 def export_user_data():
-    """Export user's data for backup or transfer"""
-    user_id = ObjectId(current_user.id)
+    """Stream user's data for backup or transfer"""
+    export_format = request.args.get('format', 'json')
+    compress = request.args.get('gzip', '0') in ('1', 'true')
     
-    # Get all user data
-    user = current_app.mongo.db.users.find_one({'_id': user_id})
-    books = list(current_app.mongo.db.books.find({'user_id': user_id}))
-    tasks = list(current_app.mongo.db.completed_tasks.find({'user_id': user_id}))
-    rewards = list(current_app.mongo.db.rewards.find({'user_id': user_id}))
-    badges = list(current_app.mongo.db.user_badges.find({'user_id': user_id}))
-    sessions = list(current_app.mongo.db.reading_sessions.find({'user_id': user_id}))
-    
-    # Convert ObjectIds to strings for JSON serialization
-    def convert_objectids(obj):
-        if isinstance(obj, list):
-            return [convert_objectids(item) for item in obj]
-        elif isinstance(obj, dict):
-            return {key: convert_objectids(value) for key, value in obj.items()}
-        elif isinstance(obj, ObjectId):
-            return str(obj)
-        elif isinstance(obj, datetime):
-            return obj.isoformat()
-        else:
-            return obj
-    
-    export_data = {
-        'export_date': datetime.utcnow().isoformat(),
-        'user': convert_objectids(user),
-        'books': convert_objectids(books),
-        'tasks': convert_objectids(tasks),
-        'rewards': convert_objectids(rewards),
-        'badges': convert_objectids(badges),
-        'reading_sessions': convert_objectids(sessions)
-    }
+    exporter = UserDataExporter(current_user.id, export_format)
     
-    return jsonify(export_data)
+    return Response(
+        stream_with_context(exporter.iter_bytes(compress)),
+        mimetype=UserDataExporter.mimetype(exporter.export_format, compress),
+        headers={'Content-Disposition': f'attachment; filename={exporter.filename(compress)}'}
+    )
+
+@api_bp.route('/export/user_data/prepare', methods=['POST'])
+@login_required
+def prepare_user_data_export():
+    """Prepare the user's export in the background for later download"""
+    payload = request.get_json(silent=True) or request.form
+    export_format = payload.get('format', 'json')
+    compress = str(payload.get('gzip', '1')).lower() in ('1', 'true')
+    
+    # Reuse an export that is still being prepared
+    existing = current_app.mongo.db.jobs.find_one({
+        'job_type': 'user_data_export',
+        'created_by': ObjectId(current_user.id),
+        'status': {'$in': ['pending', 'running']}
+    })
+    if existing:
+        return jsonify({'job_id': str(existing['_id']), 'status': existing['status']}), 202
+    
+    job_id, error = JobQueue.enqueue(
+        'user_data_export',
+        {'user_id': str(current_user.id), 'export_format': export_format, 'compress': compress},
+        created_by=current_user.id
+    )
+    if error:
+        return jsonify({'error': error}), 500
+    
+    return jsonify({'job_id': str(job_id), 'status': 'pending'}), 202
+
+@api_bp.route('/export/user_data/<job_id>')
+@login_required
+def user_data_export_status(job_id):
+    """Status of a prepared export"""
+    job = get_user_export_job(job_id)
+    if not job:
+        return jsonify({'error': 'Export not found'}), 404
+    
+    status = {'job_id': str(job['_id']), 'status': job['status']}
+    if job['status'] == 'completed':
+        expires_at = job['result'].get('expires_at')
+        if expires_at and expires_at <= datetime.utcnow():
+            status['status'] = 'expired'
+        else:
+            status['download_url'] = url_for('api.download_user_data_export', job_id=job_id)
+            status['expires_at'] = expires_at.isoformat() if expires_at else None
+    return jsonify(status)
+
+@api_bp.route('/export/user_data/<job_id>/download')
+@login_required
+def download_user_data_export(job_id):
+    """Download a prepared export"""
+    job = get_user_export_job(job_id)
+    if not job or job['status'] != 'completed':
+        return jsonify({'error': 'Export not available'}), 404
+    
+    result = job['result']
+    path = os.path.join(get_user_export_folder(), result['filename'])
+    expires_at = result.get('expires_at')
+    if (expires_at and expires_at <= datetime.utcnow()) or not os.path.exists(path):
+        return jsonify({'error': 'Export has expired'}), 410
+    
+    return send_file(path, mimetype=result['mimetype'], as_attachment=True, download_name=result['download_name'])
 
 # Helper functions
 
+def get_user_export_job(job_id):
+    """Get an export job only if it belongs to the current user"""
+    job = JobQueue.get_job(job_id)
+    if not job or job['job_type'] != 'user_data_export' or str(job.get('created_by')) != str(current_user.id):
+        return None
+    return job
+
 def calculate_reading_streak(user_id):
     """Calculate current reading streak"""
     sessions = list(current_app.mongo.db.reading_sessions.find({
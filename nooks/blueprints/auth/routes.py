@@ -6,8 +6,12 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from bson import ObjectId
 from flask_login import login_user, logout_user, login_required, current_user
 from models import UserModel, User
+from blueprints.rewards.services import RewardService
 import logging
-from blueprints.themes.routes import get_available_themes, get_timer_themes, get_available_avatars, get_free_avatar_styles, get_avatar_customization_options, validate_avatar_options
+from blueprints.themes.catalog import (
+    THEME_CHOICES, TIMER_THEME_CHOICES, DASHBOARD_LAYOUT_CHOICES, AVATAR_OPTION_CHOICES,
+    DEFAULT_AVATAR_STYLE, avatar_choices, validate_avatar_options
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -33,17 +37,13 @@ class RegisterForm(FlaskForm):
 # Flask-WTF Form for Settings
 class SettingsForm(FlaskForm):
     notifications = BooleanField('Enable Notifications')
-    theme = SelectField('Theme', choices=[(t['name'], t['display_name']) for t in get_available_themes()])
+    theme = SelectField('Theme', choices=THEME_CHOICES)
     timer_sound = BooleanField('Enable Timer Sound')
     default_timer_duration = IntegerField('Default Timer Duration (minutes)', validators=[DataRequired()])
     animations = BooleanField('Enable Animations')
     compact_mode = BooleanField('Compact Mode')
-    timer_theme = SelectField('Timer Theme', choices=[(t['name'], t['display_name']) for t in get_timer_themes()])
-    dashboard_layout = SelectField('Dashboard Layout', choices=[
-        ('default', 'Default'),
-        ('compact', 'Compact'),
-        ('detailed', 'Detailed')
-    ])
+    timer_theme = SelectField('Timer Theme', choices=TIMER_THEME_CHOICES)
+    dashboard_layout = SelectField('Dashboard Layout', choices=DASHBOARD_LAYOUT_CHOICES)
     submit = SubmitField('Save Settings')
 
 # Flask-WTF Form for Change Password
@@ -169,24 +169,20 @@ def settings():
     settings_form = SettingsForm()
     change_password_form = ChangePasswordForm()
     avatar_form = AvatarForm()
+    user = current_app.mongo.db.users.find_one({'_id': ObjectId(current_user.id)})
 
     # Dynamically populate avatar style choices
-    user_purchases = current_app.mongo.db.user_purchases.find({'user_id': ObjectId(current_user.id), 'type': 'avatar_style'})
-    purchased_styles = [p['item_id'] for p in user_purchases]
-    free_styles = get_free_avatar_styles()
-    available_styles = [(style['style'], style['display_name']) for style in get_available_avatars() 
-                        if style['style'] in free_styles or style['style'] in purchased_styles]
+    available_styles = avatar_choices(RewardService.owned_items(user))
     if not available_styles:
         available_styles = [('avataaars', 'Avataaars')]  # Default fallback
         logger.warning("No available avatar styles found, using default")
     avatar_form.avatar_style.choices = available_styles
 
     # Dynamically populate customization options
-    user = current_app.mongo.db.users.find_one({'_id': ObjectId(current_user.id)})
     current_style = user.get('preferences', {}).get('avatar', {}).get('style', 'avataaars')
-    customization_options = get_avatar_customization_options(current_style)
-    avatar_form.hair.choices = [(opt, opt) for opt in customization_options.get('hair', ['short01', 'long01'])]
-    avatar_form.background_color.choices = [(opt, opt) for opt in customization_options.get('backgroundColor', ['#ffffff', '#000000'])]
+    option_choices = AVATAR_OPTION_CHOICES.get(current_style) or AVATAR_OPTION_CHOICES[DEFAULT_AVATAR_STYLE]
+    avatar_form.hair.choices = option_choices.get('hair', AVATAR_OPTION_CHOICES[DEFAULT_AVATAR_STYLE]['hair'])
+    avatar_form.background_color.choices = option_choices['backgroundColor']
 
     # Pre-populate forms with existing user data
     if user and 'preferences' in user:
@@ -253,20 +249,16 @@ def update_avatar_settings():
     avatar_form = AvatarForm()
     user = current_app.mongo.db.users.find_one({'_id': ObjectId(current_user.id)})
     # Dynamically populate avatar style choices
-    user_purchases = current_app.mongo.db.user_purchases.find({'user_id': ObjectId(current_user.id), 'type': 'avatar_style'})
-    purchased_styles = [p['item_id'] for p in user_purchases]
-    free_styles = get_free_avatar_styles()
-    available_styles = [(style['style'], style['display_name']) for style in get_available_avatars() 
-                        if style['style'] in free_styles or style['style'] in purchased_styles]
+    available_styles = avatar_choices(RewardService.owned_items(user))
     if not available_styles:
         available_styles = [('avataaars', 'Avataaars')]
         logger.warning("No available avatar styles found, using default")
     avatar_form.avatar_style.choices = available_styles
     # Dynamically populate customization options
     current_style = avatar_form.avatar_style.data or user.get('preferences', {}).get('avatar', {}).get('style', 'avataaars')
-    customization_options = get_avatar_customization_options(current_style)
-    avatar_form.hair.choices = [(opt, opt) for opt in customization_options.get('hair', ['short01', 'long01'])]
-    avatar_form.background_color.choices = [(opt, opt) for opt in customization_options.get('backgroundColor', ['#ffffff', '#000000'])]
+    option_choices = AVATAR_OPTION_CHOICES.get(current_style) or AVATAR_OPTION_CHOICES[DEFAULT_AVATAR_STYLE]
+    avatar_form.hair.choices = option_choices.get('hair', AVATAR_OPTION_CHOICES[DEFAULT_AVATAR_STYLE]['hair'])
+    avatar_form.background_color.choices = option_choices['backgroundColor']
     
     if avatar_form.validate_on_submit():
         avatar_options = {
@@ -274,8 +266,8 @@ def update_avatar_settings():
             'backgroundColor': avatar_form.background_color.data,
             'flip': avatar_form.flip.data
         }
-        is_valid, error = validate_avatar_options(avatar_form.avatar_style.data, avatar_options)
-        if not is_valid:
+        avatar_options, error = validate_avatar_options(avatar_form.avatar_style.data, avatar_options)
+        if error:
             logger.warning(f"Avatar form validation failed for user_id: {current_user.id} - {error}")
             flash(f"Avatar Settings - Invalid avatar options: {error}", 'error')
             return redirect(url_for('auth.settings'))
@@ -3,6 +3,9 @@ from flask_login import login_required  # Changed import to use Flask-Login
 from bson import ObjectId
 from datetime import datetime, timedelta
 from blueprints.rewards.services import RewardService
+from blueprints.analytics.services import AnalyticsService
+from blueprints.analytics.rollups import DailyRollups
+from utils.versioning import etag_by_data_version
 
 dashboard_bp = Blueprint('dashboard', __name__, template_folder='templates')
 
@@ -88,6 +91,7 @@ def set_goal():
 
 @dashboard_bp.route('/api/stats')
 @login_required
+@etag_by_data_version(daily=True)
 def api_stats():
     user_id = ObjectId(session['user_id'])
     stats = get_user_dashboard_stats(user_id)
@@ -99,21 +103,9 @@ def api_reading_progress():
     user_id = ObjectId(session['user_id'])
    
     # Get reading progress for last 30 days
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    sessions = list(current_app.mongo.db.reading_sessions.find({
-        'user_id': user_id,
-        'date': {'$gte': thirty_days_ago}
-    }).sort('date', 1))
-   
-    # Group by date
-    daily_progress = {}
-    for session in sessions:
-        date_str = session['date'].strftime('%Y-%m-%d')
-        if date_str not in daily_progress:
-            daily_progress[date_str] = 0
-        daily_progress[date_str] += session.get('pages_read', 0)
-   
-    return jsonify(daily_progress)
+    rollups = DailyRollups.get_days(user_id, days=30)
+   
+    return jsonify(DailyRollups.series(rollups, 'pages'))
 
 @dashboard_bp.route('/api/productivity_progress')
 @login_required
@@ -121,29 +113,11 @@ def api_productivity_progress():
     user_id = ObjectId(session['user_id'])
    
     # Get task completion for last 30 days
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    tasks = list(current_app.mongo.db.completed_tasks.find({
-        'user_id': user_id,
-        'completed_at': {'$gte': thirty_days_ago}
-    }).sort('completed_at', 1))
-   
-    # Group by date
-    daily_tasks = {}
-    daily_time = {}
-   
-    for task in tasks:
-        date_str = task['completed_at'].strftime('%Y-%m-%d')
-       
-        if date_str not in daily_tasks:
-            daily_tasks[date_str] = 0
-            daily_time[date_str] = 0
-       
-        daily_tasks[date_str] += 1
-        daily_time[date_str] += task.get('duration', 0)
+    rollups = DailyRollups.get_days(user_id, days=30)
    
     return jsonify({
-        'tasks': daily_tasks,
-        'time': daily_time
+        'tasks': DailyRollups.series(rollups, 'tasks'),
+        'time': DailyRollups.series(rollups, 'focus_minutes')
     })
 
 @dashboard_bp.route('/api/category_breakdown')
@@ -191,18 +165,15 @@ def api_streaks():
 # Helper functions
 def get_user_dashboard_stats(user_id):
     """Get comprehensive dashboard statistics for user"""
+    book_stats = AnalyticsService.book_stats(user_id)
+    task_stats = AnalyticsService.task_stats(user_id)
+   
     # Basic counts
-    total_books = current_app.mongo.db.books.count_documents({'user_id': user_id})
-    finished_books = current_app.mongo.db.books.count_documents({
-        'user_id': user_id,
-        'status': 'finished'
-    })
-    reading_books = current_app.mongo.db.books.count_documents({
-        'user_id': user_id,
-        'status': 'reading'
-    })
+    total_books = book_stats['total_books']
+    finished_books = book_stats['by_status'].get('finished', 0)
+    reading_books = book_stats['by_status'].get('reading', 0)
    
-    total_tasks = current_app.mongo.db.completed_tasks.count_documents({'user_id': user_id})
+    total_tasks = task_stats['total_tasks']
    
     # Time-based stats
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -225,16 +196,10 @@ def get_user_dashboard_stats(user_id):
     })
    
     # Reading stats
-    total_pages = sum([
-        book.get('current_page', 0)
-        for book in current_app.mongo.db.books.find({'user_id': user_id})
-    ])
+    total_pages = book_stats['total_pages']
    
     # Focus time
-    total_focus_time = sum([
-        task.get('duration', 0)
-        for task in current_app.mongo.db.completed_tasks.find({'user_id': user_id})
-    ])
+    total_focus_time = task_stats['total_time']
    
     # Points and level
     total_points = RewardService.get_user_total_points(user_id)
@@ -305,89 +270,52 @@ def get_recent_activity(user_id):
     }
 
 def get_progress_data(user_id):
-    """Get progress data for charts"""
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-   
-    # Reading progress
-    reading_sessions = list(current_app.mongo.db.reading_sessions.find({
-        'user_id': user_id,
-        'date': {'$gte': thirty_days_ago}
-    }).sort('date', 1))
-   
-    # Task completion
-    completed_tasks = list(current_app.mongo.db.completed_tasks.find({
-        'user_id': user_id,
-        'completed_at': {'$gte': thirty_days_ago}
-    }).sort('completed_at', 1))
-   
-    # Points earned
-    rewards = list(current_app.mongo.db.rewards.find({
-        'user_id': user_id,
-        'date': {'$gte': thirty_days_ago}
-    }).sort('date', 1))
+    """Get progress data for charts, one rollup document per active day"""
+    rollups = DailyRollups.get_days(user_id, days=30)
    
     return {
-        'reading_sessions': reading_sessions,
-        'completed_tasks': completed_tasks,
-        'rewards': rewards
+        'days': rollups,
+        'pages': DailyRollups.series(rollups, 'pages'),
+        'tasks': DailyRollups.series(rollups, 'tasks'),
+        'focus_minutes': DailyRollups.series(rollups, 'focus_minutes'),
+        'points': DailyRollups.series(rollups, 'points')
     }
 
 def get_reading_analytics(user_id):
     """Get detailed reading analytics"""
-    books = list(current_app.mongo.db.books.find({'user_id': user_id}))
-    sessions = list(current_app.mongo.db.reading_sessions.find({'user_id': user_id}))
+    book_stats = AnalyticsService.book_stats(user_id)
+    session_stats = AnalyticsService.session_stats(user_id)
    
     # Genre distribution
     genre_counts = {}
-    for book in books:
-        genre = book.get('genre', 'Unknown')
-        genre_counts[genre] = genre_counts.get(genre, 0) + 1
+    for genre, count in book_stats['by_genre'].items():
+        genre = genre if genre is not None else 'Unknown'
+        genre_counts[genre] = genre_counts.get(genre, 0) + count
    
     # Reading pace (pages per session)
-    total_pages = sum([session.get('pages_read', 0) for session in sessions])
-    avg_pages_per_session = total_pages / max(1, len(sessions))
-   
-    # Favorite authors
-    author_counts = {}
-    for book in books:
-        for author in book.get('authors', []):
-            author_counts[author] = author_counts.get(author, 0) + 1
-   
-    top_authors = sorted(author_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+    avg_pages_per_session = session_stats['total_pages'] / max(1, session_stats['total_sessions'])
    
     return {
         'genre_distribution': genre_counts,
         'avg_pages_per_session': round(avg_pages_per_session, 1),
-        'total_reading_sessions': len(sessions),
-        'top_authors': top_authors,
+        'total_reading_sessions': session_stats['total_sessions'],
+        'top_authors': book_stats['top_authors'],
         'books_by_status': {
-            'finished': len([b for b in books if b.get('status') == 'finished']),
-            'reading': len([b for b in books if b.get('status') == 'reading']),
-            'to_read': len([b for b in books if b.get('status') == 'to_read'])
+            'finished': book_stats['by_status'].get('finished', 0),
+            'reading': book_stats['by_status'].get('reading', 0),
+            'to_read': book_stats['by_status'].get('to_read', 0)
         }
     }
 
 def get_productivity_analytics(user_id):
     """Get detailed productivity analytics"""
-    tasks = list(current_app.mongo.db.completed_tasks.find({'user_id': user_id}))
-   
-    # Category distribution
-    category_counts = {}
-    category_time = {}
-   
-    for task in tasks:
-        category = task.get('category', 'general')
-        category_counts[category] = category_counts.get(category, 0) + 1
-        category_time[category] = category_time.get(category, 0) + task.get('duration', 0)
-   
-    # Time of day analysis
-    hour_counts = {}
-    for task in tasks:
-        hour = task['completed_at'].hour
-        hour_counts[hour] = hour_counts.get(hour, 0) + 1
+    task_stats = AnalyticsService.task_stats(user_id)
+    category_counts = task_stats['category_counts']
+    category_time = task_stats['category_time']
    
     # Most productive hour
-    most_productive_hour = max(hour_counts.items(), key=lambda x: x[1])[0] if hour_counts else 12
+    hour_counts = task_stats['by_hour']
+    most_productive_hour = hour_counts.index(max(hour_counts)) if any(hour_counts) else 12
    
     # Average session length by category
     avg_session_by_category = {}
@@ -401,48 +329,23 @@ def get_productivity_analytics(user_id):
         'category_time': category_time,
         'avg_session_by_category': avg_session_by_category,
         'most_productive_hour': most_productive_hour,
-        'total_focus_time': sum(category_time.values()),
-        'avg_session_length': round(sum(category_time.values()) / max(1, len(tasks)), 1)
+        'total_focus_time': task_stats['total_time'],
+        'avg_session_length': round(task_stats['total_time'] / max(1, task_stats['total_tasks']), 1)
     }
 
 def get_time_analytics(user_id):
     """Get time-based analytics"""
-    # Weekly patterns
-    tasks = list(current_app.mongo.db.completed_tasks.find({'user_id': user_id}))
-    sessions = list(current_app.mongo.db.reading_sessions.find({'user_id': user_id}))
-   
-    # Day of week analysis
-    weekday_tasks = [0] * 7  # Monday = 0, Sunday = 6
-    weekday_reading = [0] * 7
-   
-    for task in tasks:
-        weekday = task['completed_at'].weekday()
-        weekday_tasks[weekday] += 1
-   
-    for session in sessions:
-        weekday = session['date'].weekday()
-        weekday_reading[weekday] += 1
-   
-    # Hour of day analysis
-    hour_tasks = [0] * 24
-    hour_reading = [0] * 24
-   
-    for task in tasks:
-        hour = task['completed_at'].hour
-        hour_tasks[hour] += 1
-   
-    for session in sessions:
-        hour = session['date'].hour
-        hour_reading[hour] += 1
+    task_stats = AnalyticsService.task_stats(user_id)
+    session_stats = AnalyticsService.session_stats(user_id)
    
     return {
         'weekday_patterns': {
-            'tasks': weekday_tasks,
-            'reading': weekday_reading
+            'tasks': task_stats['by_weekday'],
+            'reading': session_stats['by_weekday']
         },
         'hourly_patterns': {
-            'tasks': hour_tasks,
-            'reading': hour_reading
+            'tasks': task_stats['by_hour'],
+            'reading': session_stats['by_hour']
         }
     }
 
@@ -1,7 +1,22 @@
 from flask import current_app
 from blueprints.rewards.services import RewardService
+from utils.jobs import JobQueue, register_job, LEASE_SECONDS
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Webhook fields kept on the recorded event; the signature is not stored
+PAYMENT_EVENT_FIELDS = ('transaction_id', 'status', 'message', 'amount', 'currency', 'reference')
+
+PAYMENT_EVENT_MAX_ATTEMPTS = 5
+
+# An event marked as being queued but without a job after this long was
+# left behind by a crashed request, the next delivery may queue it
+QUEUE_CLAIM_SECONDS = 300
 
 class DonorRewardService(RewardService):
     """Service class for handling donor-specific rewards and leaderboards"""
@@ -13,26 +28,44 @@ class DonorRewardService(RewardService):
     }
 
     @staticmethod
-    def award_donor_badge(user_id, tier):
-        """Award a donor badge based on tier"""
+    def award_donor_badge(user_id, tier, event_id):
+        """Award the donor badge of a tier for one payment event.
+
+        Every write is keyed on the event: the badge insert is guarded by the
+        unique (user_id, badge_id) index and remembers the event, and both
+        point awards go through award_points_once, so a retry after a
+        partial failure finishes the work without paying anything twice.
+        """
         if tier not in DonorRewardService.DONOR_BADGES:
             return False
 
         badge = DonorRewardService.DONOR_BADGES[tier]
         badge_id = badge['id']
-        description = badge['description']
-        points = badge['points']
+        try:
+            current_app.mongo.db.user_badges.insert_one({
+                'user_id': user_id,
+                'badge_id': badge_id,
+                'description': badge['description'],
+                'earned_at': datetime.utcnow(),
+                'event_id': event_id
+            })
+            newly_earned = True
+        except DuplicateKeyError:
+            existing = current_app.mongo.db.user_badges.find_one({'user_id': user_id, 'badge_id': badge_id}, {'event_id': 1})
+            if not existing or existing.get('event_id') != event_id:
+                # Earned with an earlier donation, nothing to award
+                return True
+            newly_earned = False
 
-        # Check if badge already awarded
-        if not RewardService._has_badge(user_id, badge_id):
-            RewardService._award_badge(user_id, badge_id, description)
-            RewardService.award_points(
-                user_id=user_id,
-                points=points,
-                source='donation',
-                description=f'Earned {badge["name"]} badge for donation',
-                category='donation'
-            )
+        RewardService.award_points_once(
+            user_id, f'{event_id}:badge', 25,
+            source='system', description=f'Earned badge: {badge["description"]}', category='badge'
+        )
+        RewardService.award_points_once(
+            user_id, f'{event_id}:donor', badge['points'],
+            source='donation', description=f'Earned {badge["name"]} badge for donation', category='donation'
+        )
+        if newly_earned:
             from models import ActivityLogger
             ActivityLogger.log_activity(
                 user_id=user_id,
@@ -69,3 +102,139 @@ class DonorRewardService(RewardService):
                 })
 
         return leaderboard
+
+
+class PaymentEventService:
+    """Payment provider webhooks, recorded once and processed in the background.
+
+    Each webhook is stored in payment_events under the idempotency key
+    transaction_id:status before it is acknowledged, so a provider retry
+    of the same notification finds the existing event. Queueing and
+    processing are each claimed with a conditional update, so only one
+    request queues the job and only one job applies the event at a time;
+    the awards themselves are keyed on the event for retries.
+    """
+
+    @staticmethod
+    def event_key(transaction_id, status):
+        return f'{transaction_id}:{status}'
+
+    @staticmethod
+    def record(webhook_data):
+        """Store a verified webhook and queue its processing. Returns (event_id, duplicate, error)"""
+        event_id = PaymentEventService.event_key(webhook_data.get('transaction_id'), webhook_data.get('status'))
+        now = datetime.utcnow()
+        try:
+            current_app.mongo.db.payment_events.insert_one({
+                '_id': event_id,
+                'transaction_id': webhook_data.get('transaction_id'),
+                'status': webhook_data.get('status'),
+                'data': {field: webhook_data[field] for field in PAYMENT_EVENT_FIELDS if field in webhook_data},
+                'job_id': None,
+                'queued_at': now,
+                'received_at': now,
+                'processing_by': None,
+                'processing_until': None,
+                'processed_at': None
+            })
+            duplicate = False
+        except DuplicateKeyError:
+            # Queue it only if no job exists and nobody is queueing it right now
+            claimed = current_app.mongo.db.payment_events.find_one_and_update(
+                {
+                    '_id': event_id,
+                    'job_id': None,
+                    '$or': [{'queued_at': None}, {'queued_at': {'$lt': now - timedelta(seconds=QUEUE_CLAIM_SECONDS)}}]
+                },
+                {'$set': {'queued_at': now}}
+            )
+            if not claimed:
+                return event_id, True, None
+            duplicate = True
+
+        job_id, error = JobQueue.enqueue(
+            'process_payment_event', {'event_id': event_id}, max_attempts=PAYMENT_EVENT_MAX_ATTEMPTS
+        )
+        if error:
+            # Release the claim so the provider's retry can queue it
+            current_app.mongo.db.payment_events.update_one({'_id': event_id}, {'$set': {'queued_at': None}})
+            return event_id, duplicate, error
+        current_app.mongo.db.payment_events.update_one({'_id': event_id}, {'$set': {'job_id': job_id}})
+        return event_id, duplicate, None
+
+    @staticmethod
+    def process(event_id, worker):
+        """Apply a recorded event to its donation; safe to run again after a partial failure.
+
+        ``worker`` identifies the caller (the job id), a retry of the same job
+        may take over its own claim straight away, anyone else waits for it
+        to lapse.
+        """
+        now = datetime.utcnow()
+        event = current_app.mongo.db.payment_events.find_one_and_update(
+            {
+                '_id': event_id,
+                'processed_at': None,
+                '$or': [
+                    {'processing_by': None},
+                    {'processing_by': worker},
+                    {'processing_until': {'$lt': now}}
+                ]
+            },
+            {'$set': {'processing_by': worker, 'processing_until': now + timedelta(seconds=LEASE_SECONDS)}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not event:
+            current = current_app.mongo.db.payment_events.find_one({'_id': event_id}, {'processed_at': 1})
+            if not current:
+                raise ValueError(f'Payment event {event_id} not found')
+            if current.get('processed_at'):
+                return 'already_processed'
+            # Raising lets the job queue look again once the other claim is done or lapsed
+            raise RuntimeError(f'Payment event {event_id} is being processed elsewhere')
+
+        transaction_id = event['transaction_id']
+        donation = current_app.mongo.db.donations.find_one({'transaction_id': transaction_id})
+        if not donation:
+            # The webhook can beat the insert that follows payment initiation,
+            # raising lets the job queue retry with backoff
+            raise ValueError(f'Donation not found for transaction {transaction_id}')
+
+        from models import ActivityLogger
+        if event['status'] == 'SUCCESS':
+            # Awards are keyed on the event, so they run before the status
+            # flip that gates the one-off activity entry
+            DonorRewardService.award_donor_badge(donation['user_id'], donation['tier'], event_id)
+            result = current_app.mongo.db.donations.update_one(
+                {'_id': donation['_id'], 'status': {'$ne': 'completed'}},
+                {'$set': {'status': 'completed', 'completed_at': datetime.utcnow()}}
+            )
+            if result.modified_count:
+                ActivityLogger.log_activity(
+                    user_id=donation['user_id'],
+                    action='donation_completed',
+                    description=f'Completed {donation["tier"].title()} tier donation of ₦{donation["amount"]}',
+                    metadata={'transaction_id': transaction_id}
+                )
+            outcome = 'completed'
+        else:
+            # A late failure notice never undoes a completed donation
+            current_app.mongo.db.donations.update_one(
+                {'_id': donation['_id'], 'status': 'pending'},
+                {'$set': {'status': 'failed', 'failed_at': datetime.utcnow()}}
+            )
+            logger.error(f"Payment failed for transaction {transaction_id}: {event.get('data', {}).get('message')}")
+            outcome = 'failed'
+
+        current_app.mongo.db.payment_events.update_one(
+            {'_id': event_id, 'processing_by': worker},
+            {'$set': {'processed_at': datetime.utcnow(), 'outcome': outcome, 'processing_until': None}}
+        )
+        return outcome
+
+
+@register_job('process_payment_event')
+def process_payment_event_job(job, event_id):
+    """Background job: apply one recorded payment webhook"""
+    outcome = PaymentEventService.process(event_id, str(job.id))
+    job.set_result({'event_id': event_id, 'outcome': outcome})
@@ -7,7 +7,7 @@ from bson import ObjectId
 from datetime import datetime
 import logging
 from blueprints.integrations.payment import OpayPayment
-from blueprints.donations.donor_services import DonorRewardService
+from blueprints.donations.donor_services import PaymentEventService
 from . import donations_bp  # Import the Blueprint from __init__.py
 
 logger = logging.getLogger(__name__)
@@ -89,54 +89,24 @@ def donate():
 
 @donations_bp.route('/payment/callback', methods=['POST'])
 def payment_callback():
+    """Verify, record and acknowledge a provider webhook; processing happens in a job"""
     try:
         payment = OpayPayment()
-        webhook_data = request.json
+        webhook_data = request.get_json(silent=True) or {}
         
-        # Verify webhook signature (implement as per Opay docs)
         if not payment.verify_webhook(webhook_data):
             logger.error("Invalid webhook signature")
             return jsonify({'status': 'error', 'message': 'Invalid signature'}), 400
+        if not webhook_data.get('transaction_id') or not webhook_data.get('status'):
+            return jsonify({'status': 'error', 'message': 'Missing transaction_id or status'}), 400
         
-        transaction_id = webhook_data.get('transaction_id')
-        status = webhook_data.get('status')
+        event_id, duplicate, error = PaymentEventService.record(webhook_data)
+        if error:
+            # Not acknowledged, so the provider retries and the event gets queued then
+            logger.error(f"Could not queue payment event {event_id}: {error}")
+            return jsonify({'status': 'error', 'message': 'Webhook processing failed'}), 500
         
-        donation = current_app.mongo.db.donations.find_one({'transaction_id': transaction_id})
-        if not donation:
-            logger.error(f"Donation not found for transaction {transaction_id}")
-            return jsonify({'status': 'error', 'message': 'Donation not found'}), 404
-        
-        user_id = donation['user_id']
-        amount = donation['amount']
-        tier = donation['tier']
-        
-        if status == 'SUCCESS':
-            # Update donation status
-            current_app.mongo.db.donations.update_one(
-                {'transaction_id': transaction_id},
-                {'$set': {'status': 'completed', 'completed_at': datetime.utcnow()}}
-            )
-            
-            # Award donor badge
-            DonorRewardService.award_donor_badge(user_id, tier)
-            
-            # Log activity
-            from models import ActivityLogger
-            ActivityLogger.log_activity(
-                user_id=user_id,
-                action='donation_completed',
-                description=f'Completed {tier.title()} tier donation of ₦{amount}',
-                metadata={'transaction_id': transaction_id}
-            )
-            
-            return jsonify({'status': 'success'})
-        else:
-            current_app.mongo.db.donations.update_one(
-                {'transaction_id': transaction_id},
-                {'$set': {'status': 'failed', 'failed_at': datetime.utcnow()}}
-            )
-            logger.error(f"Payment failed for transaction {transaction_id}: {webhook_data.get('message')}")
-            return jsonify({'status': 'error', 'message': 'Payment failed'}), 400
+        return jsonify({'status': 'success', 'event_id': event_id, 'duplicate': duplicate})
     
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}", exc_info=True)
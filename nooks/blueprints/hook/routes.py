@@ -3,6 +3,9 @@ from flask_login import login_required, current_user
 from bson import ObjectId
 from datetime import datetime, timedelta
 from blueprints.rewards.services import RewardService
+from blueprints.analytics.services import AnalyticsService
+from blueprints.analytics.rollups import DailyRollups
+from .timers import TimerStore
 
 hook_bp = Blueprint('hook', __name__, template_folder='templates')
 
@@ -17,7 +20,7 @@ def index():
     }).sort('completed_at', -1).limit(10))
     
     # Get active timer if any
-    active_timer = current_app.mongo.db.active_timers.find_one({'user_id': user_id})
+    active_timer = TimerStore.get(user_id)
     
     # Calculate stats
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -56,7 +59,7 @@ def index():
 @login_required
 def timer():
     user_id = ObjectId(current_user.id)
-    active_timer = current_app.mongo.db.active_timers.find_one({'user_id': user_id})
+    active_timer = TimerStore.get(user_id)
     
     # Get user preferences
     user = current_app.mongo.db.users.find_one({'_id': user_id})
@@ -89,25 +92,8 @@ def start_timer():
     category = request.form.get('category', 'general')
     priority = request.form.get('priority', 'medium')
     
-    # Clear any existing active timer
-    current_app.mongo.db.active_timers.delete_many({'user_id': user_id})
-    
-    # Create new timer
-    timer_data = {
-        'user_id': user_id,
-        'task_name': task_name,
-        'duration': duration,
-        'timer_type': timer_type,
-        'category': category,
-        'priority': priority,
-        'start_time': datetime.utcnow(),
-        'end_time': datetime.utcnow() + timedelta(minutes=duration),
-        'is_paused': False,
-        'paused_time': 0,
-        'pause_count': 0
-    }
-    
-    current_app.mongo.db.active_timers.insert_one(timer_data)
+    # Replaces any existing active timer
+    TimerStore.start(user_id, task_name, duration, timer_type, category, priority)
     
     return jsonify({'status': 'success', 'message': 'Timer started!'})
 
@@ -116,27 +102,9 @@ def start_timer():
 def pause_timer():
     user_id = ObjectId(current_user.id)
     
-    timer = current_app.mongo.db.active_timers.find_one({'user_id': user_id})
+    timer = TimerStore.toggle_pause(user_id)
     if timer:
-        is_paused = not timer.get('is_paused', False)
-        update_data = {'is_paused': is_paused}
-        
-        if is_paused:
-            update_data['pause_start'] = datetime.utcnow()
-            update_data['pause_count'] = timer.get('pause_count', 0) + 1
-        else:
-            # Calculate paused time
-            if 'pause_start' in timer:
-                paused_duration = (datetime.utcnow() - timer['pause_start']).total_seconds()
-                update_data['paused_time'] = timer.get('paused_time', 0) + paused_duration
-                update_data['end_time'] = timer['end_time'] + timedelta(seconds=paused_duration)
-        
-        current_app.mongo.db.active_timers.update_one(
-            {'user_id': user_id},
-            {'$set': update_data}
-        )
-        
-        status = 'paused' if is_paused else 'resumed'
+        status = 'paused' if timer.get('is_paused') else 'resumed'
         return jsonify({'status': 'success', 'message': f'Timer {status}!'})
     
     return jsonify({'status': 'error', 'message': 'No active timer found'})
@@ -146,8 +114,11 @@ def pause_timer():
 def complete_timer():
     user_id = ObjectId(current_user.id)
     
-    timer = current_app.mongo.db.active_timers.find_one({'user_id': user_id})
+    # The timer is only removed once the task and its points are recorded,
+    # both keyed on this run of the timer so a retry or double submit is a no-op
+    timer = TimerStore.get(user_id)
     if timer:
+        timer_key = TimerStore.completion_key(timer)
         mood = request.form.get('mood', '😊')
         productivity_rating = int(request.form.get('productivity_rating', 3))
         notes = request.form.get('notes', '')
@@ -174,7 +145,23 @@ def complete_timer():
             'paused_time': timer.get('paused_time', 0)
         }
         
-        result = current_app.mongo.db.completed_tasks.insert_one(completed_task)
+        result = current_app.mongo.db.completed_tasks.update_one(
+            {'timer_key': timer_key},
+            {'$setOnInsert': completed_task},
+            upsert=True
+        )
+        if result.upserted_id:
+            task_id = result.upserted_id
+            AnalyticsService.invalidate(user_id, 'tasks')
+            DailyRollups.record(
+                user_id,
+                completed_task['completed_at'],
+                category=completed_task['category'],
+                tasks=1,
+                focus_minutes=completed_task['duration']
+            )
+        else:
+            task_id = current_app.mongo.db.completed_tasks.find_one({'timer_key': timer_key}, {'_id': 1})['_id']
         
         # Award points based on duration and productivity
         base_points = max(1, timer['duration'] // 5)  # 1 point per 5 minutes
@@ -183,20 +170,21 @@ def complete_timer():
         
         total_points = base_points + productivity_bonus + priority_bonus
         
-        RewardService.award_points(
+        RewardService.award_points_once(
             user_id=user_id,
+            key=timer_key,
             points=max(1, total_points),  # Minimum 1 point
             source='hook',
             description=f'Completed task: {timer["task_name"]}',
             category='task_completion',
-            reference_id=str(result.inserted_id)
+            reference_id=str(task_id)
         )
         
-        # Remove active timer
-        current_app.mongo.db.active_timers.delete_one({'user_id': user_id})
+        if result.upserted_id:
+            # Check for streaks and badges
+            check_streaks_and_badges(user_id)
         
-        # Check for streaks and badges
-        check_streaks_and_badges(user_id)
+        TimerStore.finish(user_id, timer)
         
         return jsonify({
             'status': 'success', 
@@ -210,38 +198,14 @@ def complete_timer():
 @login_required
 def cancel_timer():
     user_id = ObjectId(current_user.id)
-    current_app.mongo.db.active_timers.delete_many({'user_id': user_id})
+    TimerStore.cancel(user_id)
     return jsonify({'status': 'success', 'message': 'Timer cancelled'})
 
 @hook_bp.route('/get_timer_status')
 @login_required
 def get_timer_status():
     user_id = ObjectId(current_user.id)
-    timer = current_app.mongo.db.active_timers.find_one({'user_id': user_id})
-    
-    if timer:
-        now = datetime.utcnow()
-        elapsed = (now - timer['start_time']).total_seconds()
-        
-        # Account for paused time
-        if timer.get('is_paused', False) and 'pause_start' in timer:
-            elapsed -= (now - timer['pause_start']).total_seconds()
-        
-        elapsed -= timer.get('paused_time', 0)
-        
-        remaining = (timer['duration'] * 60) - elapsed
-        
-        return jsonify({
-            'active': True,
-            'task_name': timer['task_name'],
-            'remaining': max(0, remaining),
-            'is_paused': timer.get('is_paused', False),
-            'timer_type': timer['timer_type'],
-            'category': timer['category'],
-            'priority': timer.get('priority', 'medium')
-        })
-    
-    return jsonify({'active': False})
+    return jsonify(TimerStore.serialize(TimerStore.get(user_id)))
 
 @hook_bp.route('/history')
 @login_required
@@ -301,29 +265,19 @@ def analytics():
     user_id = ObjectId(current_user.id)
     
     # Get analytics data
-    tasks = list(current_app.mongo.db.completed_tasks.find({'user_id': user_id}))
+    task_stats = AnalyticsService.task_stats(user_id)
     
     analytics_data = {
-        'total_tasks': len(tasks),
-        'total_time': sum([task['duration'] for task in tasks]),
-        'avg_session': sum([task['duration'] for task in tasks]) / max(1, len(tasks)),
+        'total_tasks': task_stats['total_tasks'],
+        'total_time': task_stats['total_time'],
+        'avg_session': task_stats['total_time'] / max(1, task_stats['total_tasks']),
         'productivity_streak': calculate_productivity_streak(user_id),
-        'tasks_by_category': {},
-        'tasks_by_mood': {},
+        'tasks_by_category': task_stats['category_counts'],
+        'tasks_by_mood': task_stats['by_mood'],
         'productivity_trend': {},
-        'best_time_of_day': get_best_time_of_day(tasks)
+        'best_time_of_day': get_best_time_of_day(task_stats['by_hour'])
     }
     
-    # Tasks by category
-    for task in tasks:
-        category = task.get('category', 'general')
-        analytics_data['tasks_by_category'][category] = analytics_data['tasks_by_category'].get(category, 0) + 1
-    
-    # Tasks by mood
-    for task in tasks:
-        mood = task.get('mood', '😊')
-        analytics_data['tasks_by_mood'][mood] = analytics_data['tasks_by_mood'].get(mood, 0) + 1
-    
     return render_template('hook/analytics.html', analytics=analytics_data)
 
 @hook_bp.route('/themes')
@@ -384,18 +338,12 @@ def calculate_productivity_streak(user_id):
     
     return streak
 
-def get_best_time_of_day(tasks):
-    """Analyze best time of day for productivity"""
-    hour_counts = {}
-    
-    for task in tasks:
-        hour = task['completed_at'].hour
-        hour_counts[hour] = hour_counts.get(hour, 0) + 1
-    
-    if not hour_counts:
+def get_best_time_of_day(hour_counts):
+    """Analyze best time of day for productivity from a 24-slot hour histogram"""
+    if not any(hour_counts):
         return 'No data'
     
-    best_hour = max(hour_counts, key=hour_counts.get)
+    best_hour = hour_counts.index(max(hour_counts))
     
     if 6 <= best_hour < 12:
         return 'Morning'
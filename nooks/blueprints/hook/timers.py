@@ -0,0 +1,153 @@
+from flask import current_app
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TimerStore:
+    """Active focus timers, one Mongo document per user.
+
+    Mongo is read on every lookup (a unique user_id index makes it a point
+    read), so every app process sees the same state. Each transition is a
+    single atomic operation and the new state is pushed to the user's
+    Socket.IO room when an emitter is available; timer pages poll otherwise.
+    """
+
+    _emitter = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(user_id):
+        """Get the user's active timer, or None"""
+        return current_app.mongo.db.active_timers.find_one({'user_id': user_id})
+
+    @staticmethod
+    def start(user_id, task_name, duration, timer_type='work', category='general', priority='medium'):
+        """Replace any existing timer with a new one"""
+        now = datetime.utcnow()
+        timer_data = {
+            'user_id': user_id,
+            'task_name': task_name,
+            'duration': duration,
+            'timer_type': timer_type,
+            'category': category,
+            'priority': priority,
+            'start_time': now,
+            'end_time': now + timedelta(minutes=duration),
+            'is_paused': False,
+            'paused_time': 0,
+            'pause_count': 0
+        }
+        timer = current_app.mongo.db.active_timers.find_one_and_replace(
+            {'user_id': user_id},
+            timer_data,
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        TimerStore.publish(user_id, timer)
+        return timer
+
+    @staticmethod
+    def toggle_pause(user_id):
+        """Pause a running timer or resume a paused one, returns the updated timer"""
+        now = datetime.utcnow()
+        timer = current_app.mongo.db.active_timers.find_one_and_update(
+            {'user_id': user_id, 'is_paused': {'$ne': True}},
+            {'$set': {'is_paused': True, 'pause_start': now}, '$inc': {'pause_count': 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not timer:
+            # Fold the pause into paused_time and end_time in one pipeline update
+            paused_ms = {'$subtract': [now, '$pause_start']}
+            timer = current_app.mongo.db.active_timers.find_one_and_update(
+                {'user_id': user_id, 'is_paused': True, 'pause_start': {'$exists': True}},
+                [
+                    {'$set': {
+                        'is_paused': False,
+                        'paused_time': {'$add': [{'$ifNull': ['$paused_time', 0]}, {'$divide': [paused_ms, 1000]}]},
+                        'end_time': {'$add': ['$end_time', paused_ms]}
+                    }},
+                    {'$unset': 'pause_start'}
+                ],
+                return_document=ReturnDocument.AFTER
+            )
+        if timer:
+            TimerStore.publish(user_id, timer)
+        return timer
+
+    @staticmethod
+    def completion_key(timer):
+        """Idempotency key of one run of a timer; find_one_and_replace keeps _id across restarts"""
+        return f"timer:{timer['_id']}:{timer['start_time'].timestamp()}"
+
+    @staticmethod
+    def finish(user_id, timer):
+        """Remove a timer once its completion has been recorded"""
+        result = current_app.mongo.db.active_timers.delete_one({'_id': timer['_id'], 'start_time': timer['start_time']})
+        if result.deleted_count:
+            TimerStore.publish(user_id, None)
+
+    @staticmethod
+    def cancel(user_id):
+        """Remove the active timer"""
+        current_app.mongo.db.active_timers.delete_many({'user_id': user_id})
+        TimerStore.publish(user_id, None)
+
+    @staticmethod
+    def serialize(timer):
+        """Client view of a timer, with remaining seconds computed now"""
+        if not timer:
+            return {'active': False}
+
+        now = datetime.utcnow()
+        elapsed = (now - timer['start_time']).total_seconds()
+
+        # Account for paused time
+        if timer.get('is_paused', False) and 'pause_start' in timer:
+            elapsed -= (now - timer['pause_start']).total_seconds()
+
+        elapsed -= timer.get('paused_time', 0)
+        remaining = (timer['duration'] * 60) - elapsed
+
+        return {
+            'active': True,
+            'task_name': timer['task_name'],
+            'remaining': max(0, remaining),
+            'is_paused': timer.get('is_paused', False),
+            'timer_type': timer['timer_type'],
+            'category': timer['category'],
+            'priority': timer.get('priority', 'medium')
+        }
+
+    @staticmethod
+    def _socketio():
+        """The in-process Socket.IO server, or a write-only emitter on the message queue"""
+        socketio = current_app.extensions.get('socketio')
+        if socketio or not current_app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+            return socketio
+        with TimerStore._lock:
+            if TimerStore._emitter is None:
+                # Plain web workers (gunicorn app:app) reach the Socket.IO
+                # server's clients through the shared message queue
+                from flask_socketio import SocketIO
+                TimerStore._emitter = SocketIO(message_queue=current_app.config['SOCKETIO_MESSAGE_QUEUE'])
+        return TimerStore._emitter
+
+    @staticmethod
+    def publish(user_id, timer):
+        """Push the timer state to the user's Socket.IO room, if Socket.IO is reachable"""
+        socketio = TimerStore._socketio()
+        if not socketio:
+            return
+        try:
+            socketio.emit('timer_state', TimerStore.serialize(timer), to=user_room(user_id))
+        except Exception as e:
+            logger.error(f"Error publishing timer state: {str(e)}")
+
+
+def user_room(user_id):
+    """Socket.IO room that receives a user's private events"""
+    return f'user_{user_id}'
@@ -0,0 +1,143 @@
+"""Local stand-in for the Opay checkout API, for development, tests and benchmarks.
+
+    python -m blueprints.integrations.opay_stub --port 8089 --secret dev-secret
+
+then run the app with OPAY_BASE_URL=http://127.0.0.1:8089/api/v1 and
+OPAY_SECRET_KEY=dev-secret. Initiating a payment returns a payment_url on
+the stub; opening it sends the signed SUCCESS webhook to the callback_url
+and redirects to the return_url. --delay, --jitter and --fail-rate make
+the provider slow or flaky to exercise timeouts, retries and the breaker.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from blueprints.integrations.payment import webhook_signature
+import argparse
+import threading
+import random
+import uuid
+import json
+import time
+import requests
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StubProvider:
+    """Checkout state and behaviour knobs shared by the request handlers"""
+
+    def __init__(self, secret_key, delay=0.0, jitter=0.0, fail_rate=0.0, fail_status=503):
+        self.secret_key = secret_key
+        self.delay = delay
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.checkouts = {}
+        self._lock = threading.Lock()
+
+    def create_checkout(self, payment_data):
+        transaction_id = f'stub_{uuid.uuid4().hex}'
+        with self._lock:
+            self.checkouts[transaction_id] = payment_data
+        return transaction_id
+
+    def get_checkout(self, transaction_id):
+        with self._lock:
+            return self.checkouts.get(transaction_id)
+
+    def send_webhook(self, transaction_id, status='SUCCESS'):
+        """POST the signed webhook of a checkout to its callback_url"""
+        checkout = self.get_checkout(transaction_id)
+        if not checkout or not checkout.get('callback_url'):
+            return None
+        webhook = {
+            'transaction_id': transaction_id,
+            'status': status,
+            'amount': checkout.get('amount'),
+            'currency': checkout.get('currency'),
+            'signature': webhook_signature(self.secret_key, transaction_id)
+        }
+        return requests.post(checkout['callback_url'], json=webhook, timeout=10)
+
+
+def make_handler(provider):
+    class StubHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payment_data = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return self._send_json(400, {'status': 'error', 'message': 'Invalid JSON'})
+
+            if not self.path.endswith('/checkout/initiate'):
+                return self._send_json(404, {'status': 'error', 'message': 'Not found'})
+
+            time.sleep(provider.delay + random.uniform(0, provider.jitter))
+            if random.random() < provider.fail_rate:
+                return self._send_json(provider.fail_status, {'status': 'error', 'message': 'Stub failure'})
+
+            transaction_id = provider.create_checkout(payment_data)
+            host, port = self.server.server_address[:2]
+            self._send_json(200, {
+                'status': 'success',
+                'transaction_id': transaction_id,
+                'payment_url': f'http://{host}:{port}/pay/{transaction_id}'
+            })
+
+        def do_GET(self):
+            if not self.path.startswith('/pay/'):
+                return self._send_json(404, {'status': 'error', 'message': 'Not found'})
+            transaction_id = self.path[len('/pay/'):]
+            checkout = provider.get_checkout(transaction_id)
+            if not checkout:
+                return self._send_json(404, {'status': 'error', 'message': 'Unknown transaction'})
+            try:
+                provider.send_webhook(transaction_id)
+            except requests.RequestException as e:
+                logger.error(f"Stub webhook to {checkout.get('callback_url')} failed: {str(e)}")
+            self.send_response(302)
+            self.send_header('Location', checkout.get('return_url') or '/')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            logger.info(format % args)
+
+    return StubHandler
+
+
+def serve(host='127.0.0.1', port=8089, **options):
+    """Start the stub in a background thread, returns (server, provider)"""
+    provider = StubProvider(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(provider))
+    threading.Thread(target=server.serve_forever, name='opay-stub', daemon=True).start()
+    return server, provider
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--secret', default='dev-secret', help='OPAY_SECRET_KEY used to sign webhooks')
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds added to every initiate call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random delay, up to this many seconds')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of initiate calls that fail')
+    parser.add_argument('--fail-status', type=int, default=503)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    provider = StubProvider(args.secret, delay=args.delay, jitter=args.jitter,
+                            fail_rate=args.fail_rate, fail_status=args.fail_status)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(provider))
+    logger.info(f"Opay stub listening on http://{args.host}:{args.port}/api/v1")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
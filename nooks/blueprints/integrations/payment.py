@@ -1,50 +1,262 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.hmac import HMAC
 from flask import current_app
+from hmac import compare_digest
+from collections import deque
+import threading
+import random
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BASE_URL = 'https://merchant.opaycheckout.com/api/v1'
+
+# (connect, read) seconds; a slow provider can hold a worker for at most
+# about (MAX_RETRIES + 1) * sum(TIMEOUT) plus backoff
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+POOL_SIZE = 10
+
+MAX_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 0.25
+# Answers that mean the request was turned away before any processing,
+# safe to resend even for a POST that creates a checkout; a 502 or 504 from
+# a gateway can follow a request the provider did process, so they are not
+RETRY_STATUSES = (429, 503)
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30
+
+LATENCY_SAMPLES = 500
+
+
+class CircuitBreaker:
+    """Stops calling a failing provider for a while instead of queueing up timeouts.
+
+    Opens after BREAKER_FAILURE_THRESHOLD consecutive failures; after
+    BREAKER_RESET_SECONDS one trial call is let through (half-open) and its
+    outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class PaymentMetrics:
+    """Call counts and recent latencies of the payment provider"""
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self.latencies = deque(maxlen=samples)
+        self.counts = {'calls': 0, 'errors': 0, 'retries': 0, 'rejected': 0}
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.counts['calls'] += 1
+            if not ok:
+                self.counts['errors'] += 1
+
+    def increment(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def snapshot(self):
+        """Counts plus p50/p95/p99/max latency in milliseconds"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            counts = dict(self.counts)
+        if latencies:
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+            counts.update(p50_ms=percentile(0.5), p95_ms=percentile(0.95), p99_ms=percentile(0.99),
+                          max_ms=round(latencies[-1] * 1000, 1))
+        return counts
+
+
+class PaymentClient:
+    """Process-wide HTTP client for the payment provider.
+
+    One pooled requests.Session is shared by every request; each call has
+    connect and read timeouts, a bounded number of jittered retries for
+    failures that cannot have reached the provider, and goes through a
+    circuit breaker so an outage fails fast.
+    """
+
+    def __init__(self, base_url, api_key, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_retries=MAX_RETRIES, pool_size=POOL_SIZE, sleep=time.sleep):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.breaker = CircuitBreaker()
+        self.metrics = PaymentMetrics()
+        self.session = requests.Session()
+        # Retries are handled below, where the breaker and metrics see them
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        })
+
+    def post(self, path, payload):
+        """POST JSON to the provider, returns the decoded response or raises requests.RequestException"""
+        if not self.breaker.allow():
+            self.metrics.increment('rejected')
+            raise requests.ConnectionError('Payment provider circuit is open')
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = self.session.post(f'{self.base_url}{path}', json=payload, timeout=self.timeout)
+                retryable = response.status_code in RETRY_STATUSES
+                if not retryable:
+                    response.raise_for_status()
+            except requests.ConnectionError as e:
+                if not request_never_sent(e):
+                    # Dropped after the POST went out ("Connection aborted"), the
+                    # checkout may exist, so it is not resent
+                    self.metrics.record(time.monotonic() - started, False)
+                    self.breaker.record_failure()
+                    raise
+                # No connection was made, resending cannot double-charge
+                retryable, error = True, e
+            except requests.HTTPError as e:
+                # The provider answered; only its own errors count against the breaker
+                self.metrics.record(time.monotonic() - started, False)
+                if e.response is not None and e.response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                raise
+            except requests.RequestException:
+                # A read timeout may follow a processed request, it is not resent
+                self.metrics.record(time.monotonic() - started, False)
+                self.breaker.record_failure()
+                raise
+            else:
+                error = None if not retryable else requests.HTTPError(
+                    f'{response.status_code} from payment provider', response=response)
+
+            self.metrics.record(time.monotonic() - started, error is None)
+            if error is None:
+                self.breaker.record_success()
+                return response.json()
+            if attempt >= self.max_retries:
+                self.breaker.record_failure()
+                raise error
+            attempt += 1
+            self.metrics.increment('retries')
+            # Full jitter keeps retrying workers from hitting the provider in step
+            self.sleep(random.uniform(0, RETRY_BACKOFF_SECONDS * (2 ** attempt)))
+
+
+def request_never_sent(error):
+    """True for connection errors raised before any byte of the request was written"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    # requests wraps urllib3's MaxRetryError, whose reason is the actual cause;
+    # refused connections and DNS failures subclass ConnectTimeoutError
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def webhook_signature(secret_key, transaction_id):
+    """HMAC-SHA256 of the transaction id, hex encoded"""
+    hmac = HMAC(secret_key.encode('utf-8'), hashes.SHA256())
+    hmac.update(str(transaction_id).encode('utf-8'))
+    return hmac.finalize().hex()
+
+
+def get_payment_client():
+    """The app's shared PaymentClient, created on first use"""
+    client = current_app.extensions.get('payment_client')
+    if client is None:
+        client = PaymentClient(
+            current_app.config.get('OPAY_BASE_URL', DEFAULT_BASE_URL),
+            current_app.config.get('OPAY_API_KEY'),
+            timeout=(current_app.config.get('OPAY_CONNECT_TIMEOUT', CONNECT_TIMEOUT),
+                     current_app.config.get('OPAY_READ_TIMEOUT', READ_TIMEOUT)),
+            max_retries=current_app.config.get('OPAY_MAX_RETRIES', MAX_RETRIES)
+        )
+        current_app.extensions['payment_client'] = client
+    return client
+
+
 class OpayPayment:
     """Handle Opay payment processing"""
 
     def __init__(self):
-        self.api_key = current_app.config.get('OPAY_API_KEY')
         self.secret_key = current_app.config.get('OPAY_SECRET_KEY')
-        self.base_url = 'https://merchant.opaycheckout.com/api/v1'
+        self.client = get_payment_client()
 
     def initiate_payment(self, payment_data):
         """Initiate a payment with Opay"""
         try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            response = requests.post(
-                f'{self.base_url}/checkout/initiate',
-                json=payment_data,
-                headers=headers
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            return self.client.post('/checkout/initiate', payment_data)
+        except (requests.RequestException, ValueError) as e:
             logger.error(f"Payment initiation error: {str(e)}", exc_info=True)
             return {'status': 'error', 'message': str(e)}
 
+    def sign(self, transaction_id):
+        """Webhook signature of a transaction, as sent by Opay"""
+        return webhook_signature(self.secret_key, transaction_id)
+
     def verify_webhook(self, webhook_data):
         """Verify Opay webhook signature"""
+        if not self.secret_key:
+            logger.error("OPAY_SECRET_KEY is not set, rejecting webhook")
+            return False
         try:
             received_signature = webhook_data.get('signature')
             if not received_signature:
                 return False
 
-            # Generate HMAC signature
-            hmac = HMAC(self.secret_key.encode('utf-8'), hashes.SHA256())
-            hmac.update(str(webhook_data.get('transaction_id')).encode('utf-8'))
-            expected_signature = hmac.finalize().hex()
-
-            return received_signature == expected_signature
+            return compare_digest(str(received_signature), self.sign(webhook_data.get('transaction_id')))
         except Exception as e:
             logger.error(f"Webhook verification error: {str(e)}", exc_info=True)
-            return False
\ No newline at end of file
+            return False
\ No newline at end of file
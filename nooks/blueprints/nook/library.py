@@ -0,0 +1,185 @@
+from flask import current_app
+from bson import ObjectId
+from pymongo import UpdateOne, UpdateMany
+from pymongo.errors import BulkWriteError
+from collections import Counter
+from models import BookModel
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sort options of the library page. Each has a matching (user_id, field, _id)
+# and (user_id, status, field, _id) index; _id keeps paging stable on ties.
+SORT_OPTIONS = {
+    'added_at': [('added_at', -1), ('_id', -1)],
+    'title': [('title', 1), ('_id', 1)],
+    'rating': [('rating', -1), ('_id', -1)],
+    'progress': [('current_page', -1), ('_id', -1)]
+}
+
+FACETS = ['status', 'genre', 'authors']
+
+# Facet document marking that a user's counts have been built; its count is the total
+TOTAL_FACET = 'total'
+
+
+def _facet_values(book):
+    """(facet, value) pairs a book contributes to its owner's counts"""
+    if not book:
+        return []
+    values = [('status', book.get('status') or 'unknown')]
+    if book.get('genre'):
+        values.append(('genre', book['genre']))
+    values += [('authors', author) for author in set(book.get('authors') or []) if author]
+    return values
+
+
+class LibraryService:
+    """Paged library queries backed by per-user facet counts.
+
+    library_facets holds one {user_id, facet, value, count} document per
+    status, genre and author a user has, kept current with $inc on every
+    book write, so filter dropdowns and page totals never scan the library.
+    """
+
+    @staticmethod
+    def get_page(user_id, status='all', genre='all', sort='added_at', search=None, page=1, per_page=24):
+        """One page of a user's books with the total for the filter. Returns (books, total, facets)"""
+        user_id = ObjectId(user_id)
+        filters = {}
+        if status != 'all':
+            filters['status'] = status
+        if genre != 'all':
+            filters['genre'] = genre
+        order = SORT_OPTIONS.get(sort, SORT_OPTIONS['added_at'])
+        facets = LibraryService.get_facets(user_id)
+
+        if search:
+            books, total = BookModel.search_books(search, user_id=user_id, filters=filters,
+                                                  page=page, per_page=per_page, sort=order)
+            return books, total, facets
+
+        books = list(current_app.mongo.db.books.find(
+            dict(filters, user_id=user_id), BookModel.SUMMARY_PROJECTION
+        ).sort(order).skip((page - 1) * per_page).limit(per_page))
+
+        if not filters:
+            total = facets['total']
+        elif len(filters) == 1:
+            facet, value = next(iter(filters.items()))
+            total = facets[facet].get(value, 0)
+        else:
+            total = current_app.mongo.db.books.count_documents(dict(filters, user_id=user_id))
+        return books, total, facets
+
+    @staticmethod
+    def get_facets(user_id):
+        """{'total': n, 'status': {...}, 'genre': {...}, 'authors': {...}} for a user's library"""
+        facets = {'total': None}
+        facets.update({facet: {} for facet in FACETS})
+        for row in current_app.mongo.db.library_facets.find({'user_id': ObjectId(user_id)}):
+            if row['facet'] == TOTAL_FACET:
+                facets['total'] = row['count']
+            elif row['facet'] in FACETS and row['count'] > 0:
+                facets[row['facet']][row['value']] = row['count']
+        if facets['total'] is None:
+            return LibraryService.rebuild_facets(user_id)
+        return facets
+
+    @staticmethod
+    def rebuild_facets(user_id):
+        """Recount a user's facets from their books and store them.
+
+        Counts are written as absolute values with upserts rather than by
+        replacing the user's rows, so concurrent rebuilds converge on the same
+        documents, and a book_changed $inc that lands mid-rebuild is
+        overwritten instead of added on top of a count that already has it.
+        """
+        user_id = ObjectId(user_id)
+        result = list(current_app.mongo.db.books.aggregate([
+            {'$match': {'user_id': user_id}},
+            {'$facet': {
+                'status': [{'$group': {'_id': {'$ifNull': ['$status', 'unknown']}, 'count': {'$sum': 1}}}],
+                'genre': [
+                    {'$match': {'genre': {'$nin': [None, '']}}},
+                    {'$group': {'_id': '$genre', 'count': {'$sum': 1}}}
+                ],
+                'authors': [
+                    {'$unwind': '$authors'},
+                    {'$group': {'_id': {'book': '$_id', 'author': '$authors'}}},
+                    {'$group': {'_id': '$_id.author', 'count': {'$sum': 1}}}
+                ],
+                'total': [{'$count': 'count'}]
+            }}
+        ]))[0]
+
+        facets = {'total': result['total'][0]['count'] if result['total'] else 0}
+        facets.update({facet: {row['_id']: row['count'] for row in result[facet] if row['_id']} for facet in FACETS})
+
+        operations = [
+            UpdateOne(
+                {'user_id': user_id, 'facet': facet, 'value': value},
+                {'$set': {'count': count}},
+                upsert=True
+            )
+            for facet in FACETS for value, count in facets[facet].items()
+        ]
+        # Values no book has any more
+        operations += [
+            UpdateMany(
+                {'user_id': user_id, 'facet': facet, 'value': {'$nin': list(facets[facet])}},
+                {'$set': {'count': 0}}
+            )
+            for facet in FACETS
+        ]
+        # The total marker goes in last, a partial rebuild is redone on the next read
+        operations.append(UpdateOne(
+            {'user_id': user_id, 'facet': TOTAL_FACET, 'value': None},
+            {'$set': {'count': facets['total']}},
+            upsert=True
+        ))
+        try:
+            current_app.mongo.db.library_facets.bulk_write(operations, ordered=True)
+        except BulkWriteError as e:
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+            # A concurrent rebuild inserted the same row first, it now exists to update
+            current_app.mongo.db.library_facets.bulk_write(operations, ordered=True)
+        return facets
+
+    @staticmethod
+    def book_changed(user_id, before=None, after=None):
+        """Apply the facet deltas of adding (after only), editing or deleting (before only) a book"""
+        try:
+            user_id = ObjectId(user_id)
+            delta = Counter(_facet_values(after))
+            delta.subtract(Counter(_facet_values(before)))
+            total = int(after is not None) - int(before is not None)
+
+            marker = current_app.mongo.db.library_facets.update_one(
+                {'user_id': user_id, 'facet': TOTAL_FACET},
+                {'$inc': {'count': total}}
+            )
+            if not marker.matched_count:
+                # Counts not built yet, the first read builds them from scratch
+                return
+
+            operations = [
+                UpdateOne(
+                    {'user_id': user_id, 'facet': facet, 'value': value},
+                    {'$inc': {'count': change}},
+                    upsert=True
+                )
+                for (facet, value), change in delta.items() if change
+            ]
+            if operations:
+                current_app.mongo.db.library_facets.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Drop the counts rather than serve wrong ones, they are rebuilt on read
+            logger.error(f"Error updating library facets for user {user_id}: {str(e)}")
+            LibraryService.clear_facets(user_id)
+
+    @staticmethod
+    def clear_facets(user_id):
+        """Forget a user's facet counts, e.g. after bulk deletes"""
+        current_app.mongo.db.library_facets.delete_many({'user_id': ObjectId(user_id)})
@@ -14,7 +14,10 @@ from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, TextAreaField, SelectField, IntegerField, HiddenField, BooleanField, FloatField
 from wtforms.validators import DataRequired, Optional, NumberRange
-from models import ActivityLogger  # Import ActivityLogger from models.py
+from models import ActivityLogger, BookModel, BookAnnotationModel  # Import ActivityLogger from models.py
+from blueprints.analytics.services import AnalyticsService
+from blueprints.analytics.rollups import DailyRollups
+from .library import LibraryService
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -29,6 +32,9 @@ csrf = CSRFProtect()
 ENCRYPTION_KEY = os.environ.get('UPLOAD_ENCRYPTION_KEY', Fernet.generate_key())
 fernet = Fernet(ENCRYPTION_KEY)
 
+# Takeaways and quotes shown per page on the book detail page
+ANNOTATIONS_PER_PAGE = 10
+
 # Form Definitions
 class AddBookForm(FlaskForm):
     pdf_file = FileField('Upload Book (PDF only, max 10MB)', validators=[FileAllowed(['pdf'], 'Only PDF files are allowed.'), Optional()])
@@ -79,7 +85,7 @@ class RateBookForm(FlaskForm):
 @login_required
 def index():
     user_id = ObjectId(current_user.id)
-    books = list(current_app.mongo.db.books.find({'user_id': user_id}).sort('added_at', -1))
+    books = list(current_app.mongo.db.books.find({'user_id': user_id}, BookModel.SUMMARY_PROJECTION).sort('added_at', -1))
     
     # Calculate stats
     total_books = len(books)
@@ -202,18 +208,18 @@ def add_book():
                     'current_page': 0,
                     'status': status,
                     'added_at': datetime.utcnow(),
-                    'key_takeaways': [],
-                    'quotes': [],
                     'rating': 0,
                     'notes': '',
                     'genre': genre,
                     'isbn': isbn,
                     'published_date': published_date,
-                    'reading_sessions': [],
-                    'pdf_path': pdf_path
+                    'pdf_path': pdf_path,
+                    'search_terms': BookModel.build_search_terms(title, authors, genre)
                 }
 
                 result = current_app.mongo.db.books.insert_one(book_data)
+                AnalyticsService.invalidate(user_id, 'books')
+                LibraryService.book_changed(user_id, after=book_data)
                 ActivityLogger.log_activity(
                     user_id=user_id,
                     action='add_book',
@@ -278,6 +284,7 @@ def edit_book(book_id):
                     'description': form.description.data,
                     'status': form.status.data
                 }
+                update['search_terms'] = BookModel.build_search_terms(update['title'], update['authors'], book.get('genre'))
                 pdf_file = form.pdf_file.data
                 if pdf_file:
                     pdf_file.seek(0, os.SEEK_END)
@@ -303,6 +310,8 @@ def edit_book(book_id):
                         metadata={'book_id': book_id, 'filename': pdf_filename}
                     )
                 current_app.mongo.db.books.update_one({'_id': ObjectId(book_id)}, {'$set': update})
+                AnalyticsService.invalidate(user_id, 'books')
+                LibraryService.book_changed(user_id, book, dict(book, **update))
                 ActivityLogger.log_activity(
                     user_id=user_id,
                     action='edit_book',
@@ -361,6 +370,9 @@ def delete_book(book_id):
 
             # Delete the book from the database
             current_app.mongo.db.books.delete_one({'_id': ObjectId(book_id), 'user_id': user_id})
+            BookAnnotationModel.delete_for_book(book_id)
+            AnalyticsService.invalidate(user_id, 'books')
+            LibraryService.book_changed(user_id, before=book)
             logger.info(f"Book {book_id} deleted by user {user_id}")
 
             # Log deletion
@@ -474,7 +486,7 @@ def manage_library():
     try:
         user_id = ObjectId(current_user.id)
         # Fetch all books for the user
-        books = list(current_app.mongo.db.books.find({'user_id': user_id}).sort('added_at', -1))
+        books = list(current_app.mongo.db.books.find({'user_id': user_id}, BookModel.SUMMARY_PROJECTION).sort('added_at', -1))
         delete_form = DeleteBookForm()  # Initialize DeleteBookForm
         delete_form.csrf_token.data = generate_csrf()  # Set CSRF token
         ActivityLogger.log_activity(
@@ -547,6 +559,10 @@ def book_detail(book_id):
             'book_id': ObjectId(book_id)
         }).sort('date', -1))
         
+        # Takeaways and quotes live in their own collections, only the newest page is loaded here
+        takeaways, total_takeaways = BookAnnotationModel.get_page('takeaways', book_id, user_id, per_page=ANNOTATIONS_PER_PAGE)
+        quotes, total_quotes = BookAnnotationModel.get_page('quotes', book_id, user_id, per_page=ANNOTATIONS_PER_PAGE)
+        
         # Instantiate forms
         update_form = UpdateProgressForm()
         rate_form = RateBookForm()
@@ -575,6 +591,11 @@ def book_detail(book_id):
             'nook/book_detail.html',
             book=book,
             reading_sessions=reading_sessions,
+            takeaways=takeaways,
+            total_takeaways=total_takeaways,
+            quotes=quotes,
+            total_quotes=total_quotes,
+            annotations_per_page=ANNOTATIONS_PER_PAGE,
             update_form=update_form,
             rate_form=rate_form,
             takeaway_form=takeaway_form,
@@ -585,6 +606,23 @@ def book_detail(book_id):
         flash(f"An error occurred: {str(e)}", "danger")
         return redirect(url_for('nook.index'))
 
+@nook_bp.route('/book/<book_id>/<any(takeaways, quotes):kind>')
+@login_required
+def book_annotations(book_id, kind):
+    """Further pages of a book's takeaways or quotes for the detail page"""
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        items, total = BookAnnotationModel.get_page(kind, book_id, current_user.id, page=page, per_page=ANNOTATIONS_PER_PAGE)
+        return jsonify({
+            'items': [BookAnnotationModel.serialize(item) for item in items],
+            'page': page,
+            'has_next': page * ANNOTATIONS_PER_PAGE < total,
+            'total': total
+        })
+    except Exception as e:
+        logger.error(f"Error loading {kind} for book {book_id}: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Error loading {kind}'}), 500
+
 @nook_bp.route('/update_progress/<book_id>', methods=['POST'])
 @login_required
 def update_progress(book_id):
@@ -629,6 +667,8 @@ def update_progress(book_id):
                     'duration_minutes': duration_minutes
                 }
                 current_app.mongo.db.reading_sessions.insert_one(session_data)
+                AnalyticsService.invalidate(user_id, 'books', 'sessions')
+                DailyRollups.record(user_id, session_data['date'], pages=pages_read, reading_minutes=duration_minutes, reading_sessions=1)
                 
                 ActivityLogger.log_activity(
                     user_id=user_id,
@@ -655,6 +695,7 @@ def update_progress(book_id):
                         {'_id': ObjectId(book_id)},
                         {'$set': {'status': 'finished', 'finished_at': datetime.utcnow()}}
                     )
+                    LibraryService.book_changed(user_id, book, dict(book, status='finished'))
                     
                     ActivityLogger.log_activity(
                         user_id=user_id,
@@ -713,17 +754,14 @@ def add_takeaway(book_id):
             logger.info(f"Received CSRF Token: {request.form.get('csrf_token')}")
             logger.info(f"Form Data: {request.form}")
             if form.validate_on_submit():
-                takeaway_data = {
-                    'text': form.takeaway.data,
-                    'page_reference': form.page_reference.data,
-                    'date': datetime.utcnow(),
-                    'id': str(ObjectId())
-                }
-                
-                current_app.mongo.db.books.update_one(
-                    {'_id': ObjectId(book_id), 'user_id': user_id},
-                    {'$push': {'key_takeaways': takeaway_data}}
+                takeaway_id = BookAnnotationModel.add(
+                    'takeaways', book_id, user_id,
+                    text=form.takeaway.data,
+                    page_reference=form.page_reference.data
                 )
+                if not takeaway_id:
+                    flash('Book not found', 'error')
+                    return redirect(url_for('nook.index'))
                 
                 ActivityLogger.log_activity(
                     user_id=user_id,
@@ -769,18 +807,15 @@ def add_quote(book_id):
             logger.info(f"Received CSRF Token: {request.form.get('csrf_token')}")
             logger.info(f"Form Data: {request.form}")
             if form.validate_on_submit():
-                quote_data = {
-                    'text': form.quote.data,
-                    'page': form.page.data,
-                    'context': form.context.data,
-                    'date': datetime.utcnow(),
-                    'id': str(ObjectId())
-                }
-                
-                current_app.mongo.db.books.update_one(
-                    {'_id': ObjectId(book_id), 'user_id': user_id},
-                    {'$push': {'quotes': quote_data}}
+                quote_id = BookAnnotationModel.add(
+                    'quotes', book_id, user_id,
+                    text=form.quote.data,
+                    page=form.page.data,
+                    context=form.context.data
                 )
+                if not quote_id:
+                    flash('Book not found', 'error')
+                    return redirect(url_for('nook.index'))
                 
                 ActivityLogger.log_activity(
                     user_id=user_id,
@@ -834,6 +869,7 @@ def rate_book(book_id):
                         'rated_at': datetime.utcnow()
                     }}
                 )
+                AnalyticsService.invalidate(user_id, 'books')
                 
                 ActivityLogger.log_activity(
                     user_id=user_id,
@@ -879,40 +915,35 @@ def library():
         genre_filter = request.args.get('genre', 'all')
         sort_by = request.args.get('sort', 'added_at')
         
-        # Build query
-        query = {'user_id': user_id}
-        if status_filter != 'all':
-            query['status'] = status_filter
-        if genre_filter != 'all':
-            query['genre'] = genre_filter
-        
-        # Get books with sorting
-        sort_options = {
-            'added_at': [('added_at', -1)],
-            'title': [('title', 1)],
-            'rating': [('rating', -1)],
-            'progress': [('current_page', -1)]
-        }
-        
-        books = list(current_app.mongo.db.books.find(query).sort(sort_options.get(sort_by, [('added_at', -1)])))
-        
-        # Get unique genres for filter
-        all_books = list(current_app.mongo.db.books.find({'user_id': user_id}))
-        genres = list(set([book.get('genre', '') for book in all_books if book.get('genre')]))
+        search_query = request.args.get('q', '').strip()
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = 24
         
-        ActivityLogger.log_activity(
-            user_id=user_id,
-            action='view_library',
-            description='Viewed filtered library',
-            metadata={'status_filter': status_filter, 'genre_filter': genre_filter, 'sort_by': sort_by}
+        # Totals and filter options come from the maintained facet counts;
+        # a search ranks by relevance instead of the chosen sort
+        books, total_books, facets = LibraryService.get_page(
+            user_id,
+            status=status_filter,
+            genre=genre_filter,
+            sort=sort_by,
+            search=search_query,
+            page=page,
+            per_page=per_page
         )
+        has_next = page * per_page < total_books
+        genres = sorted(facets['genre'])
         
         return render_template('nook/library.html', 
                              books=books, 
                              genres=genres,
+                             facets=facets,
                              current_status=status_filter,
                              current_genre=genre_filter,
-                             current_sort=sort_by)
+                             current_sort=sort_by,
+                             search_query=search_query,
+                             page=page,
+                             has_next=has_next,
+                             total_books=total_books)
     except Exception as e:
         logger.error(f"Error loading library: {str(e)}", exc_info=True)
         flash(f"An error occurred: {str(e)}", "danger")
@@ -924,41 +955,31 @@ def analytics():
     try:
         user_id = ObjectId(current_user.id)
         # Get reading analytics data
-        books = list(current_app.mongo.db.books.find({'user_id': user_id}))
-        sessions = list(current_app.mongo.db.reading_sessions.find({'user_id': user_id}))
+        book_stats = AnalyticsService.book_stats(user_id)
+        session_stats = AnalyticsService.session_stats(user_id)
         
         # Calculate analytics
         analytics_data = {
-            'total_books': len(books),
-            'books_by_status': {},
+            'total_books': book_stats['total_books'],
+            'books_by_status': book_stats['by_status'],
             'books_by_genre': {},
             'reading_trend': {},
-            'avg_rating': 0,
-            'total_pages': sum([book.get('current_page', 0) for book in books]),
+            'avg_rating': book_stats['avg_rating'],
+            'total_pages': book_stats['total_pages'],
             'reading_streak': calculate_reading_streak(user_id)
         }
         
-        # Books by status
-        for book in books:
-            status = book.get('status', 'unknown')
-            analytics_data['books_by_status'][status] = analytics_data['books_by_status'].get(status, 0) + 1
-        
         # Books by genre
-        for book in books:
-            genre = book.get('genre', 'Unknown')
+        for genre, count in book_stats['by_genre'].items():
+            genre = genre if genre is not None else 'Unknown'
             if genre:
-                analytics_data['books_by_genre'][genre] = analytics_data['books_by_genre'].get(genre, 0) + 1
-        
-        # Average rating
-        rated_books = [book for book in books if book.get('rating', 0) > 0]
-        if rated_books:
-            analytics_data['avg_rating'] = sum([book['rating'] for book in rated_books]) / len(rated_books)
+                analytics_data['books_by_genre'][genre] = analytics_data['books_by_genre'].get(genre, 0) + count
         
         ActivityLogger.log_activity(
             user_id=user_id,
             action='view_analytics',
             description='Viewed reading analytics',
-            metadata={'total_books': len(books), 'total_sessions': len(sessions)}
+            metadata={'total_books': book_stats['total_books'], 'total_sessions': session_stats['total_sessions']}
         )
         
         return render_template('nook/analytics.html', analytics=analytics_data)
@@ -1034,6 +1055,7 @@ def update_progress_ajax(book_id):
             update['status'] = 'reading'
 
         current_app.mongo.db.books.update_one({'_id': ObjectId(book_id)}, {'$set': update})
+        LibraryService.book_changed(user_id, book, dict(book, **update))
 
         # Log reading session
         session_data = {
@@ -1047,6 +1069,8 @@ def update_progress_ajax(book_id):
             'duration_minutes': duration_minutes
         }
         current_app.mongo.db.reading_sessions.insert_one(session_data)
+        AnalyticsService.invalidate(user_id, 'books', 'sessions')
+        DailyRollups.record(user_id, session_data['date'], pages=pages_read, reading_minutes=duration_minutes, reading_sessions=1)
 
         # Log activity
         ActivityLogger.log_activity(
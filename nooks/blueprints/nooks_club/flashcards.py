@@ -0,0 +1,89 @@
+from flask import current_app
+from bson import ObjectId
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+# SM-2 parameters
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+FIRST_INTERVAL_DAYS = 1
+SECOND_INTERVAL_DAYS = 6
+
+# Answers graded below this restart the card's repetitions
+PASSING_QUALITY = 3
+
+DUE_BATCH_SIZE = 20
+MAX_REVIEW_RETRIES = 3
+
+
+def next_schedule(card, quality, now=None):
+    """SM-2 schedule fields of a card after a review graded 0 (blackout) to 5 (perfect)"""
+    now = now or datetime.utcnow()
+    ease = card.get('ease', DEFAULT_EASE)
+    repetitions = card.get('repetitions', 0)
+    interval = card.get('interval_days', 0)
+
+    if quality < PASSING_QUALITY:
+        repetitions = 0
+        interval = FIRST_INTERVAL_DAYS
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = FIRST_INTERVAL_DAYS
+        elif repetitions == 2:
+            interval = SECOND_INTERVAL_DAYS
+        else:
+            interval = round(interval * ease)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    return {
+        'ease': round(ease, 4),
+        'repetitions': repetitions,
+        'interval_days': interval,
+        'last_reviewed_at': now,
+        'next_review_at': now + timedelta(days=interval)
+    }
+
+
+class FlashcardScheduler:
+    """Spaced-repetition study sessions over a user's flashcards.
+
+    Every card carries its SM-2 state and next_review_at; the
+    (user_id, next_review_at) index lets a session read only the cards due.
+    """
+
+    @staticmethod
+    def due_cards(user_id, limit=DUE_BATCH_SIZE, now=None):
+        """Cards due for review, most overdue first. Returns (cards, due_total)"""
+        query = {'user_id': user_id, 'next_review_at': {'$lte': now or datetime.utcnow()}}
+        cards = list(current_app.mongo.db.flashcards.find(query).sort('next_review_at', 1).limit(limit))
+        if len(cards) < limit:
+            return cards, len(cards)
+        return cards, current_app.mongo.db.flashcards.count_documents(query)
+
+    @staticmethod
+    def review(user_id, card_id, quality):
+        """Grade a review and reschedule the card. Returns (card, error)"""
+        if not ObjectId.is_valid(card_id):
+            return None, 'Flashcard not found'
+        card_id = ObjectId(card_id)
+
+        # review_count doubles as the card's version: a concurrent review of
+        # the same card makes the update miss and the schedule is recomputed
+        for _ in range(MAX_REVIEW_RETRIES):
+            card = current_app.mongo.db.flashcards.find_one({'_id': card_id, 'user_id': user_id})
+            if not card:
+                return None, 'Flashcard not found'
+            schedule = next_schedule(card, quality)
+            result = current_app.mongo.db.flashcards.update_one(
+                {'_id': card_id, 'user_id': user_id, 'review_count': card.get('review_count', 0)},
+                {'$set': dict(schedule, last_quality=quality), '$inc': {'review_count': 1}}
+            )
+            if result.modified_count:
+                card.update(schedule, last_quality=quality, review_count=card.get('review_count', 0) + 1)
+                return card, None
+
+        logger.error(f"Flashcard {card_id} kept changing during review by user {user_id}")
+        return None, 'Flashcard is being reviewed elsewhere, please retry'
@@ -0,0 +1,160 @@
+from flask import current_app
+from datetime import datetime, timedelta
+from pymongo import ReplaceOne, DeleteOne
+import threading
+import socket
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Matches PRESENCE_HEARTBEAT_MS in static/js/club_chat.js
+HEARTBEAT_SECONDS = 25
+
+# A session without a heartbeat for this long is dropped
+PRESENCE_TTL_SECONDS = 60
+
+# How often a worker writes its presence to club_presence
+SNAPSHOT_SECONDS = 15
+
+ONLINE_MEMBERS_LIMIT = 50
+
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+
+class ClubPresence:
+    """Who is online in each club, tracked per Socket.IO session in memory.
+
+    Joins, leaves and heartbeats only touch this worker's dictionaries. Every
+    SNAPSHOT_SECONDS the worker replaces its own club_presence documents, one
+    per club, so other workers (and web processes without sockets) can add
+    them to their local view. Snapshots carry an expires_at past which they
+    are ignored and removed by a TTL index, so a crashed worker's sessions
+    disappear on their own.
+    """
+
+    _lock = threading.Lock()
+    # {club_id: {sid: {'user_id', 'username', 'seen'}}}
+    _clubs = {}
+    # Clubs changed since the last snapshot, or emptied and still to delete
+    _dirty = set()
+
+    @staticmethod
+    def join(club_id, sid, user_id, username):
+        with ClubPresence._lock:
+            ClubPresence._clubs.setdefault(club_id, {})[sid] = {
+                'user_id': user_id, 'username': username, 'seen': time.monotonic()
+            }
+            ClubPresence._dirty.add(club_id)
+
+    @staticmethod
+    def leave(club_id, sid):
+        with ClubPresence._lock:
+            sessions = ClubPresence._clubs.get(club_id, {})
+            if sessions.pop(sid, None):
+                ClubPresence._dirty.add(club_id)
+            if not sessions:
+                ClubPresence._clubs.pop(club_id, None)
+
+    @staticmethod
+    def disconnect(sid):
+        """Drop a closed socket from every club, returns the club ids it was in"""
+        with ClubPresence._lock:
+            club_ids = [club_id for club_id, sessions in ClubPresence._clubs.items() if sid in sessions]
+        for club_id in club_ids:
+            ClubPresence.leave(club_id, sid)
+        return club_ids
+
+    @staticmethod
+    def heartbeat(sid):
+        """Keep a socket's sessions alive; only the timestamp moves, nothing is marked dirty"""
+        now = time.monotonic()
+        with ClubPresence._lock:
+            for sessions in ClubPresence._clubs.values():
+                if sid in sessions:
+                    sessions[sid]['seen'] = now
+
+    @staticmethod
+    def expire():
+        """Drop sessions that missed their heartbeats, returns the club ids that changed"""
+        cutoff = time.monotonic() - PRESENCE_TTL_SECONDS
+        changed = []
+        with ClubPresence._lock:
+            for club_id, sessions in list(ClubPresence._clubs.items()):
+                stale = [sid for sid, session in sessions.items() if session['seen'] < cutoff]
+                for sid in stale:
+                    del sessions[sid]
+                if stale:
+                    changed.append(club_id)
+                    ClubPresence._dirty.add(club_id)
+                if not sessions:
+                    del ClubPresence._clubs[club_id]
+        return changed
+
+    @staticmethod
+    def _local_members(club_id):
+        with ClubPresence._lock:
+            sessions = list(ClubPresence._clubs.get(club_id, {}).values())
+        return {session['user_id']: session['username'] for session in sessions}
+
+    @staticmethod
+    def online(club_id, limit=ONLINE_MEMBERS_LIMIT):
+        """(online_count, members) of a club across all workers, members as {'user_id', 'username'}"""
+        club_id = str(club_id)
+        members = ClubPresence._local_members(club_id)
+        snapshots = current_app.mongo.db.club_presence.find(
+            {'club_id': club_id, 'worker': {'$ne': WORKER_ID}, 'expires_at': {'$gt': datetime.utcnow()}},
+            {'members': 1}
+        )
+        for snapshot in snapshots:
+            for member in snapshot.get('members', []):
+                members.setdefault(member['user_id'], member['username'])
+        online = [{'user_id': user_id, 'username': username} for user_id, username in members.items()]
+        online.sort(key=lambda member: (member['username'] or '').lower())
+        return len(online), online[:limit]
+
+    @staticmethod
+    def snapshot():
+        """Write this worker's presence to club_presence in one bulk write.
+
+        Every club held is rewritten so its expires_at keeps moving, clubs
+        emptied since the last snapshot are deleted.
+        """
+        ClubPresence.expire()
+        expires_at = datetime.utcnow() + timedelta(seconds=PRESENCE_TTL_SECONDS + SNAPSHOT_SECONDS)
+        with ClubPresence._lock:
+            clubs = {
+                club_id: {session['user_id']: session['username'] for session in sessions.values()}
+                for club_id, sessions in ClubPresence._clubs.items()
+            }
+            emptied = ClubPresence._dirty - set(clubs)
+            ClubPresence._dirty = set()
+
+        operations = [
+            ReplaceOne(
+                {'_id': f'{WORKER_ID}:{club_id}'},
+                {
+                    'club_id': club_id,
+                    'worker': WORKER_ID,
+                    'members': [{'user_id': user_id, 'username': username} for user_id, username in members.items()],
+                    'expires_at': expires_at
+                },
+                upsert=True
+            )
+            for club_id, members in clubs.items()
+        ]
+        operations += [DeleteOne({'_id': f'{WORKER_ID}:{club_id}'}) for club_id in emptied]
+        if operations:
+            current_app.mongo.db.club_presence.bulk_write(operations, ordered=False)
+
+    @staticmethod
+    def run_snapshots(app, sleep=time.sleep):
+        """Snapshot loop for a Socket.IO background task"""
+        while True:
+            sleep(SNAPSHOT_SECONDS)
+            try:
+                with app.app_context():
+                    ClubPresence.snapshot()
+            except Exception as e:
+                logger.error(f"Error writing club presence snapshot: {str(e)}")
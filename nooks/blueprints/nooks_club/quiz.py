@@ -0,0 +1,142 @@
+from flask import current_app
+from bson import ObjectId
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from models import QuizQuestionModel, QuizAnswerModel, UserProgressModel, UserModel
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DAILY_QUESTION_COUNT = 5
+
+# Matches QUIZ_TIME_LIMIT in static/js/quiz.js
+QUIZ_TIME_LIMIT_SECONDS = 60
+
+QUIZ_REVIEW_PER_PAGE = 20
+
+# Questions are never edited once created, so cached bodies stay valid;
+# the cap only bounds memory when many old ids are looked up
+QUESTION_CACHE_SIZE = 2000
+
+
+class QuizEngine:
+    """Daily quiz sets and answer scoring from a process-local question cache.
+
+    The day's questions are picked once and stored in quiz_daily_sets under
+    the date, so every worker and every player sees the same set. Question
+    bodies and answers are cached by id, scoring an answer never reads
+    quiz_questions.
+    """
+
+    _lock = threading.Lock()
+    _questions = {}
+    _daily = {'day': None, 'ids': [], 'public': []}
+
+    @staticmethod
+    def get_question(question_id):
+        """A question by id, from the cache when possible"""
+        key = str(question_id)
+        question = QuizEngine._questions.get(key)
+        if question is None and ObjectId.is_valid(key):
+            question = current_app.mongo.db.quiz_questions.find_one({'_id': ObjectId(key)})
+            if question:
+                QuizEngine._cache([question])
+        return question
+
+    @staticmethod
+    def get_questions(question_ids):
+        """{id string: question} for many ids, one query for the ones not cached"""
+        keys = {str(question_id) for question_id in question_ids}
+        found = {key: QuizEngine._questions[key] for key in keys if key in QuizEngine._questions}
+        missing = [ObjectId(key) for key in keys - set(found) if ObjectId.is_valid(key)]
+        if missing:
+            questions = list(current_app.mongo.db.quiz_questions.find({'_id': {'$in': missing}}))
+            QuizEngine._cache(questions)
+            found.update((str(question['_id']), question) for question in questions)
+        return found
+
+    @staticmethod
+    def _cache(questions):
+        with QuizEngine._lock:
+            if len(QuizEngine._questions) + len(questions) > QUESTION_CACHE_SIZE:
+                QuizEngine._questions = {}
+            for question in questions:
+                QuizEngine._questions[str(question['_id'])] = question
+
+    @staticmethod
+    def daily_questions():
+        """Today's questions without their answers, ready for JSON"""
+        day = datetime.utcnow().strftime('%Y-%m-%d')
+        daily = QuizEngine._daily
+        if daily['day'] == day:
+            return daily['public']
+
+        question_ids = QuizEngine._load_daily_set(day)
+        questions = QuizEngine.get_questions(question_ids)
+        usernames = {}
+        public = []
+        for question_id in question_ids:
+            question = questions.get(str(question_id))
+            if not question:
+                continue
+            creator_id = str(question.get('creator_id'))
+            if creator_id not in usernames:
+                usernames[creator_id] = UserModel.get_username_by_id(creator_id) or creator_id
+            entry = {key: value for key, value in question.items() if key != 'answer'}
+            entry.update({'_id': str(question['_id']), 'creator_id': creator_id, 'creator_username': usernames[creator_id]})
+            public.append(entry)
+
+        if public:
+            QuizEngine._daily = {'day': day, 'ids': [str(question_id) for question_id in question_ids], 'public': public}
+        return public
+
+    @staticmethod
+    def _load_daily_set(day):
+        """Question ids of a day's set, picking and storing it on first use"""
+        stored = current_app.mongo.db.quiz_daily_sets.find_one({'_id': day})
+        if stored:
+            return stored['question_ids']
+
+        picked = QuizQuestionModel.get_daily_questions(DAILY_QUESTION_COUNT)
+        if not picked:
+            return []
+        QuizEngine._cache(picked)
+        try:
+            current_app.mongo.db.quiz_daily_sets.insert_one({
+                '_id': day,
+                'question_ids': [question['_id'] for question in picked],
+                'created_at': datetime.utcnow()
+            })
+            return [question['_id'] for question in picked]
+        except DuplicateKeyError:
+            # Another worker picked the set first, use theirs
+            return current_app.mongo.db.quiz_daily_sets.find_one({'_id': day})['question_ids']
+
+    @staticmethod
+    def get_stats(user_id):
+        """Lifetime counters of a player, kept by UserProgressModel.record_answer"""
+        progress = current_app.mongo.db.user_progress.find_one({'user_id': user_id, 'module': 'quiz'}, {'stats': 1})
+        stats = {'attempts': 0, 'correct': 0, 'current_streak': 0, 'best_streak': 0}
+        stats.update((progress or {}).get('stats') or {})
+        return stats
+
+    @staticmethod
+    def leaderboard(limit=50):
+        """Players with the most correct answers, as {'user_id', 'stats'} documents"""
+        return list(current_app.mongo.db.user_progress.find(
+            {'module': 'quiz', 'stats.attempts': {'$gt': 0}}, {'user_id': 1, 'stats': 1}
+        ).sort('stats.correct', -1).limit(limit))
+
+    @staticmethod
+    def submit_answer(user_id, question_id, answer):
+        """Score an answer from the cache, store it and bump the player's score in one upsert.
+
+        Returns (answer_id, is_correct, score).
+        """
+        question = QuizEngine.get_question(question_id)
+        is_correct = bool(question and answer and answer == question.get('answer'))
+        result = QuizAnswerModel.submit_answer(user_id, question_id, answer, is_correct)
+        progress = UserProgressModel.record_answer(user_id, 'quiz', is_correct)
+        score = ((progress or {}).get('data') or {}).get('score', 0)
+        return result.inserted_id, is_correct, score
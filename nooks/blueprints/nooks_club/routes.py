@@ -5,6 +5,9 @@ from bson import ObjectId
 from datetime import datetime, timedelta
 import logging
 from models import QuizQuestionModel, ClubModel, ClubPostModel, ClubChatMessageModel, FlashcardModel, QuizAnswerModel, UserProgressModel, UserModel
+from .flashcards import FlashcardScheduler, DUE_BATCH_SIZE
+from .quiz import QuizEngine, QUIZ_TIME_LIMIT_SECONDS, QUIZ_REVIEW_PER_PAGE
+from .presence import ClubPresence
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, SubmitField
 from wtforms.validators import DataRequired, Length
@@ -20,9 +23,43 @@ class ClubForm(FlaskForm):
     description = TextAreaField('Description', validators=[Length(max=500)])
     submit = SubmitField('Create')
 
-# --- Helper: Check if user is club admin/moderator ---
-def is_club_admin(club, user_id):
-    return str(user_id) in [str(a) for a in club.get('admins', [])]
+CLUBS_PER_PAGE = 20
+CLUB_MEMBERS_PER_PAGE = 50
+
+# --- Helpers: paging and club listings ---
+def get_page_args(default_per_page):
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', default_per_page, type=int), 1), 100)
+    return page, per_page
+
+def get_usernames(user_ids):
+    """{user id string: username} for many users in one query"""
+    ids = {str(user_id) for user_id in user_ids}
+    users = current_app.mongo.db.users.find(
+        {'_id': {'$in': [ObjectId(user_id) for user_id in ids if ObjectId.is_valid(user_id)]}}, {'username': 1}
+    )
+    usernames = {str(user['_id']): user.get('username') for user in users}
+    return {user_id: usernames.get(user_id) or user_id for user_id in ids}
+
+def club_listing(clubs, total, page, per_page):
+    """JSON-ready page of clubs with the current user's role in each"""
+    roles = ClubModel.get_roles([c['_id'] for c in clubs], current_user.id)
+    usernames = get_usernames(c['creator_id'] for c in clubs)
+    for c in clubs:
+        role = roles.get(c['_id'])
+        c['_id'] = str(c['_id'])
+        c['creator_id'] = str(c['creator_id'])
+        c['creator_username'] = usernames[c['creator_id']]
+        c['member_count'] = c.get('member_count', 0)
+        c['is_member'] = role is not None
+        c['is_admin'] = role == 'admin'
+    return {
+        'clubs': clubs,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'has_more': page * per_page < total
+    }
 
 @nooks_club_bp.route('/')
 @login_required
@@ -40,8 +77,10 @@ def index():
 def my_clubs():
     try:
         logger.info(f"User {current_user.id} accessing their joined clubs")
-        clubs = ClubModel.get_user_clubs(str(current_user.id))
-        return render_template('nooks_club/my_clubs.html', clubs=clubs, csrf_token=generate_csrf())
+        page, per_page = get_page_args(CLUBS_PER_PAGE)
+        clubs, total = ClubModel.get_user_clubs(str(current_user.id), page=page, per_page=per_page)
+        listing = club_listing(clubs, total, page, per_page)
+        return render_template('nooks_club/my_clubs.html', csrf_token=generate_csrf(), **listing)
     except Exception as e:
         logger.error(f"Error fetching joined clubs for user {current_user.id}: {str(e)}", exc_info=True)
         flash("An error occurred while loading your clubs. Please try again.", "danger")
@@ -52,8 +91,10 @@ def my_clubs():
 def created_clubs():
     try:
         logger.info(f"User {current_user.id} accessing their created clubs")
-        clubs = ClubModel.get_created_clubs(str(current_user.id))
-        return render_template('nooks_club/created_clubs.html', clubs=clubs, csrf_token=generate_csrf())
+        page, per_page = get_page_args(CLUBS_PER_PAGE)
+        clubs, total = ClubModel.get_created_clubs(str(current_user.id), page=page, per_page=per_page)
+        listing = club_listing(clubs, total, page, per_page)
+        return render_template('nooks_club/created_clubs.html', csrf_token=generate_csrf(), **listing)
     except Exception as e:
         logger.error(f"Error fetching created clubs for user {current_user.id}: {str(e)}", exc_info=True)
         flash("An error occurred while loading your created clubs. Please try again.", "danger")
@@ -68,8 +109,9 @@ def view_club(club_id):
         if not club:
             flash("Club not found.", "danger")
             return redirect(url_for('nooks_club.index'))
-        is_admin = is_club_admin(club, current_user.id)
-        is_member = str(current_user.id) in [str(m) for m in club.get('members', [])]
+        role = ClubModel.get_role(club['_id'], current_user.id)
+        is_admin = role == 'admin'
+        is_member = role is not None
         creator_username = UserModel.get_username_by_id(club['creator_id']) or club['creator_id']
         club_name = club.get('name', 'Unknown Club')
         return render_template('nooks_club/club_detail.html', club=club, club_id=club_id, club_name=club_name, is_admin=is_admin, is_member=is_member, creator_username=creator_username, csrf_token=generate_csrf())
@@ -141,7 +183,7 @@ def club_chat(club_id):
         if not club:
             flash("Club not found.", "danger")
             return redirect(url_for('nooks_club.index'))
-        is_admin = is_club_admin(club, current_user.id)
+        is_admin = ClubModel.get_role(club['_id'], current_user.id) == 'admin'
         club_name = club.get('name', 'Unknown Club')
         return render_template('nooks_club/chat.html', club_id=club_id, club_name=club_name, is_admin=is_admin, csrf_token=generate_csrf())
     except Exception as e:
@@ -156,14 +198,9 @@ def club_chat(club_id):
 def api_get_clubs():
     try:
         logger.info(f"User {current_user.id} fetching all clubs")
-        clubs = ClubModel.get_all_clubs()
-        for c in clubs:
-            c['_id'] = str(c['_id'])
-            c['creator_id'] = str(c['creator_id'])
-            c['creator_username'] = UserModel.get_username_by_id(c['creator_id']) or c['creator_id']
-            c['members'] = [str(m) for m in c.get('members', [])]
-            c['is_admin'] = is_club_admin(c, current_user.id)
-        return jsonify({'clubs': clubs})
+        page, per_page = get_page_args(CLUBS_PER_PAGE)
+        clubs, total = ClubModel.get_all_clubs(page=page, per_page=per_page)
+        return jsonify(club_listing(clubs, total, page, per_page))
     except Exception as e:
         logger.error(f"Error fetching clubs for user {current_user.id}: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred'}), 500
@@ -191,18 +228,52 @@ def api_get_club(club_id):
         club = ClubModel.get_club(club_id)
         if not club:
             return jsonify({'error': 'Club not found'}), 404
+        role = ClubModel.get_role(club['_id'], current_user.id)
+        admins = ClubModel.get_admins(club['_id'])
+        usernames = get_usernames(admins + [club['creator_id']])
         club['_id'] = str(club['_id'])
         club['creator_id'] = str(club['creator_id'])
-        club['creator_username'] = UserModel.get_username_by_id(club['creator_id']) or club['creator_id']
-        club['members'] = [str(m) for m in club.get('members', [])]
-        club['admins'] = [str(a) for a in club.get('admins', [])]
-        club['admin_usernames'] = [UserModel.get_username_by_id(a) or a for a in club['admins']]
-        club['is_admin'] = is_club_admin(club, current_user.id)
+        club['creator_username'] = usernames[club['creator_id']]
+        club['admins'] = admins
+        club['admin_usernames'] = [usernames[a] for a in admins]
+        club['member_count'] = club.get('member_count', 0)
+        club['is_member'] = role is not None
+        club['is_admin'] = role == 'admin'
+        club['online_count'], club['online_members'] = ClubPresence.online(club['_id'])
         return jsonify(club)
     except Exception as e:
         logger.error(f"Error fetching club {club_id} for user {current_user.id}: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred'}), 500
 
+@nooks_club_bp.route('/api/clubs/<club_id>/members', methods=['GET'])
+@login_required
+def api_get_club_members(club_id):
+    try:
+        logger.info(f"User {current_user.id} fetching members of club {club_id}")
+        club = ClubModel.get_club(club_id)
+        if not club:
+            return jsonify({'error': 'Club not found'}), 404
+        page, per_page = get_page_args(CLUB_MEMBERS_PER_PAGE)
+        memberships = ClubModel.get_members(club['_id'], page=page, per_page=per_page)
+        usernames = get_usernames(m['user_id'] for m in memberships)
+        members = [{
+            'user_id': str(m['user_id']),
+            'username': usernames[str(m['user_id'])],
+            'role': m['role'],
+            'joined_at': m['joined_at']
+        } for m in memberships]
+        total = club.get('member_count', 0)
+        return jsonify({
+            'members': members,
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'has_more': page * per_page < total
+        })
+    except Exception as e:
+        logger.error(f"Error fetching members of club {club_id} for user {current_user.id}: {str(e)}", exc_info=True)
+        return jsonify({'error': 'An error occurred'}), 500
+
 @nooks_club_bp.route('/api/clubs/<club_id>/join', methods=['POST'])
 @login_required
 def api_join_club(club_id):
@@ -240,7 +311,7 @@ def api_create_club_post(club_id):
         club = ClubModel.get_club(club_id)
         if not club:
             return jsonify({'error': 'Club not found'}), 404
-        if str(current_user.id) not in [str(m) for m in club.get('members', [])]:
+        if ClubModel.get_role(club['_id'], current_user.id) is None:
             return jsonify({'error': 'Not a club member'}), 403
         data = request.json
         content = data.get('content')
@@ -274,7 +345,7 @@ def api_send_club_chat(club_id):
         club = ClubModel.get_club(club_id)
         if not club:
             return jsonify({'error': 'Club not found'}), 404
-        if str(current_user.id) not in [str(m) for m in club.get('members', [])]:
+        if ClubModel.get_role(club['_id'], current_user.id) is None:
             return jsonify({'error': 'Not a club member'}), 403
         data = request.json
         message = data.get('message')
@@ -292,7 +363,7 @@ def api_delete_club_post(club_id, post_id):
         club = ClubModel.get_club(club_id)
         if not club:
             return jsonify({'error': 'Club not found'}), 404
-        if not is_club_admin(club, current_user.id):
+        if ClubModel.get_role(club['_id'], current_user.id) != 'admin':
             return jsonify({'error': 'Only club admins can delete posts'}), 403
         logger.info(f"User {current_user.id} deleting post {post_id} in club {club_id}")
         result = current_app.mongo.db.club_posts.delete_one({'_id': ObjectId(post_id) if len(post_id) == 24 else post_id})
@@ -310,7 +381,7 @@ def api_delete_club_message(club_id, message_id):
         club = ClubModel.get_club(club_id)
         if not club:
             return jsonify({'error': 'Club not found'}), 404
-        if not is_club_admin(club, current_user.id):
+        if ClubModel.get_role(club['_id'], current_user.id) != 'admin':
             return jsonify({'error': 'Only club admins can delete messages'}), 403
         logger.info(f"User {current_user.id} deleting message {message_id} in club {club_id}")
         result = current_app.mongo.db.club_chat_messages.delete_one({'_id': ObjectId(message_id) if len(message_id) == 24 else message_id})
@@ -328,7 +399,7 @@ def api_add_club_admin(club_id):
         club = ClubModel.get_club(club_id)
         if not club:
             return jsonify({'error': 'Club not found'}), 404
-        if not is_club_admin(club, current_user.id):
+        if ClubModel.get_role(club['_id'], current_user.id) != 'admin':
             return jsonify({'error': 'Only club admins can promote others'}), 403
         data = request.json
         user_id = data.get('user_id')
@@ -347,13 +418,13 @@ def api_remove_club_admin(club_id, user_id):
         club = ClubModel.get_club(club_id)
         if not club:
             return jsonify({'error': 'Club not found'}), 404
-        if not is_club_admin(club, current_user.id):
+        if ClubModel.get_role(club['_id'], current_user.id) != 'admin':
             return jsonify({'error': 'Only club admins can demote others'}), 403
-        if len(club.get('admins', [])) <= 1:
-            return jsonify({'error': 'Cannot remove last admin'}), 400
         username = UserModel.get_username_by_id(user_id) or user_id
         logger.info(f"User {current_user.id} demoting user {user_id} from admin in club {club_id}")
-        current_app.mongo.db.clubs.update_one({'_id': club['_id']}, {'$pull': {'admins': user_id}})
+        success, error = ClubModel.remove_admin(club['_id'], user_id)
+        if not success:
+            return jsonify({'error': error}), 400
         return jsonify({'message': f"{username} demoted from admin"})
     except Exception as e:
         logger.error(f"Error demoting admin {user_id} in club {club_id} for user {current_user.id}: {str(e)}", exc_info=True)
@@ -364,14 +435,9 @@ def api_remove_club_admin(club_id, user_id):
 def api_my_clubs():
     try:
         logger.info(f"User {current_user.id} fetching their joined clubs")
-        clubs = ClubModel.get_user_clubs(str(current_user.id))
-        for c in clubs:
-            c['_id'] = str(c['_id'])
-            c['creator_id'] = str(c['creator_id'])
-            c['creator_username'] = UserModel.get_username_by_id(c['creator_id']) or c['creator_id']
-            c['members'] = [str(m) for m in c.get('members', [])]
-            c['is_admin'] = is_club_admin(c, current_user.id)
-        return jsonify({'clubs': clubs})
+        page, per_page = get_page_args(CLUBS_PER_PAGE)
+        clubs, total = ClubModel.get_user_clubs(str(current_user.id), page=page, per_page=per_page)
+        return jsonify(club_listing(clubs, total, page, per_page))
     except Exception as e:
         logger.error(f"Error fetching joined clubs for user {current_user.id}: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred'}), 500
@@ -381,14 +447,9 @@ def api_my_clubs():
 def api_created_clubs():
     try:
         logger.info(f"User {current_user.id} fetching their created clubs")
-        clubs = ClubModel.get_created_clubs(str(current_user.id))
-        for c in clubs:
-            c['_id'] = str(c['_id'])
-            c['creator_id'] = str(c['creator_id'])
-            c['creator_username'] = UserModel.get_username_by_id(c['creator_id']) or c['creator_id']
-            c['members'] = [str(m) for m in c.get('members', [])]
-            c['is_admin'] = is_club_admin(c, current_user.id)
-        return jsonify({'clubs': clubs})
+        page, per_page = get_page_args(CLUBS_PER_PAGE)
+        clubs, total = ClubModel.get_created_clubs(str(current_user.id), page=page, per_page=per_page)
+        return jsonify(club_listing(clubs, total, page, per_page))
     except Exception as e:
         logger.error(f"Error fetching created clubs for user {current_user.id}: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred'}), 500
@@ -407,6 +468,42 @@ def api_get_flashcards():
         logger.error(f"Error fetching flashcards for user {current_user.id}: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred'}), 500
 
+@nooks_club_bp.route('/api/flashcards/due', methods=['GET'])
+@login_required
+def api_due_flashcards():
+    try:
+        limit = min(max(request.args.get('limit', DUE_BATCH_SIZE, type=int), 1), 100)
+        cards, due_total = FlashcardScheduler.due_cards(str(current_user.id), limit=limit)
+        for c in cards:
+            c['_id'] = str(c['_id'])
+            c['user_id'] = str(c['user_id'])
+        return jsonify({'flashcards': cards, 'due_total': due_total})
+    except Exception as e:
+        logger.error(f"Error fetching due flashcards for user {current_user.id}: {str(e)}", exc_info=True)
+        return jsonify({'error': 'An error occurred'}), 500
+
+@nooks_club_bp.route('/api/flashcards/<card_id>/review', methods=['POST'])
+@login_required
+def api_review_flashcard(card_id):
+    try:
+        data = request.json or {}
+        quality = data.get('quality')
+        if not isinstance(quality, int) or isinstance(quality, bool) or not 0 <= quality <= 5:
+            return jsonify({'error': 'quality must be an integer from 0 to 5'}), 400
+        card, error = FlashcardScheduler.review(str(current_user.id), card_id, quality)
+        if error:
+            return jsonify({'error': error}), 404 if error == 'Flashcard not found' else 409
+        return jsonify({
+            'flashcard_id': str(card['_id']),
+            'next_review_at': card['next_review_at'].isoformat(),
+            'interval_days': card['interval_days'],
+            'ease': card['ease'],
+            'review_count': card['review_count']
+        })
+    except Exception as e:
+        logger.error(f"Error reviewing flashcard {card_id} for user {current_user.id}: {str(e)}", exc_info=True)
+        return jsonify({'error': 'An error occurred'}), 500
+
 @nooks_club_bp.route('/api/flashcards', methods=['POST'])
 @login_required
 def api_create_flashcard():
@@ -427,25 +524,22 @@ def api_create_flashcard():
 def api_quiz_leaderboard():
     try:
         logger.info(f"User {current_user.id} fetching quiz leaderboard")
-        pipeline = [
-            {'$group': {
-                '_id': '$user_id',
-                'score': {'$sum': {'$cond': ['$is_correct', 1, 0]}},
-                'attempts': {'$sum': 1}
-            }},
-            {'$sort': {'score': -1}},
-            {'$limit': 50}
-        ]
-        leaderboard_data = list(current_app.mongo.db.quiz_answers.aggregate(pipeline))
+        leaderboard_data = QuizEngine.leaderboard(limit=50)
+        users = {
+            str(user['_id']): user for user in current_app.mongo.db.users.find(
+                {'_id': {'$in': [ObjectId(entry['user_id']) for entry in leaderboard_data if ObjectId.is_valid(entry['user_id'])]}},
+                {'username': 1}
+            )
+        }
         leaderboard = []
         for entry in leaderboard_data:
-            user = current_app.mongo.db.users.find_one({'_id': ObjectId(entry['_id'])})
+            user = users.get(str(entry['user_id']))
             if user:
                 leaderboard.append({
                     'username': user.get('username', 'User'),
-                    'score': entry['score'],
-                    'attempts': entry['attempts'],
-                    'is_current_user': str(entry['_id']) == str(current_user.id)
+                    'score': entry['stats'].get('correct', 0),
+                    'attempts': entry['stats'].get('attempts', 0),
+                    'is_current_user': str(entry['user_id']) == str(current_user.id)
                 })
         return jsonify({'leaderboard': leaderboard})
     except Exception as e:
@@ -457,10 +551,14 @@ def api_quiz_leaderboard():
 def api_quiz_review():
     try:
         logger.info(f"User {current_user.id} fetching quiz review")
-        answers = QuizAnswerModel.get_user_answers(str(current_user.id))
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', QUIZ_REVIEW_PER_PAGE, type=int), 1), 100)
+        user_id = str(current_user.id)
+        answers = QuizAnswerModel.get_user_answers(user_id, page=page, per_page=per_page)
+        questions = QuizEngine.get_questions(ans['question_id'] for ans in answers)
         review = []
         for ans in answers:
-            q = QuizQuestionModel.get_question_by_id(str(ans['question_id']))
+            q = questions.get(str(ans['question_id']))
             review.append({
                 'question': q['question'] if q else '',
                 'your_answer': ans['answer'],
@@ -468,7 +566,14 @@ def api_quiz_review():
                 'is_correct': ans['is_correct'],
                 'answered_at': ans['submitted_at']
             })
-        return jsonify({'review': review})
+        total = QuizEngine.get_stats(user_id)['attempts']
+        return jsonify({
+            'review': review,
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'has_more': page * per_page < total
+        })
     except Exception as e:
         logger.error(f"Error fetching quiz review for user {current_user.id}: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred'}), 500
@@ -478,18 +583,17 @@ def api_quiz_review():
 def api_quiz_analytics():
     try:
         logger.info(f"User {current_user.id} fetching quiz analytics")
-        user_id = str(current_user.id)
-        total_attempts = current_app.mongo.db.quiz_answers.count_documents({'user_id': user_id})
-        correct = current_app.mongo.db.quiz_answers.count_documents({'user_id': user_id, 'is_correct': True})
+        stats = QuizEngine.get_stats(str(current_user.id))
+        total_attempts = stats['attempts']
+        correct = stats['correct']
         accuracy = (correct / total_attempts) * 100 if total_attempts else 0
-        last_10 = list(current_app.mongo.db.quiz_answers.find({'user_id': user_id}).sort('submitted_at', -1).limit(10))
-        streak = 0
-        for ans in last_10:
-            if ans['is_correct']:
-                streak += 1
-            else:
-                break
-        return jsonify({'total_attempts': total_attempts, 'correct': correct, 'accuracy': accuracy, 'current_streak': streak})
+        return jsonify({
+            'total_attempts': total_attempts,
+            'correct': correct,
+            'accuracy': accuracy,
+            'current_streak': stats['current_streak'],
+            'best_streak': stats['best_streak']
+        })
     except Exception as e:
         logger.error(f"Error fetching quiz analytics for user {current_user.id}: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred'}), 500
@@ -501,12 +605,7 @@ def api_start_quiz():
         logger.info(f"User {current_user.id} starting quiz")
         now = datetime.utcnow()
         UserProgressModel.update_progress(str(current_user.id), 'quiz', {'start_time': now, 'score': 0, 'completed': False})
-        questions = QuizQuestionModel.get_daily_questions()
-        for q in questions:
-            q['_id'] = str(q['_id'])
-            q['creator_id'] = str(q['creator_id'])
-            q['creator_username'] = UserModel.get_username_by_id(q['creator_id']) or q['creator_id']
-            q.pop('answer', None)
+        questions = QuizEngine.daily_questions()
         return jsonify({'questions': questions, 'start_time': now.isoformat(), 'time_limit': QUIZ_TIME_LIMIT_SECONDS})
     except Exception as e:
         logger.error(f"Error starting quiz for user {current_user.id}: {str(e)}", exc_info=True)
@@ -520,17 +619,8 @@ def api_submit_quiz_answer():
         question_id = data.get('question_id')
         answer = data.get('answer')
         logger.info(f"User {current_user.id} submitting quiz answer for question {question_id}")
-        question = QuizQuestionModel.get_question_by_id(question_id)
-        is_correct = False
-        if question and answer:
-            is_correct = (answer == question.get('answer'))
-        result = QuizAnswerModel.submit_answer(str(current_user.id), question_id, answer, is_correct)
-        progress = UserProgressModel.get_progress(str(current_user.id), 'quiz') or {}
-        score = progress.get('data', {}).get('score', 0)
-        if is_correct:
-            score += 1
-        UserProgressModel.update_progress(str(current_user.id), 'quiz', {'score': score, 'last_answered': datetime.utcnow()})
-        return jsonify({'answer_id': str(result.inserted_id), 'is_correct': is_correct, 'score': score}), 201
+        answer_id, is_correct, score = QuizEngine.submit_answer(str(current_user.id), question_id, answer)
+        return jsonify({'answer_id': str(answer_id), 'is_correct': is_correct, 'score': score}), 201
     except Exception as e:
         logger.error(f"Error submitting quiz answer for user {current_user.id}: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred'}), 500
@@ -550,7 +640,7 @@ def api_finish_quiz():
             elapsed = (datetime.utcnow() - start_time).total_seconds()
             if elapsed <= QUIZ_TIME_LIMIT_SECONDS:
                 completed = True
-        UserProgressModel.update_progress(str(current_user.id), 'quiz', {'score': score, 'completed': completed, 'finished_at': datetime.utcnow()})
+        UserProgressModel.update_fields(str(current_user.id), 'quiz', completed=completed, finished_at=datetime.utcnow())
         return jsonify({'score': score, 'completed': completed})
     except Exception as e:
         logger.error(f"Error finishing quiz for user {current_user.id}: {str(e)}", exc_info=True)
@@ -558,7 +648,7 @@ def api_finish_quiz():
 
 def get_question_by_id(question_id):
     try:
-        return current_app.mongo.db.quiz_questions.find_one({'_id': ObjectId(question_id)})
+        return QuizEngine.get_question(question_id)
     except Exception as e:
         logger.error(f"Error fetching question {question_id}: {str(e)}", exc_info=True)
         return None
@@ -10,6 +10,7 @@ from models import QuoteModel, TransactionModel, BookModel, GoogleBooksAPI, User
 
 # Import decorators
 from utils.decorators import admin_required
+from utils.jobs import JobQueue
 
 quotes_bp = Blueprint('quotes', __name__, template_folder='templates')
 logger = logging.getLogger(__name__)
@@ -62,7 +63,7 @@ def submit_quote():
             books = list(current_app.mongo.db.books.find({
                 'user_id': user_id,
                 'status': {'$in': ['reading', 'finished']}
-            }).sort('title', 1))
+            }, {'title': 1, 'authors': 1, 'status': 1}).sort('title', 1))
             
             # Log the number of books found for debugging
             logger.debug(f"Fetched {len(books)} books for user {user_id}")
@@ -130,11 +131,18 @@ def submit_quote():
 @quotes_bp.route('/search-books')
 @login_required
 def search_books():
-    """Search for books using Google Books API"""
+    """Search the user's library and Google Books"""
     try:
         query = request.args.get('q', '').strip()
         if not query:
-            return jsonify({'books': [], 'csrf_token': generate_csrf()})
+            return jsonify({'books': [], 'library_books': [], 'csrf_token': generate_csrf()})
+        
+        owned_books, _ = BookModel.search_books(query, user_id=current_user.id, per_page=5)
+        library_books = [{
+            'id': str(book['_id']),
+            'title': book.get('title', '').replace('<', '&lt;').replace('>', '&gt;'),
+            'authors': [author.replace('<', '&lt;').replace('>', '&gt;') for author in book.get('authors', [])]
+        } for book in owned_books]
         
         books = GoogleBooksAPI.search_books(query, max_results=10)
         sanitized_books = []
@@ -154,7 +162,7 @@ def search_books():
         
         # Log the number of books found for debugging
         logger.debug(f"Found {len(sanitized_books)} books for query: {query}")
-        return jsonify({'books': sanitized_books, 'csrf_token': generate_csrf()})
+        return jsonify({'books': sanitized_books, 'library_books': library_books, 'csrf_token': generate_csrf()})
         
     except Exception as e:
         logger.error(f"Error searching books: {str(e)}")
@@ -302,7 +310,7 @@ def admin_verify_quote(quote_id):
 @quotes_bp.route('/admin/bulk-verify', methods=['POST'])
 @admin_required
 def admin_bulk_verify():
-    """Admin endpoint to bulk verify multiple quotes"""
+    """Admin endpoint to queue bulk verification of multiple quotes"""
     try:
         admin_id = str(current_user.id)
         quote_ids = request.json.get('quote_ids', [])
@@ -312,30 +320,25 @@ def admin_bulk_verify():
         if not quote_ids or action not in ['approve', 'reject']:
             return jsonify({'error': 'Invalid request'}), 400
         
-        approved = action == 'approve'
-        success_count = 0
-        error_count = 0
-        
-        for quote_id in quote_ids:
-            success, error = QuoteModel.verify_quote(
-                quote_id=quote_id,
-                admin_id=admin_id,
-                approved=approved,
-                rejection_reason=rejection_reason if not approved else None
-            )
-            
-            if success:
-                success_count += 1
-            else:
-                error_count += 1
-                logger.error(f"Failed to verify quote {quote_id}: {error}")
+        job_id, error = JobQueue.enqueue(
+            'bulk_verify_quotes',
+            {
+                'quote_ids': quote_ids,
+                'admin_id': admin_id,
+                'approved': action == 'approve',
+                'rejection_reason': rejection_reason
+            },
+            created_by=admin_id
+        )
+        
+        if error:
+            return jsonify({'error': error}), 500
         
         return jsonify({
             'success': True,
-            'message': f'Processed {success_count} quotes successfully. {error_count} failed.',
-            'success_count': success_count,
-            'error_count': error_count
-        })
+            'message': f'Processing {len(quote_ids)} quotes in the background.',
+            'job_id': str(job_id)
+        }), 202
         
     except Exception as e:
         logger.error(f"Error in bulk verify: {str(e)}")
@@ -0,0 +1,140 @@
+"""Concurrency stress test for shop purchases, run against a development database.
+
+    MONGO_URI=mongodb://localhost:27017/nooks_dev python -m blueprints.rewards.purchase_stress --threads 16
+
+creates a throwaway user, fires concurrent purchases of one consumable and
+one owned item at RewardService.purchase_item, then checks that points were
+never overdrawn, each owned item was bought once, and the user's balance,
+purchase rows, reward rows and entitlements agree. --fail-rate makes that
+share of ledger writes fail after the purchase rows went in, the way a
+standalone server can, to exercise the refund path. The user and its rows
+are removed afterwards unless --keep is given.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from bson import ObjectId
+from blueprints.rewards.services import RewardService
+import argparse
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONSUMABLE_ITEM = 'streak_shield'
+OWNED_ITEM = 'theme_ocean'
+
+
+class InjectedFailure(Exception):
+    """Raised by the fault-injecting ledger writer"""
+
+
+def failing_ledger(write_ledger, fail_rate):
+    """Wrap _write_ledger so a share of calls fail between the purchase and reward inserts"""
+    def write(purchases, ledger):
+        if random.random() < fail_rate:
+            from flask import current_app
+            current_app.mongo.db.user_purchases.insert_many(purchases, ordered=True)
+            raise InjectedFailure('injected failure after the purchase rows were written')
+        return write_ledger(purchases, ledger)
+    return write
+
+
+def create_user(db, points):
+    username = f'stress_{ObjectId()}'
+    # users.email is uniquely indexed, so every run needs its own address
+    return db.users.insert_one({
+        'username': username,
+        'email': f'{username}@stress.invalid',
+        'is_active': True,
+        'created_at': datetime.utcnow(),
+        'total_points': points,
+        'level': 1,
+        'entitlements': [],
+        'data_version': 0
+    }).inserted_id
+
+
+def remove_user(db, user_id):
+    db.user_purchases.delete_many({'user_id': user_id})
+    db.rewards.delete_many({'user_id': user_id})
+    db.daily_rollups.delete_many({'user_id': user_id})
+    db.users.delete_one({'_id': user_id})
+
+
+def check(db, user_id, start_points, results):
+    """Invariants after the run, returns a list of failure messages"""
+    items = {item['id']: item for item in RewardService.get_shop_items()}
+    user = db.users.find_one({'_id': user_id})
+    succeeded = [item_id for item_id, (success, _) in results if success]
+    spent = sum(items[item_id]['cost'] for item_id in succeeded)
+    purchases = list(db.user_purchases.find({'user_id': user_id}))
+    ledger_points = sum(row['points'] for row in db.rewards.find({'user_id': user_id, 'source': 'shop'}))
+
+    failures = []
+    if user['total_points'] < 0:
+        failures.append(f"balance overdrawn: {user['total_points']}")
+    if user['total_points'] != start_points - spent:
+        failures.append(f"balance {user['total_points']} != {start_points} - {spent}")
+    if succeeded.count(OWNED_ITEM) > 1:
+        failures.append(f"{OWNED_ITEM} bought {succeeded.count(OWNED_ITEM)} times")
+    if len(purchases) != len(succeeded):
+        failures.append(f"{len(purchases)} purchase rows for {len(succeeded)} successful purchases")
+    if ledger_points != -spent:
+        failures.append(f"shop reward rows sum to {ledger_points}, expected {-spent}")
+    expected = RewardService.entitlements_from_purchases([user_id])[user_id]
+    if set(user.get('entitlements') or []) != expected:
+        failures.append(f"entitlements {sorted(user.get('entitlements') or [])} != purchases {sorted(expected)}")
+    return failures
+
+
+def run(app, threads=16, purchases=200, points=20000, fail_rate=0.0, keep=False):
+    """Run one stress round, returns (results, failures)"""
+    with app.app_context():
+        db = app.mongo.db
+        user_id = create_user(db, points)
+
+    write_ledger = RewardService._write_ledger
+    if fail_rate:
+        RewardService._write_ledger = staticmethod(failing_ledger(write_ledger, fail_rate))
+
+    def purchase(index):
+        item_id = OWNED_ITEM if index % 4 == 0 else CONSUMABLE_ITEM
+        with app.app_context():
+            return item_id, RewardService.purchase_item(user_id, item_id)
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(purchase, range(purchases)))
+        with app.app_context():
+            failures = check(app.mongo.db, user_id, points, results)
+    finally:
+        RewardService._write_ledger = staticmethod(write_ledger)
+        if not keep:
+            with app.app_context():
+                remove_user(app.mongo.db, user_id)
+    return results, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--purchases', type=int, default=200)
+    parser.add_argument('--points', type=int, default=20000, help='starting balance of the test user')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of ledger writes that fail')
+    parser.add_argument('--keep', action='store_true', help='leave the test user and its rows in place')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app import app
+    results, failures = run(app, threads=args.threads, purchases=args.purchases, points=args.points,
+                            fail_rate=args.fail_rate, keep=args.keep)
+
+    succeeded = sum(1 for _, (success, _) in results if success)
+    logger.info(f"{succeeded} of {len(results)} purchases succeeded")
+    for failure in failures:
+        logger.error(failure)
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
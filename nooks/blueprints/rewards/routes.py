@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from bson import ObjectId
 from datetime import datetime, timedelta
 from .services import RewardService
+from utils.versioning import etag_by_data_version
 
 rewards_bp = Blueprint('rewards', __name__, template_folder='templates')
 
@@ -174,6 +175,7 @@ def achievements():
 
 @rewards_bp.route('/api/user_points')
 @login_required
+@etag_by_data_version()
 def api_user_points():
     user_id = ObjectId(current_user.id)
     total_points = RewardService.get_user_total_points(user_id)
@@ -232,12 +234,10 @@ def shop():
     # Get shop items
     shop_items = RewardService.get_shop_items()
     
-    # Get user's current points
-    user_points = RewardService.get_user_total_points(user_id)
-    
-    # Get user's purchases
-    user_purchases = RewardService.get_user_purchases(user_id)
-    owned_items = [purchase['item_id'] for purchase in user_purchases]
+    # Get user's current points and owned items
+    user = current_app.mongo.db.users.find_one({'_id': user_id}, {'total_points': 1, 'entitlements': 1}) or {}
+    user_points = user.get('total_points', 0)
+    owned_items = RewardService.owned_items(user)
     
     # Categorize items
     categories = {}
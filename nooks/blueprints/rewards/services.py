@@ -1,8 +1,23 @@
 from flask import current_app
 from bson import ObjectId
 from datetime import datetime, timedelta
+from blueprints.analytics.rollups import DailyRollups
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from utils.jobs import register_job
 import math
 import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Shop item types that are owned once and recorded in users.entitlements;
+# everything else (mystery boxes, boosters) is consumed on purchase
+OWNED_TYPES = ('theme', 'avatar_frame', 'title', 'avatar_style')
+
+# Idempotency keys of award_points_once kept on the user; retries of an
+# award come within minutes, so only the latest few are needed
+APPLIED_REWARD_KEYS = 50
 
 class RewardService:
     """Service class for handling rewards, points, badges, and achievements"""
@@ -28,6 +43,23 @@ class RewardService:
         'quotes_submitted': [(10, 'bronze'), (50, 'silver'), (200, 'gold'), (1000, 'platinum')]
     }
     
+    # Mystery box odds: (cumulative probability, outcome, choices or points range, granted item type)
+    MYSTERY_BOX_TABLES = {
+        # 60% points, 30% theme, 10% avatar style
+        'mystery_box_small': [
+            (0.6, 'points', (50, 200), None),
+            (0.9, 'theme', ['theme_ocean', 'theme_forest'], 'theme'),
+            (1.0, 'avatar_style', ['lorelei', 'bottts'], 'avatar_style')
+        ],
+        # 40% points, 30% theme, 20% avatar style, 10% premium item
+        'mystery_box_large': [
+            (0.4, 'points', (200, 500), None),
+            (0.7, 'theme', ['theme_sunset', 'theme_midnight', 'theme_aurora'], 'theme'),
+            (0.9, 'avatar_style', ['lorelei', 'bottts', 'adventurer'], 'avatar_style'),
+            (1.0, 'premium', ['title_scholar', 'avatar_frame_gold'], None)
+        ]
+    }
+    
     @staticmethod
     def award_points(user_id, points, source, description, category='general', reference_id=None, goal_type=None):
         """Award points to a user and create a reward record"""
@@ -51,13 +83,61 @@ class RewardService:
         
         # Insert reward record
         current_app.mongo.db.rewards.insert_one(reward_data)
+        DailyRollups.record(user_id, reward_data['date'], category=category, points=points)
         
-        # Update user's total points
+        # Update user's total points and data version
         current_app.mongo.db.users.update_one(
             {'_id': user_id},
-            {'$inc': {'total_points': points}}
+            {'$inc': {'total_points': points, 'data_version': 1}}
         )
         
+        RewardService._apply_progression(user_id)
+        return reward_data
+    
+    @staticmethod
+    def award_points_once(user_id, key, points, source, description, category='general', reference_id=None):
+        """Award points at most once per idempotency key, safe to call again after a partial failure.
+
+        The reward row is upserted on its key and the balance change is
+        guarded by the key recorded on the user, so a retry redoes only the
+        steps that did not happen. Returns True when this call applied the points.
+        """
+        now = datetime.utcnow()
+        try:
+            current_app.mongo.db.rewards.update_one(
+                {'idempotency_key': key},
+                {'$setOnInsert': {
+                    'user_id': user_id,
+                    'points': points,
+                    'source': source,
+                    'description': description,
+                    'category': category,
+                    'date': now,
+                    'reference_id': reference_id,
+                    'goal_type': None,
+                    'is_goal_reward': False
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # A concurrent call inserted the row
+
+        result = current_app.mongo.db.users.update_one(
+            {'_id': user_id, 'applied_rewards': {'$ne': key}},
+            {
+                '$inc': {'total_points': points, 'data_version': 1},
+                '$push': {'applied_rewards': {'$each': [key], '$slice': -APPLIED_REWARD_KEYS}}
+            }
+        )
+        if not result.modified_count:
+            return False
+        DailyRollups.record(user_id, now, category=category, points=points)
+        RewardService._apply_progression(user_id)
+        return True
+    
+    @staticmethod
+    def _apply_progression(user_id):
+        """Level-up bonus, badges and goals that follow a change in points"""
         # Check for level up
         total_points = RewardService.get_user_total_points(user_id)
         new_level = RewardService.calculate_level(total_points)
@@ -85,8 +165,6 @@ class RewardService:
         # Check for new badges and goals
         RewardService.check_and_award_badges(user_id)
         RewardService.check_goal_completions(user_id)
-        
-        return reward_data
     
     @staticmethod
     def get_user_total_points(user_id):
@@ -694,167 +772,239 @@ class RewardService:
     
     @staticmethod
     def purchase_item(user_id, item_id):
-        """Purchase an item from the shop"""
+        """Purchase an item from the shop.
+
+        Points are debited by one conditional update that only matches while
+        the user can afford the item and does not own it yet, so concurrent
+        purchases can never overdraw. Mystery box outcomes are rolled first
+        and applied in the same update.
+        """
         shop_items = {item['id']: item for item in RewardService.get_shop_items()}
         
         if item_id not in shop_items:
             return False, "Item not found"
         
         item = shop_items[item_id]
-        user_points = RewardService.get_user_total_points(user_id)
-        
-        if user_points < item['cost']:
-            return False, "Insufficient points"
+        user_id = ObjectId(user_id)
+        now = datetime.utcnow()
+        purchase_id = ObjectId()
         
-        # Check if user already owns this item (for non-consumables)
-        if item['type'] in ['theme', 'avatar_frame', 'title', 'avatar_style']:
-            existing_purchase = current_app.mongo.db.user_purchases.find_one({
-                'user_id': user_id,
-                'item_id': item_id
-            })
-            if existing_purchase:
-                return False, "Item already owned"
-        
-        # Deduct points
-        current_app.mongo.db.users.update_one(
-            {'_id': user_id},
-            {'$inc': {'total_points': -item['cost']}}
-        )
-        
-        # Record purchase
-        purchase_data = {
+        # Item documents for user_purchases; the first is the purchase itself
+        purchases = [{
+            '_id': purchase_id,
             'user_id': user_id,
             'item_id': item_id,
             'item_name': item['name'],
             'cost': item['cost'],
             'type': item['type'],
-            'purchased_at': datetime.utcnow(),
+            'purchased_at': now,
             'is_active': True
-        }
-        
-        # Handle mystery boxes
-        if item['type'] == 'mystery_box':
-            reward = RewardService._open_mystery_box(user_id, item_id)
-            purchase_data['mystery_reward'] = reward
-        
-        current_app.mongo.db.user_purchases.insert_one(purchase_data)
-        
-        # Log the purchase
-        current_app.mongo.db.rewards.insert_one({
+        }]
+        ledger = [{
+            '_id': ObjectId(),
             'user_id': user_id,
             'points': -item['cost'],
             'source': 'shop',
             'description': f'Purchased: {item["name"]}',
             'category': 'purchase',
-            'date': datetime.utcnow(),
-            'reference_id': str(purchase_data['_id'])
-        })
+            'date': now,
+            'reference_id': str(purchase_id)
+        }]
+        granted = [item_id] if item['type'] in OWNED_TYPES else []
+        bonus_points = 0
         
-        return True, "Purchase successful"
-    
-    @staticmethod
-    def _open_mystery_box(user_id, box_type):
-        """Handle mystery box opening"""
-        if box_type == 'mystery_box_small':
-            # 60% chance for points, 30% chance for theme, 10% chance for avatar style
-            rand = random.random()
-            if rand < 0.6:
-                points = random.randint(50, 200)
-                RewardService.award_points(
-                    user_id=user_id,
-                    points=points,
-                    source='mystery_box',
-                    description=f'Mystery box reward: {points} points!',
-                    category='mystery_reward'
-                )
-                return {'type': 'points', 'value': points}
-            elif rand < 0.9:
-                # Grant a random theme
-                themes = ['theme_ocean', 'theme_forest']
-                theme = random.choice(themes)
-                current_app.mongo.db.user_purchases.insert_one({
+        if item['type'] == 'mystery_box':
+            reward, grant_type = RewardService._roll_mystery_box(item_id)
+            purchases[0]['mystery_reward'] = reward
+            if reward['type'] == 'points':
+                bonus_points = reward['value']
+                ledger.append({
+                    '_id': ObjectId(),
                     'user_id': user_id,
-                    'item_id': theme,
-                    'item_name': theme.replace('_', ' ').title(),
-                    'cost': 0,
-                    'type': 'theme',
-                    'purchased_at': datetime.utcnow(),
-                    'is_active': True,
-                    'source': 'mystery_box'
+                    'points': bonus_points,
+                    'source': 'mystery_box',
+                    'description': f'Mystery box reward: {bonus_points} points!',
+                    'category': 'mystery_reward',
+                    'date': now,
+                    'reference_id': str(purchase_id)
                 })
-                return {'type': 'theme', 'value': theme}
             else:
-                # Grant a random avatar style
-                avatar_styles = ['lorelei', 'bottts']
-                style = random.choice(avatar_styles)
-                current_app.mongo.db.user_purchases.insert_one({
+                purchases.append({
+                    '_id': ObjectId(),
                     'user_id': user_id,
-                    'item_id': style,
-                    'item_name': style.replace('_', ' ').title(),
+                    'item_id': reward['value'],
+                    'item_name': reward['value'].replace('_', ' ').title(),
                     'cost': 0,
-                    'type': 'avatar_style',
-                    'purchased_at': datetime.utcnow(),
+                    'type': grant_type,
+                    'purchased_at': now,
                     'is_active': True,
                     'source': 'mystery_box'
                 })
-                return {'type': 'avatar_style', 'value': style}
+                granted.append(reward['value'])
+        
+        # Debit (and credit any mystery box points) in one conditional update
+        debit_filter = {'_id': user_id, 'total_points': {'$gte': item['cost']}}
+        if item['type'] in OWNED_TYPES:
+            debit_filter['entitlements'] = {'$ne': item_id}
+        debit = {'$inc': {'total_points': bonus_points - item['cost'], 'data_version': 1}}
+        if granted:
+            debit['$addToSet'] = {'entitlements': {'$each': granted}}
+        
+        before = current_app.mongo.db.users.find_one_and_update(
+            debit_filter, debit,
+            projection={'total_points': 1, 'level': 1, 'entitlements': 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            user = current_app.mongo.db.users.find_one({'_id': user_id}, {'entitlements': 1})
+            if user and item['type'] in OWNED_TYPES and item_id in RewardService.owned_items(user):
+                return False, "Item already owned"
+            return False, "Insufficient points"
         
-        elif box_type == 'mystery_box_large':
-            # 40% points, 30% theme, 20% avatar style, 10% premium item
-            rand = random.random()
-            if rand < 0.4:
-                points = random.randint(200, 500)
-                RewardService.award_points(
-                    user_id=user_id,
-                    points=points,
-                    source='mystery_box',
-                    description=f'Mystery box reward: {points} points!',
-                    category='mystery_reward'
-                )
-                return {'type': 'points', 'value': points}
-            elif rand < 0.7:
-                themes = ['theme_sunset', 'theme_midnight', 'theme_aurora']
-                theme = random.choice(themes)
-                current_app.mongo.db.user_purchases.insert_one({
-                    'user_id': user_id,
-                    'item_id': theme,
-                    'item_name': theme.replace('_', ' ').title(),
-                    'cost': 0,
-                    'type': 'theme',
-                    'purchased_at': datetime.utcnow(),
-                    'is_active': True,
-                    'source': 'mystery_box'
-                })
-                return {'type': 'theme', 'value': theme}
-            elif rand < 0.9:
-                avatar_styles = ['lorelei', 'bottts', 'adventurer']
-                style = random.choice(avatar_styles)
-                current_app.mongo.db.user_purchases.insert_one({
-                    'user_id': user_id,
-                    'item_id': style,
-                    'item_name': style.replace('_', ' ').title(),
-                    'cost': 0,
-                    'type': 'avatar_style',
-                    'purchased_at': datetime.utcnow(),
-                    'is_active': True,
-                    'source': 'mystery_box'
-                })
-                return {'type': 'avatar_style', 'value': style}
-            else:
-                # Premium item
-                items = ['title_scholar', 'avatar_frame_gold']
-                item = random.choice(items)
-                current_app.mongo.db.user_purchases.insert_one({
-                    'user_id': user_id,
-                    'item_id': item,
-                    'item_name': item.replace('_', ' ').title(),
-                    'cost': 0,
-                    'type': 'title' if 'title' in item else 'avatar_frame',
-                    'purchased_at': datetime.utcnow(),
-                    'is_active': True,
-                    'source': 'mystery_box'
-                })
-                return {'type': 'premium', 'value': item}
+        try:
+            RewardService._write_ledger(purchases, ledger)
+        except Exception as e:
+            # Undo the debit and only the entitlements this purchase added
+            logger.error(f"Error recording purchase of {item_id} for user {user_id}: {str(e)}")
+            RewardService._discard_ledger(purchases, ledger)
+            refund = {'$inc': {'total_points': item['cost'] - bonus_points, 'data_version': 1}}
+            added = [granted_id for granted_id in granted if granted_id not in RewardService.owned_items(before)]
+            if added:
+                refund['$pullAll'] = {'entitlements': added}
+            current_app.mongo.db.users.update_one({'_id': user_id}, refund)
+            return False, "Purchase failed, your points were not charged"
+        
+        DailyRollups.record(user_id, now, category='purchase', points=-item['cost'])
+        if bonus_points:
+            DailyRollups.record(user_id, now, category='mystery_reward', points=bonus_points)
+            RewardService._check_level_up(user_id, before.get('total_points', 0) + bonus_points - item['cost'],
+                                          before.get('level', 1))
+        
+        return True, "Purchase successful"
+    
+    @staticmethod
+    def _write_ledger(purchases, ledger):
+        """Insert purchase and reward rows, inside one transaction when the deployment supports it"""
+        db = current_app.mongo.db
+        client = current_app.mongo.cx
+        if client.topology_description.topology_type_name not in ('ReplicaSetWithPrimary', 'Sharded'):
+            # Standalone servers have no transactions; purchases go first so a
+            # failure between the two leaves no reward row without its purchase,
+            # and purchase_item removes the rows that did get in
+            db.user_purchases.insert_many(purchases, ordered=True)
+            db.rewards.insert_many(ledger, ordered=True)
+            return
+        with client.start_session() as session:
+            with session.start_transaction():
+                db.user_purchases.insert_many(purchases, ordered=True, session=session)
+                db.rewards.insert_many(ledger, ordered=True, session=session)
+    
+    @staticmethod
+    def _discard_ledger(purchases, ledger):
+        """Remove whatever a failed _write_ledger left behind; without a transaction the purchase rows may already be in"""
+        try:
+            current_app.mongo.db.user_purchases.delete_many({'_id': {'$in': [row['_id'] for row in purchases]}})
+            current_app.mongo.db.rewards.delete_many({'_id': {'$in': [row['_id'] for row in ledger]}})
+        except Exception as e:
+            logger.error(f"Error removing rows of a failed purchase: {str(e)}")
+    
+    @staticmethod
+    def _check_level_up(user_id, total_points, current_level):
+        """Raise the stored level after a direct points change, with the usual level bonus"""
+        new_level = RewardService.calculate_level(total_points)
+        if new_level <= current_level:
+            return
+        result = current_app.mongo.db.users.update_one(
+            {'_id': user_id, 'level': {'$lt': new_level}},
+            {'$set': {'level': new_level}}
+        )
+        if result.modified_count:
+            RewardService.award_points(
+                user_id=user_id,
+                points=new_level * 25,
+                source='system',
+                description=f'Level {new_level} reached!',
+                category='level_up'
+            )
+    
+    @staticmethod
+    def _roll_mystery_box(box_type):
+        """Pick a mystery box outcome without applying it. Returns (reward, granted item type)"""
+        rand = random.random()
+        for threshold, outcome, choices, item_type in RewardService.MYSTERY_BOX_TABLES[box_type]:
+            if rand < threshold:
+                break
+        if outcome == 'points':
+            return {'type': 'points', 'value': random.randint(*choices)}, None
+        value = random.choice(choices)
+        if outcome == 'premium':
+            item_type = 'title' if 'title' in value else 'avatar_frame'
+        return {'type': outcome, 'value': value}, item_type
+    
+    @staticmethod
+    def owned_items(user):
+        """Item ids a loaded user document owns (themes as 'theme_<name>', avatar styles by style)"""
+        return frozenset((user or {}).get('entitlements') or ())
+    
+    @staticmethod
+    def entitlements_from_purchases(user_ids):
+        """{user_id: set of item ids} from the active user_purchases of the given users"""
+        owned = {user_id: set() for user_id in user_ids}
+        purchases = current_app.mongo.db.user_purchases.find(
+            {'user_id': {'$in': list(user_ids)}, 'type': {'$in': list(OWNED_TYPES)}, 'is_active': True},
+            {'user_id': 1, 'item_id': 1}
+        )
+        for purchase in purchases:
+            owned.setdefault(purchase['user_id'], set()).add(purchase['item_id'])
+        return owned
+    
+    @staticmethod
+    def audit_entitlements(repair=False, batch_size=500, job=None):
+        """Compare users.entitlements with user_purchases, optionally adding the missing items.
+        
+        Repairs only ever add. purchase_item grants the entitlement before
+        its purchase row is written, so an item that looks extra may be a
+        purchase in flight; extras are reported for review, never removed.
+        Returns {'checked': n, 'mismatched': n, 'repaired': n, 'samples': [...]}.
+        """
+        summary = {'checked': 0, 'mismatched': 0, 'repaired': 0, 'samples': []}
+        total = current_app.mongo.db.users.estimated_document_count()
+        last_id = None
+        while True:
+            query = {'_id': {'$gt': last_id}} if last_id else {}
+            users = list(current_app.mongo.db.users.find(query, {'entitlements': 1}).sort('_id', 1).limit(batch_size))
+            if not users:
+                break
+            last_id = users[-1]['_id']
+            owned = RewardService.entitlements_from_purchases([user['_id'] for user in users])
+            operations = []
+            for user in users:
+                expected = owned[user['_id']]
+                actual = set(user.get('entitlements') or [])
+                summary['checked'] += 1
+                if expected == actual:
+                    continue
+                summary['mismatched'] += 1
+                if len(summary['samples']) < 20:
+                    summary['samples'].append({
+                        'user_id': str(user['_id']),
+                        'missing': sorted(expected - actual),
+                        'extra': sorted(actual - expected)
+                    })
+                missing = sorted(expected - actual)
+                if missing:
+                    operations.append(UpdateOne(
+                        {'_id': user['_id']},
+                        {'$addToSet': {'entitlements': {'$each': missing}}, '$inc': {'data_version': 1}}
+                    ))
+            if repair and operations:
+                summary['repaired'] += current_app.mongo.db.users.bulk_write(operations, ordered=False).modified_count
+            if job:
+                job.update_progress(summary['checked'], total, f"{summary['mismatched']} mismatched")
+        
+        if summary['mismatched']:
+            logger.warning(f"Entitlement audit: {summary['mismatched']} of {summary['checked']} users differ from their purchases")
+        return summary
     
     @staticmethod
     def get_user_purchases(user_id):
@@ -868,32 +1018,8 @@ class RewardService:
     def get_reward_analytics(user_id):
         """Get comprehensive reward analytics"""
         # Daily points for last 30 days
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        
-        pipeline = [
-            {'$match': {
-                'user_id': user_id,
-                'date': {'$gte': thirty_days_ago}
-            }},
-            {'$group': {
-                '_id': {
-                    'year': {'$year': '$date'},
-                    'month': {'$month': '$date'},
-                    'day': {'$dayOfMonth': '$date'}
-                },
-                'points': {'$sum': '$points'},
-                'count': {'$sum': 1}
-            }},
-            {'$sort': {'_id': 1}}
-        ]
-        
-        daily_points = list(current_app.mongo.db.rewards.aggregate(pipeline))
-        
-        # Convert to chart-friendly format
-        daily_chart_data = {}
-        for item in daily_points:
-            date_str = f"{item['_id']['year']}-{item['_id']['month']:02d}-{item['_id']['day']:02d}"
-            daily_chart_data[date_str] = item['points']
+        rollups = DailyRollups.get_days(user_id, days=30)
+        daily_chart_data = DailyRollups.series(rollups, 'points')
         
         # Goal-based rewards analytics
         goal_rewards = list(current_app.mongo.db.rewards.find({
@@ -907,3 +1033,9 @@ class RewardService:
             'achievements': RewardService.get_user_achievements(user_id),
             'goal_rewards': goal_rewards
         }
+
+
+@register_job('entitlement_audit')
+def entitlement_audit_job(job, repair=False):
+    """Job handler that checks (and with repair=True fixes) every user's entitlement set"""
+    job.set_result(RewardService.audit_entitlements(repair=repair, job=job))
@@ -0,0 +1,436 @@
+"""
+Theme, timer theme and avatar catalog.
+
+Built once at import into read-only lookup tables: entries are frozen
+mappings, names and option values are indexed in dicts and frozensets so
+validation is a single membership test. The raw definitions are checked
+against CATALOG_SCHEMA on load, a malformed entry fails at startup.
+"""
+from types import MappingProxyType
+
+DEFAULT_THEME = 'light'
+DEFAULT_TIMER_THEME = 'default'
+DEFAULT_AVATAR_STYLE = 'avataaars'
+DASHBOARD_LAYOUT_CHOICES = (('default', 'Default'), ('compact', 'Compact'), ('detailed', 'Detailed'))
+DASHBOARD_LAYOUTS = frozenset(name for name, _ in DASHBOARD_LAYOUT_CHOICES)
+
+# Prices mirror the rewards shop; 0 means free for everyone
+_THEMES = [
+    {
+        'name': 'light',
+        'display_name': 'Light',
+        'description': 'Clean and bright theme for daytime use',
+        'preview_image': '/static/images/themes/light-preview.png',
+        'price': 0,
+        'colors': {
+            'primary': '#0d6efd',
+            'secondary': '#6c757d',
+            'success': '#198754',
+            'info': '#0dcaf0',
+            'warning': '#ffc107',
+            'danger': '#dc3545',
+            'background': '#ffffff',
+            'text': '#212529'
+        },
+        'features': ['High contrast', 'Easy reading', 'Professional look']
+    },
+    {
+        'name': 'dark',
+        'display_name': 'Dark',
+        'description': 'Easy on the eyes for low-light environments',
+        'preview_image': '/static/images/themes/dark-preview.png',
+        'price': 0,
+        'colors': {
+            'primary': '#0d6efd',
+            'secondary': '#6c757d',
+            'success': '#198754',
+            'info': '#0dcaf0',
+            'warning': '#ffc107',
+            'danger': '#dc3545',
+            'background': '#1a1a1a',
+            'text': '#ffffff'
+        },
+        'features': ['Reduced eye strain', 'Battery saving', 'Modern look']
+    },
+    {
+        'name': 'retro',
+        'display_name': 'Retro',
+        'description': 'Vintage-inspired theme with warm colors',
+        'preview_image': '/static/images/themes/retro-preview.png',
+        'price': 0,
+        'colors': {
+            'primary': '#8B4513',
+            'secondary': '#D2691E',
+            'success': '#228B22',
+            'info': '#4682B4',
+            'warning': '#DAA520',
+            'danger': '#B22222',
+            'background': '#FFF8DC',
+            'text': '#2F4F4F'
+        },
+        'features': ['Warm colors', 'Nostalgic feel', 'Unique style']
+    },
+    {
+        'name': 'neon',
+        'display_name': 'Neon',
+        'description': 'Cyberpunk-inspired theme with bright accents',
+        'preview_image': '/static/images/themes/neon-preview.png',
+        'price': 0,
+        'colors': {
+            'primary': '#00FFFF',
+            'secondary': '#FF00FF',
+            'success': '#00FF00',
+            'info': '#0080FF',
+            'warning': '#FFFF00',
+            'danger': '#FF0080',
+            'background': '#0a0a0a',
+            'text': '#00FFFF'
+        },
+        'features': ['High energy', 'Futuristic look', 'Vibrant colors']
+    },
+    {
+        'name': 'anime',
+        'display_name': 'Anime',
+        'description': 'Colorful and playful theme inspired by anime',
+        'preview_image': '/static/images/themes/anime-preview.png',
+        'price': 0,
+        'colors': {
+            'primary': '#FF69B4',
+            'secondary': '#9370DB',
+            'success': '#32CD32',
+            'info': '#00BFFF',
+            'warning': '#FFD700',
+            'danger': '#FF6347',
+            'background': '#FFF0F5',
+            'text': '#4B0082'
+        },
+        'features': ['Playful colors', 'Fun animations', 'Cheerful mood']
+    },
+    {
+        'name': 'forest',
+        'display_name': 'Forest',
+        'description': 'Nature-inspired theme with earth tones',
+        'preview_image': '/static/images/themes/forest-preview.png',
+        'price': 500,
+        'colors': {
+            'primary': '#228B22',
+            'secondary': '#8FBC8F',
+            'success': '#32CD32',
+            'info': '#4682B4',
+            'warning': '#DAA520',
+            'danger': '#B22222',
+            'background': '#F0FFF0',
+            'text': '#2F4F4F'
+        },
+        'features': ['Calming colors', 'Nature inspired', 'Relaxing mood']
+    },
+    {
+        'name': 'ocean',
+        'display_name': 'Ocean',
+        'description': 'Calm and serene theme with blue tones',
+        'preview_image': '/static/images/themes/ocean-preview.png',
+        'price': 500,
+        'colors': {
+            'primary': '#4682B4',
+            'secondary': '#5F9EA0',
+            'success': '#20B2AA',
+            'info': '#00BFFF',
+            'warning': '#F0E68C',
+            'danger': '#DC143C',
+            'background': '#F0F8FF',
+            'text': '#2F4F4F'
+        },
+        'features': ['Peaceful colors', 'Ocean inspired', 'Serene mood']
+    },
+    {
+        'name': 'sunset',
+        'display_name': 'Sunset',
+        'description': 'Warm gradient theme inspired by sunsets',
+        'preview_image': '/static/images/themes/sunset-preview.png',
+        'price': 750,
+        'colors': {
+            'primary': '#FF6347',
+            'secondary': '#FF7F50',
+            'success': '#32CD32',
+            'info': '#87CEEB',
+            'warning': '#FFD700',
+            'danger': '#DC143C',
+            'background': '#FFF8DC',
+            'text': '#2F4F4F'
+        },
+        'features': ['Warm gradients', 'Sunset colors', 'Cozy feeling']
+    }
+]
+
+_TIMER_THEMES = [
+    {
+        'name': 'default',
+        'display_name': 'Default',
+        'description': 'Clean and simple timer design',
+        'background': 'linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%)',
+        'text_color': '#333333',
+        'accent_color': '#0d6efd'
+    },
+    {
+        'name': 'focus',
+        'display_name': 'Focus',
+        'description': 'Minimal design for maximum concentration',
+        'background': '#ffffff',
+        'text_color': '#000000',
+        'accent_color': '#28a745'
+    },
+    {
+        'name': 'dark_focus',
+        'display_name': 'Dark Focus',
+        'description': 'Dark theme for focused work sessions',
+        'background': 'linear-gradient(135deg, #2c3e50 0%, #34495e 100%)',
+        'text_color': '#ffffff',
+        'accent_color': '#3498db'
+    },
+    {
+        'name': 'retro_timer',
+        'display_name': 'Retro Timer',
+        'description': 'Vintage-style timer with warm colors',
+        'background': 'linear-gradient(135deg, #ff9a9e 0%, #fecfef 50%, #fecfef 100%)',
+        'text_color': '#8B4513',
+        'accent_color': '#D2691E'
+    },
+    {
+        'name': 'neon_timer',
+        'display_name': 'Neon Timer',
+        'description': 'Cyberpunk-style timer with glowing effects',
+        'background': 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)',
+        'text_color': '#00FFFF',
+        'accent_color': '#FF00FF'
+    },
+    {
+        'name': 'nature_timer',
+        'display_name': 'Nature Timer',
+        'description': 'Calming nature-inspired timer',
+        'background': 'linear-gradient(135deg, #ffecd2 0%, #fcb69f 100%)',
+        'text_color': '#2F4F4F',
+        'accent_color': '#228B22'
+    },
+    {
+        'name': 'space_timer',
+        'display_name': 'Space Timer',
+        'description': 'Cosmic theme for out-of-this-world focus',
+        'background': 'linear-gradient(135deg, #0c0c0c 0%, #1a1a2e 50%, #16213e 100%)',
+        'text_color': '#ffffff',
+        'accent_color': '#00BFFF'
+    },
+    {
+        'name': 'zen_timer',
+        'display_name': 'Zen Timer',
+        'description': 'Peaceful and minimalist design',
+        'background': 'linear-gradient(135deg, #f7f7f7 0%, #e8e8e8 100%)',
+        'text_color': '#555555',
+        'accent_color': '#9370DB'
+    }
+]
+
+# DiceBear styles with the customization values each accepts
+_AVATARS = [
+    {
+        'style': 'avataaars',
+        'display_name': 'Avataaars',
+        'description': 'Cartoon-style avatars with various customization options',
+        'price': 0,
+        'options': {
+            'hair': ['short01', 'short02', 'long01', 'long02', 'none'],
+            'backgroundColor': ['#ffffff', '#f0f0f0', '#d3d3d3', '#add8e6', '#90ee90'],
+            'flip': [True, False]
+        }
+    },
+    {
+        'style': 'pixel-art',
+        'display_name': 'Pixel Art',
+        'description': 'Retro pixel art avatars with a nostalgic feel',
+        'price': 0,
+        'options': {
+            'hair': ['short01', 'short02', 'long01', 'long02'],
+            'backgroundColor': ['#ffffff', '#000000', '#ff0000', '#00ff00', '#0000ff'],
+            'flip': [True, False]
+        }
+    },
+    {
+        'style': 'lorelei',
+        'display_name': 'Lorelei',
+        'description': 'Stylized character avatars with modern design',
+        'price': 500,
+        'options': {
+            'hair': ['style01', 'style02', 'style03'],
+            'backgroundColor': ['#ffffff', '#f0f0f0', '#d3d3d3'],
+            'flip': [True, False]
+        }
+    },
+    {
+        'style': 'bottts',
+        'display_name': 'Bottts',
+        'description': 'Abstract robot avatars with unique patterns',
+        'price': 500,
+        'options': {
+            'colors': ['red', 'blue', 'green'],
+            'backgroundColor': ['#ffffff', '#000000'],
+            'flip': [True, False]
+        }
+    },
+    {
+        'style': 'adventurer',
+        'display_name': 'Adventurer',
+        'description': 'Fantasy-themed avatars for adventurous users',
+        'price': 750,
+        'options': {
+            'hair': ['style01', 'style02', 'style03'],
+            'backgroundColor': ['#ffffff', '#f0f0f0', '#d3d3d3'],
+            'flip': [True, False]
+        }
+    }
+]
+
+# Required fields and their types for each kind of entry
+CATALOG_SCHEMA = {
+    'themes': {'name': str, 'display_name': str, 'description': str, 'preview_image': str,
+               'price': int, 'colors': dict, 'features': list},
+    'timer_themes': {'name': str, 'display_name': str, 'description': str, 'background': str,
+                     'text_color': str, 'accent_color': str},
+    'avatars': {'style': str, 'display_name': str, 'description': str, 'price': int, 'options': dict}
+}
+
+AVATAR_OPTION_KEYS = frozenset(['hair', 'backgroundColor', 'colors', 'flip'])
+
+
+def _validate(kind, entries, key):
+    schema = CATALOG_SCHEMA[kind]
+    seen = set()
+    for entry in entries:
+        for field, expected in schema.items():
+            if not isinstance(entry.get(field), expected):
+                raise ValueError(f"Catalog {kind} entry {entry.get(key)!r}: '{field}' must be {expected.__name__}")
+        if entry[key] in seen:
+            raise ValueError(f"Catalog {kind}: duplicate {key} {entry[key]!r}")
+        seen.add(entry[key])
+        if entry.get('price', 0) < 0:
+            raise ValueError(f"Catalog {kind} entry {entry[key]!r}: price cannot be negative")
+        if kind == 'avatars' and not set(entry['options']) <= AVATAR_OPTION_KEYS:
+            raise ValueError(f"Catalog avatar {entry[key]!r}: unknown options {set(entry['options']) - AVATAR_OPTION_KEYS}")
+
+
+def _freeze(value):
+    """Read-only copy: dicts become mapping proxies, lists become tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Plain dict/list copy of a catalog entry, e.g. for jsonify"""
+    if isinstance(value, MappingProxyType):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+def price_tier(price):
+    """'free', 'standard' (up to 500 points) or 'premium'"""
+    if not price:
+        return 'free'
+    return 'standard' if price <= 500 else 'premium'
+
+
+def _tiers(entries, key):
+    tiers = {}
+    for entry in entries:
+        tiers.setdefault(price_tier(entry['price']), []).append(entry[key])
+    return MappingProxyType({tier: frozenset(names) for tier, names in tiers.items()})
+
+
+_validate('themes', _THEMES, 'name')
+_validate('timer_themes', _TIMER_THEMES, 'name')
+_validate('avatars', _AVATARS, 'style')
+
+THEMES = _freeze(_THEMES)
+THEMES_BY_NAME = MappingProxyType({theme['name']: theme for theme in THEMES})
+THEME_NAMES = frozenset(THEMES_BY_NAME)
+THEMES_BY_TIER = _tiers(THEMES, 'name')
+FREE_THEMES = THEMES_BY_TIER.get('free', frozenset())
+THEME_CHOICES = tuple((theme['name'], theme['display_name']) for theme in THEMES)
+
+TIMER_THEMES = _freeze(_TIMER_THEMES)
+TIMER_THEMES_BY_NAME = MappingProxyType({theme['name']: theme for theme in TIMER_THEMES})
+TIMER_THEME_NAMES = frozenset(TIMER_THEMES_BY_NAME)
+TIMER_THEME_CHOICES = tuple((theme['name'], theme['display_name']) for theme in TIMER_THEMES)
+
+# Avatars keep a 'free' flag for the templates
+AVATARS = _freeze([dict(avatar, free=avatar['price'] == 0) for avatar in _AVATARS])
+AVATARS_BY_STYLE = MappingProxyType({avatar['style']: avatar for avatar in AVATARS})
+AVATAR_STYLES = frozenset(AVATARS_BY_STYLE)
+AVATARS_BY_TIER = _tiers(AVATARS, 'style')
+FREE_AVATAR_STYLES = AVATARS_BY_TIER.get('free', frozenset())
+AVATAR_OPTIONS = MappingProxyType({avatar['style']: avatar['options'] for avatar in AVATARS})
+AVATAR_OPTION_SETS = MappingProxyType({
+    style: MappingProxyType({option: frozenset(values) for option, values in options.items()})
+    for style, options in AVATAR_OPTIONS.items()
+})
+# (value, label) select choices per style and option, for the settings forms
+AVATAR_OPTION_CHOICES = MappingProxyType({
+    style: MappingProxyType({option: tuple((value, value) for value in values) for option, values in options.items()})
+    for style, options in AVATAR_OPTIONS.items()
+})
+
+
+def avatar_choices(owned_styles=()):
+    """(style, display name) choices of the free styles plus the ones a user owns"""
+    owned = FREE_AVATAR_STYLES | frozenset(owned_styles)
+    return [(avatar['style'], avatar['display_name']) for avatar in AVATARS if avatar['style'] in owned]
+
+
+def validate_avatar_options(style, options):
+    """Keep the options a style accepts. Returns (validated, error)"""
+    valid_options = AVATAR_OPTION_SETS.get(style, {})
+    validated = {}
+
+    for option in ('hair', 'backgroundColor', 'colors'):
+        if option in options and option in valid_options:
+            values = options[option]
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            validated[option] = [value for value in values if isinstance(value, str) and value in valid_options[option]]
+            if not validated[option]:
+                validated[option] = [AVATAR_OPTIONS[style][option][0]]  # Default to first option
+
+    if 'flip' in options and 'flip' in valid_options:
+        validated['flip'] = bool(options['flip'])
+
+    return validated, None if validated else ("Invalid options", 400)
+
+
+def _choose(value, names, default):
+    """value if it names a catalog entry, default otherwise (lists and dicts included)"""
+    return value if isinstance(value, str) and value in names else default
+
+
+def validate_preferences(preferences):
+    """Validate and sanitize imported user preferences, including avatar"""
+    validated = {
+        'theme': _choose(preferences.get('theme'), THEME_NAMES, DEFAULT_THEME),
+        'timer_theme': _choose(preferences.get('timer_theme'), TIMER_THEME_NAMES, DEFAULT_TIMER_THEME)
+    }
+
+    avatar = preferences.get('avatar')
+    if isinstance(avatar, dict):
+        style = _choose(avatar.get('style'), AVATAR_STYLES, DEFAULT_AVATAR_STYLE)
+        options, _ = validate_avatar_options(style, avatar.get('options') or {})
+        validated['avatar'] = {'style': style, 'options': options}
+    else:
+        validated['avatar'] = {'style': DEFAULT_AVATAR_STYLE, 'options': {}}
+
+    for pref in ('timer_sound', 'notifications', 'animations', 'compact_mode'):
+        validated[pref] = bool(preferences.get(pref, False))
+
+    validated['default_timer_duration'] = max(1, min(120, int(preferences.get('default_timer_duration', 25))))
+    validated['dashboard_layout'] = _choose(preferences.get('dashboard_layout'), DASHBOARD_LAYOUTS, 'default')
+    return validated
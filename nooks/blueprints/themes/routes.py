@@ -5,6 +5,12 @@ from datetime import datetime
 import requests  # For DiceBear API calls
 import urllib.parse  # For URL encoding
 import logging
+from blueprints.rewards.services import RewardService
+from blueprints.themes.catalog import (
+    THEMES, THEMES_BY_NAME, THEME_NAMES, FREE_THEMES, TIMER_THEMES, TIMER_THEME_NAMES,
+    AVATARS, AVATAR_STYLES, FREE_AVATAR_STYLES, AVATAR_OPTIONS, DASHBOARD_LAYOUTS,
+    thaw, validate_avatar_options, validate_preferences
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,24 +28,16 @@ def index():
     current_theme = preferences.get('theme', 'light')
     current_avatar = preferences.get('avatar', {'style': 'avataaars', 'options': {}})
     
-    # Available themes and avatars
-    available_themes = get_available_themes()
-    available_avatars = get_available_avatars()
-    
     # Get purchased themes
-    purchased_items = current_app.mongo.db.user_purchases.find({
-        'user_id': user_id,
-        'type': 'theme',
-        'is_active': True
-    })
-    purchased_themes = [p['item_id'].replace('theme_', '') for p in purchased_items]
+    purchased_themes = {item.replace('theme_', '') for item in RewardService.owned_items(user) if item.startswith('theme_')}
     
     return render_template('themes/index.html',
-                         themes=available_themes,
+                         themes=THEMES,
                          current_theme=current_theme,
-                         avatars=available_avatars,
+                         avatars=AVATARS,
                          current_avatar=current_avatar,
-                         purchased_themes=purchased_themes)
+                         purchased_themes=purchased_themes,
+                         free_themes=FREE_THEMES)
 
 @themes_bp.route('/set_theme', methods=['POST'])
 @login_required
@@ -52,16 +50,13 @@ def set_theme():
         theme_name = theme_name.replace('theme_', '')
     
     # Validate theme
-    available_themes = get_available_themes()
-    if theme_name not in [theme['name'] for theme in available_themes]:
+    if theme_name not in THEME_NAMES:
         flash('Invalid theme selected', 'error')
         return redirect(url_for('themes.index'))
     
-    # Check if theme is purchased or free
-    purchased_themes = [p['item_id'].replace('theme_', '') for p in current_app.mongo.db.user_purchases.find({
-        'user_id': user_id, 'type': 'theme', 'is_active': True
-    })]
-    if theme_name not in purchased_themes and theme_name not in ['light', 'dark', 'retro', 'neon', 'anime']:
+    # Check if theme is free or purchased
+    user = current_app.mongo.db.users.find_one({'_id': user_id}, {'entitlements': 1})
+    if theme_name not in FREE_THEMES and f'theme_{theme_name}' not in RewardService.owned_items(user):
         flash('This theme requires purchase', 'error')
         return redirect(url_for('themes.index'))
     
@@ -99,16 +94,17 @@ def save_customization():
         theme_name = theme_name.replace('theme_', '')
     
     # Validate theme
-    available_themes = get_available_themes()
-    purchased_themes = [p['item_id'].replace('theme_', '') for p in current_app.mongo.db.user_purchases.find({
-        'user_id': user_id, 'type': 'theme', 'is_active': True
-    })]
-    if theme_name not in [theme['name'] for theme in available_themes]:
+    if theme_name not in THEME_NAMES:
         flash('Invalid theme selected', 'error')
         return redirect(url_for('themes.customize'))
-    if theme_name not in purchased_themes and theme_name not in ['light', 'dark', 'retro', 'neon', 'anime']:
+    if theme_name not in FREE_THEMES and f'theme_{theme_name}' not in RewardService.owned_items(user):
         flash('This theme requires purchase', 'error')
         return redirect(url_for('themes.customize'))
+    timer_theme = request.form.get('timer_theme', 'default')
+    dashboard_layout = request.form.get('dashboard_layout', 'default')
+    if timer_theme not in TIMER_THEME_NAMES or dashboard_layout not in DASHBOARD_LAYOUTS:
+        flash('Invalid timer theme or dashboard layout', 'error')
+        return redirect(url_for('themes.customize'))
     
     # Update preferences from form
     preferences.update({
@@ -118,8 +114,8 @@ def save_customization():
         'animations': 'animations' in request.form,
         'compact_mode': 'compact_mode' in request.form,
         'default_timer_duration': int(request.form.get('default_timer_duration', 25)),
-        'timer_theme': request.form.get('timer_theme', 'default'),
-        'dashboard_layout': request.form.get('dashboard_layout', 'default')
+        'timer_theme': timer_theme,
+        'dashboard_layout': dashboard_layout
     })
     
     # Save to database
@@ -139,11 +135,8 @@ def timer_themes():
     
     current_timer_theme = user.get('preferences', {}).get('timer_theme', 'default')
     
-    # Available timer themes
-    timer_themes = get_timer_themes()
-    
     return render_template('themes/timer_themes.html',
-                         timer_themes=timer_themes,
+                         timer_themes=TIMER_THEMES,
                          current_timer_theme=current_timer_theme)
 
 @themes_bp.route('/set_timer_theme', methods=['POST'])
@@ -152,6 +145,10 @@ def set_timer_theme():
     user_id = ObjectId(current_user.id)
     timer_theme = request.form['timer_theme']
     
+    if timer_theme not in TIMER_THEME_NAMES:
+        flash('Invalid timer theme selected', 'error')
+        return redirect(url_for('themes.timer_themes'))
+    
     # Update user preferences
     current_app.mongo.db.users.update_one(
         {'_id': user_id},
@@ -170,19 +167,11 @@ def avatars():
     preferences = user.get('preferences', {})
     current_avatar = preferences.get('avatar', {'style': 'avataaars', 'options': {}})
     
-    # Get available avatar styles
-    available_avatars = get_available_avatars()
-    
     # Get user's purchased avatar styles from rewards
-    purchased_items = current_app.mongo.db.user_purchases.find({
-        'user_id': user_id,
-        'type': 'avatar_style',
-        'is_active': True
-    })
-    purchased_styles = [item['item_id'] for item in purchased_items]
+    purchased_styles = RewardService.owned_items(user) & AVATAR_STYLES
     
     return render_template('themes/avatars.html',
-                         avatars=available_avatars,
+                         avatars=AVATARS,
                          current_avatar=current_avatar,
                          purchased_styles=purchased_styles)
 
@@ -192,21 +181,13 @@ def set_avatar():
     user_id = ObjectId(current_user.id)
     avatar_style = request.form['avatar_style']
     
-    # Validate avatar style
-    available_avatars = get_available_avatars()
-    available_styles = [avatar['style'] for avatar in available_avatars]
-    purchased_styles = [item['item_id'] for item in current_app.mongo.db.user_purchases.find({
-        'user_id': user_id,
-        'type': 'avatar_style',
-        'is_active': True
-    })]
-    
     # Check if user has access to the style (free or purchased)
-    if avatar_style not in available_styles:
+    if avatar_style not in AVATAR_STYLES:
         flash('Invalid avatar style selected', 'error')
         return redirect(url_for('themes.avatars'))
     
-    if avatar_style not in purchased_styles and avatar_style not in get_free_avatar_styles():
+    user = current_app.mongo.db.users.find_one({'_id': user_id}, {'entitlements': 1})
+    if avatar_style not in FREE_AVATAR_STYLES and avatar_style not in RewardService.owned_items(user):
         flash('This avatar style requires purchase', 'error')
         return redirect(url_for('themes.avatars'))
     
@@ -237,38 +218,34 @@ def customize_avatar():
         }
         
         # Validate options
-        is_valid, error = validate_avatar_options(current_avatar['style'], avatar_options)
-        if not is_valid:
-            flash(f"Invalid avatar options: {error}", 'error')
+        validated_options, error = validate_avatar_options(current_avatar['style'], avatar_options)
+        if error:
+            flash(f"Invalid avatar options: {error[0]}", 'error')
             return redirect(url_for('themes.customize_avatar'))
         
         # Update user preferences
         current_app.mongo.db.users.update_one(
             {'_id': user_id},
-            {'$set': {'preferences.avatar.options': avatar_options}}
+            {'$set': {'preferences.avatar.options': validated_options}}
         )
         
         flash('Avatar customization saved successfully!', 'success')
         return redirect(url_for('themes.avatars'))
     
-    # Get available customization options for the current style
-    customization_options = get_avatar_customization_options(current_avatar['style'])
-    
     return render_template('themes/customize_avatar.html',
                          current_avatar=current_avatar,
-                         customization_options=customization_options)
+                         customization_options=AVATAR_OPTIONS.get(current_avatar['style'], {}))
 
 @themes_bp.route('/api/theme_preview/<theme_name>')
 @login_required
 def api_theme_preview(theme_name):
     """Get theme preview data"""
-    themes = get_available_themes()
-    theme = next((t for t in themes if t['name'] == theme_name), None)
+    theme = THEMES_BY_NAME.get(theme_name)
     
     if not theme:
         return jsonify({'error': 'Theme not found'}), 404
     
-    return jsonify(theme)
+    return jsonify(thaw(theme))
 
 @themes_bp.route('/api/avatar_preview/<style>')
 @login_required
@@ -280,8 +257,7 @@ def api_avatar_preview(style):
     avatar_options = preferences.get('avatar', {}).get('options', {})
     
     # Validate style
-    available_avatars = get_available_avatars()
-    if style not in [avatar['style'] for avatar in available_avatars]:
+    if style not in AVATAR_STYLES:
         return jsonify({'error': 'Invalid avatar style'}), 404
     
     # Generate DiceBear URL
@@ -300,10 +276,10 @@ def api_avatar_preview(style):
 @login_required
 def api_avatar_customization_options(style):
     """Get customization options for a specific avatar style"""
-    options = get_avatar_customization_options(style)
+    options = AVATAR_OPTIONS.get(style)
     if not options:
         return jsonify({'error': 'Invalid avatar style'}), 404
-    return jsonify(options)
+    return jsonify(thaw(options))
 
 @themes_bp.route('/export_theme')
 @login_required
@@ -349,365 +325,3 @@ def import_theme():
         flash('Invalid theme file format', 'error')
     
     return redirect(url_for('themes.customize'))
-
-def get_available_themes():
-    """Get all available themes with their configurations"""
-    return [
-        {
-            'name': 'light',
-            'display_name': 'Light',
-            'description': 'Clean and bright theme for daytime use',
-            'preview_image': '/static/images/themes/light-preview.png',
-            'colors': {
-                'primary': '#0d6efd',
-                'secondary': '#6c757d',
-                'success': '#198754',
-                'info': '#0dcaf0',
-                'warning': '#ffc107',
-                'danger': '#dc3545',
-                'background': '#ffffff',
-                'text': '#212529'
-            },
-            'features': ['High contrast', 'Easy reading', 'Professional look']
-        },
-        {
-            'name': 'dark',
-            'display_name': 'Dark',
-            'description': 'Easy on the eyes for low-light environments',
-            'preview_image': '/static/images/themes/dark-preview.png',
-            'colors': {
-                'primary': '#0d6efd',
-                'secondary': '#6c757d',
-                'success': '#198754',
-                'info': '#0dcaf0',
-                'warning': '#ffc107',
-                'danger': '#dc3545',
-                'background': '#1a1a1a',
-                'text': '#ffffff'
-            },
-            'features': ['Reduced eye strain', 'Battery saving', 'Modern look']
-        },
-        {
-            'name': 'retro',
-            'display_name': 'Retro',
-            'description': 'Vintage-inspired theme with warm colors',
-            'preview_image': '/static/images/themes/retro-preview.png',
-            'colors': {
-                'primary': '#8B4513',
-                'secondary': '#D2691E',
-                'success': '#228B22',
-                'info': '#4682B4',
-                'warning': '#DAA520',
-                'danger': '#B22222',
-                'background': '#FFF8DC',
-                'text': '#2F4F4F'
-            },
-            'features': ['Warm colors', 'Nostalgic feel', 'Unique style']
-        },
-        {
-            'name': 'neon',
-            'display_name': 'Neon',
-            'description': 'Cyberpunk-inspired theme with bright accents',
-            'preview_image': '/static/images/themes/neon-preview.png',
-            'colors': {
-                'primary': '#00FFFF',
-                'secondary': '#FF00FF',
-                'success': '#00FF00',
-                'info': '#0080FF',
-                'warning': '#FFFF00',
-                'danger': '#FF0080',
-                'background': '#0a0a0a',
-                'text': '#00FFFF'
-            },
-            'features': ['High energy', 'Futuristic look', 'Vibrant colors']
-        },
-        {
-            'name': 'anime',
-            'display_name': 'Anime',
-            'description': 'Colorful and playful theme inspired by anime',
-            'preview_image': '/static/images/themes/anime-preview.png',
-            'colors': {
-                'primary': '#FF69B4',
-                'secondary': '#9370DB',
-                'success': '#32CD32',
-                'info': '#00BFFF',
-                'warning': '#FFD700',
-                'danger': '#FF6347',
-                'background': '#FFF0F5',
-                'text': '#4B0082'
-            },
-            'features': ['Playful colors', 'Fun animations', 'Cheerful mood']
-        },
-        {
-            'name': 'forest',
-            'display_name': 'Forest',
-            'description': 'Nature-inspired theme with earth tones',
-            'preview_image': '/static/images/themes/forest-preview.png',
-            'colors': {
-                'primary': '#228B22',
-                'secondary': '#8FBC8F',
-                'success': '#32CD32',
-                'info': '#4682B4',
-                'warning': '#DAA520',
-                'danger': '#B22222',
-                'background': '#F0FFF0',
-                'text': '#2F4F4F'
-            },
-            'features': ['Calming colors', 'Nature inspired', 'Relaxing mood']
-        },
-        {
-            'name': 'ocean',
-            'display_name': 'Ocean',
-            'description': 'Calm and serene theme with blue tones',
-            'preview_image': '/static/images/themes/ocean-preview.png',
-            'colors': {
-                'primary': '#4682B4',
-                'secondary': '#5F9EA0',
-                'success': '#20B2AA',
-                'info': '#00BFFF',
-                'warning': '#F0E68C',
-                'danger': '#DC143C',
-                'background': '#F0F8FF',
-                'text': '#2F4F4F'
-            },
-            'features': ['Peaceful colors', 'Ocean inspired', 'Serene mood']
-        },
-        {
-            'name': 'sunset',
-            'display_name': 'Sunset',
-            'description': 'Warm gradient theme inspired by sunsets',
-            'preview_image': '/static/images/themes/sunset-preview.png',
-            'colors': {
-                'primary': '#FF6347',
-                'secondary': '#FF7F50',
-                'success': '#32CD32',
-                'info': '#87CEEB',
-                'warning': '#FFD700',
-                'danger': '#DC143C',
-                'background': '#FFF8DC',
-                'text': '#2F4F4F'
-            },
-            'features': ['Warm gradients', 'Sunset colors', 'Cozy feeling']
-        }
-    ]
-
-def get_timer_themes():
-    """Get available timer-specific themes"""
-    themes = [
-        {
-            'name': 'default',
-            'display_name': 'Default',
-            'description': 'Clean and simple timer design',
-            'background': 'linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%)',
-            'text_color': '#333333',
-            'accent_color': '#0d6efd'
-        },
-        {
-            'name': 'focus',
-            'display_name': 'Focus',
-            'description': 'Minimal design for maximum concentration',
-            'background': '#ffffff',
-            'text_color': '#000000',
-            'accent_color': '#28a745'
-        },
-        {
-            'name': 'dark_focus',
-            'display_name': 'Dark Focus',
-            'description': 'Dark theme for focused work sessions',
-            'background': 'linear-gradient(135deg, #2c3e50 0%, #34495e 100%)',
-            'text_color': '#ffffff',
-            'accent_color': '#3498db'
-        },
-        {
-            'name': 'retro_timer',
-            'display_name': 'Retro Timer',
-            'description': 'Vintage-style timer with warm colors',
-            'background': 'linear-gradient(135deg, #ff9a9e 0%, #fecfef 50%, #fecfef 100%)',
-            'text_color': '#8B4513',
-            'accent_color': '#D2691E'
-        },
-        {
-            'name': 'neon_timer',
-            'display_name': 'Neon Timer',
-            'description': 'Cyberpunk-style timer with glowing effects',
-            'background': 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)',
-            'text_color': '#00FFFF',
-            'accent_color': '#FF00FF'
-        },
-        {
-            'name': 'nature_timer',
-            'display_name': 'Nature Timer',
-            'description': 'Calming nature-inspired timer',
-            'background': 'linear-gradient(135deg, #ffecd2 0%, #fcb69f 100%)',
-            'text_color': '#2F4F4F',
-            'accent_color': '#228B22'
-        },
-        {
-            'name': 'space_timer',
-            'display_name': 'Space Timer',
-            'description': 'Cosmic theme for out-of-this-world focus',
-            'background': 'linear-gradient(135deg, #0c0c0c 0%, #1a1a2e 50%, #16213e 100%)',
-            'text_color': '#ffffff',
-            'accent_color': '#00BFFF'
-        },
-        {
-            'name': 'zen_timer',
-            'display_name': 'Zen Timer',
-            'description': 'Peaceful and minimalist design',
-            'background': 'linear-gradient(135deg, #f7f7f7 0%, #e8e8e8 100%)',
-            'text_color': '#555555',
-            'accent_color': '#9370DB'
-        }
-    ]
-    logger.debug(f"Available timer themes: {[t['name'] for t in themes]}")
-    return themes
-
-def get_available_avatars():
-    """Get available avatar styles from DiceBear"""
-    return [
-        {
-            'style': 'avataaars',
-            'display_name': 'Avataaars',
-            'description': 'Cartoon-style avatars with various customization options',
-            'free': True
-        },
-        {
-            'style': 'pixel-art',
-            'display_name': 'Pixel Art',
-            'description': 'Retro pixel art avatars with a nostalgic feel',
-            'free': True
-        },
-        {
-            'style': 'lorelei',
-            'display_name': 'Lorelei',
-            'description': 'Stylized character avatars with modern design',
-            'free': False
-        },
-        {
-            'style': 'bottts',
-            'display_name': 'Bottts',
-            'description': 'Abstract robot avatars with unique patterns',
-            'free': False
-        },
-        {
-            'style': 'adventurer',
-            'display_name': 'Adventurer',
-            'description': 'Fantasy-themed avatars for adventurous users',
-            'free': False
-        }
-    ]
-
-def get_free_avatar_styles():
-    """Get list of free avatar styles"""
-    return [avatar['style'] for avatar in get_available_avatars() if avatar['free']]
-
-def get_avatar_customization_options(style):
-    """Get customization options for a specific avatar style"""
-    options = {
-        'avataaars': {
-            'hair': ['short01', 'short02', 'long01', 'long02', 'none'],
-            'backgroundColor': ['#ffffff', '#f0f0f0', '#d3d3d3', '#add8e6', '#90ee90'],
-            'flip': [True, False]
-        },
-        'pixel-art': {
-            'hair': ['short01', 'short02', 'long01', 'long02'],
-            'backgroundColor': ['#ffffff', '#000000', '#ff0000', '#00ff00', '#0000ff'],
-            'flip': [True, False]
-        },
-        'lorelei': {
-            'hair': ['style01', 'style02', 'style03'],
-            'backgroundColor': ['#ffffff', '#f0f0f0', '#d3d3d3'],
-            'flip': [True, False]
-        },
-        'bottts': {
-            'colors': ['red', 'blue', 'green'],
-            'backgroundColor': ['#ffffff', '#000000'],
-            'flip': [True, False]
-        },
-        'adventurer': {
-            'hair': ['style01', 'style02', 'style03'],
-            'backgroundColor': ['#ffffff', '#f0f0f0', '#d3d3d3'],
-            'flip': [True, False]
-        }
-    }
-    return options.get(style, {})
-
-def validate_preferences(preferences):
-    """Validate and sanitize user preferences, including avatar"""
-    valid_themes = [theme['name'] for theme in get_available_themes()]
-    valid_timer_themes = [theme['name'] for theme in get_timer_themes()]
-    valid_avatar_styles = [avatar['style'] for avatar in get_available_avatars()]
-    
-    validated = {}
-    
-    # Theme validation
-    if 'theme' in preferences and preferences['theme'] in valid_themes:
-        validated['theme'] = preferences['theme']
-    else:
-        validated['theme'] = 'light'
-    
-    # Timer theme validation
-    if 'timer_theme' in preferences and preferences['timer_theme'] in valid_timer_themes:
-        validated['timer_theme'] = preferences['timer_theme']
-    else:
-        validated['timer_theme'] = 'default'
-    
-    # Avatar validation
-    if 'avatar' in preferences:
-        avatar = preferences['avatar']
-        validated_avatar = {}
-        if 'style' in avatar and avatar['style'] in valid_avatar_styles:
-            validated_avatar['style'] = avatar['style']
-        else:
-            validated_avatar['style'] = 'avataaars'
-        validated_avatar['options'] = validate_avatar_options(avatar.get('options', {}), validated_avatar['style'])
-        validated['avatar'] = validated_avatar
-    else:
-        validated['avatar'] = {'style': 'avataaars', 'options': {}}
-    
-    # Boolean preferences
-    boolean_prefs = ['timer_sound', 'notifications', 'animations', 'compact_mode']
-    for pref in boolean_prefs:
-        validated[pref] = bool(preferences.get(pref, False))
-    
-    # Numeric preferences
-    validated['default_timer_duration'] = max(1, min(120, 
-        int(preferences.get('default_timer_duration', 25))))
-    
-    # String preferences with validation
-    valid_layouts = ['default', 'compact', 'detailed']
-    if 'dashboard_layout' in preferences and preferences['dashboard_layout'] in valid_layouts:
-        validated['dashboard_layout'] = preferences['dashboard_layout']
-    else:
-        validated['dashboard_layout'] = 'default'
-    
-    return validated
-
-def validate_avatar_options(style, options):
-    """Validate and sanitize avatar customization options"""
-    valid_options = get_avatar_customization_options(style)
-    validated = {}
-    
-    # Validate hair
-    if 'hair' in options and 'hair' in valid_options:
-        validated['hair'] = [h for h in options['hair'] if h in valid_options['hair']]
-        if not validated['hair']:
-            validated['hair'] = [valid_options['hair'][0]]  # Default to first option
-    
-    # Validate backgroundColor
-    if 'backgroundColor' in options and 'backgroundColor' in valid_options:
-        validated['backgroundColor'] = [c for c in options['backgroundColor'] if c in valid_options['backgroundColor']]
-        if not validated['backgroundColor']:
-            validated['backgroundColor'] = [valid_options['backgroundColor'][0]]
-    
-    # Validate colors (for styles like bottts)
-    if 'colors' in options and 'colors' in valid_options:
-        validated['colors'] = [c for c in options['colors'] if c in valid_options['colors']]
-        if not validated['colors']:
-            validated['colors'] = [valid_options['colors'][0]]
-    
-    # Validate flip
-    if 'flip' in options and 'flip' in valid_options:
-        validated['flip'] = bool(options['flip'])
-    
-    return validated, None if validated else ("Invalid options", 400)
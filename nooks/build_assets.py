@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+Build Fingerprinted Static Assets
+
+Writes content-hashed copies of the files under static/ (plus gzip and,
+when the brotli package is installed, brotli variants) to static/dist and
+records them in static/dist/manifest.json. Run it as part of a deploy; the
+app also builds any missing assets at startup.
+"""
+
+import os
+from utils.assets import build_assets
+
+if __name__ == '__main__':
+    static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    built = build_assets(static_folder, prune=True)
+    compressed = sum(1 for entry in built.values() if entry['encodings'])
+    print(f"✓ Built {len(built)} assets into static/dist ({compressed} precompressed)")
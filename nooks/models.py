@@ -3,7 +3,11 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from utils.versioning import bump_data_version
 import os
+import re
+import hashlib
 import logging
 import requests
 
@@ -18,6 +22,8 @@ class User(UserMixin):
         self.email = user_data['email']
         self.is_admin = user_data.get('is_admin', False)
         self.active = user_data.get('is_active', True)  
+        # Read with the rest of the user on every request, so ETags need no extra query
+        self.data_version = user_data.get('data_version', 0)
         self.authenticated = True
 
     @property
@@ -51,6 +57,13 @@ class DatabaseManager:
             # Initialize default data and migrations
             DatabaseManager._create_default_admin()
             DatabaseManager._migrate_user_avatars()  # New migration for avatar preferences
+            DatabaseManager._migrate_book_search_terms()
+            DatabaseManager._migrate_user_search_keys()
+            DatabaseManager._migrate_book_annotations()
+            DatabaseManager._migrate_user_entitlements()
+            DatabaseManager._migrate_quiz_stats()
+            DatabaseManager._migrate_flashcard_schedule()
+            DatabaseManager._migrate_club_memberships()
             DatabaseManager._initialize_default_data()
             
             logger.info("Database initialization completed successfully")
@@ -64,13 +77,15 @@ class DatabaseManager:
     def _create_collections():
         """Create all required collections if they don't exist"""
         collections = [
-            'users', 'books', 'reading_sessions', 'completed_tasks',
+            'users', 'books', 'book_takeaways', 'book_quotes', 'library_facets',
+            'reading_sessions', 'completed_tasks', 'daily_rollups',
             'rewards', 'user_badges', 'user_goals', 'themes',
             'user_preferences', 'notifications', 'activity_log',
             'quotes', 'transactions', 'user_purchases',
-            'clubs', 'club_posts', 'club_chat_messages',
-            'flashcards', 'quiz_questions', 'quiz_answers', 'user_progress',
-            'donations', 'testimonials'  # Added new collections
+            'clubs', 'club_memberships', 'club_presence', 'club_posts', 'club_chat_messages',
+            'flashcards', 'quiz_questions', 'quiz_daily_sets', 'quiz_answers', 'user_progress',
+            'donations', 'payment_events', 'testimonials',  # Added new collections
+            'maintenance_runs', 'jobs'
         ]
         existing_collections = current_app.mongo.db.list_collection_names()
         
@@ -119,6 +134,9 @@ class DatabaseManager:
             if 'is_admin_1' not in indexes:
                 current_app.mongo.db.users.create_index("is_admin")
                 logger.info("Created index on users.is_admin")
+            if 'search_keys_1_created_at_-1' not in indexes:
+                current_app.mongo.db.users.create_index([("search_keys", 1), ("created_at", -1)])
+                logger.info("Created index on users.search_keys_created_at")
 
             # Books collection indexes
             indexes = current_app.mongo.db.books.index_information()
@@ -134,6 +152,37 @@ class DatabaseManager:
             if 'pdf_path_1' not in indexes:
                 current_app.mongo.db.books.create_index("pdf_path", sparse=True)
                 logger.info("Created sparse index on books.pdf_path")
+            if 'book_text_search' not in indexes:
+                current_app.mongo.db.books.create_index(
+                    [("title", "text"), ("authors", "text"), ("genre", "text"), ("description", "text")],
+                    weights={'title': 10, 'authors': 5, 'genre': 2, 'description': 1},
+                    default_language='none',
+                    name='book_text_search'
+                )
+                logger.info("Created text index on books.title_authors_genre_description")
+            if 'user_id_1_search_terms_1' not in indexes:
+                current_app.mongo.db.books.create_index([("user_id", 1), ("search_terms", 1)])
+                logger.info("Created index on books.user_id_search_terms")
+            if 'search_terms_1' not in indexes:
+                current_app.mongo.db.books.create_index("search_terms")
+                logger.info("Created index on books.search_terms")
+            # Library sort options, with and without the status filter
+            for field, direction in (('added_at', -1), ('title', 1), ('rating', -1), ('current_page', -1)):
+                for prefix in ([("user_id", 1)], [("user_id", 1), ("status", 1)]):
+                    keys = prefix + [(field, direction), ("_id", direction)]
+                    name = '_'.join(f'{key}_{order}' for key, order in keys)
+                    if name not in indexes:
+                        current_app.mongo.db.books.create_index(keys)
+                        logger.info(f"Created index on books.{name}")
+
+            # Library facet counts indexes
+            indexes = current_app.mongo.db.library_facets.index_information()
+            if 'user_id_1_facet_1_value_1' not in indexes:
+                try:
+                    current_app.mongo.db.library_facets.create_index([("user_id", 1), ("facet", 1), ("value", 1)], unique=True)
+                    logger.info("Created unique index on library_facets.user_id_facet_value")
+                except Exception as e:
+                    logger.error(f"Error creating unique index on library_facets: {str(e)}")
 
             # Reading sessions indexes
             indexes = current_app.mongo.db.reading_sessions.index_information()
@@ -152,6 +201,15 @@ class DatabaseManager:
             if 'user_id_1_category_1' not in indexes:
                 current_app.mongo.db.completed_tasks.create_index([("user_id", 1), ("category", 1)])
                 logger.info("Created index on completed_tasks.user_id_category")
+            if 'timer_key_1' not in indexes:
+                try:
+                    current_app.mongo.db.completed_tasks.create_index(
+                        "timer_key", unique=True,
+                        partialFilterExpression={'timer_key': {'$exists': True}}
+                    )
+                    logger.info("Created unique index on completed_tasks.timer_key")
+                except Exception as e:
+                    logger.error(f"Error creating completed_tasks.timer_key index: {str(e)}")
 
             # Rewards collection indexes
             indexes = current_app.mongo.db.rewards.index_information()
@@ -164,6 +222,15 @@ class DatabaseManager:
             if 'user_id_1_category_1' not in indexes:
                 current_app.mongo.db.rewards.create_index([("user_id", 1), ("category", 1)])
                 logger.info("Created index on rewards.user_id_category")
+            if 'idempotency_key_1' not in indexes:
+                try:
+                    current_app.mongo.db.rewards.create_index(
+                        "idempotency_key", unique=True,
+                        partialFilterExpression={'idempotency_key': {'$exists': True}}
+                    )
+                    logger.info("Created unique index on rewards.idempotency_key")
+                except Exception as e:
+                    logger.error(f"Error creating rewards.idempotency_key index: {str(e)}")
 
             # User badges indexes
             indexes = current_app.mongo.db.user_badges.index_information()
@@ -180,6 +247,77 @@ class DatabaseManager:
                 current_app.mongo.db.user_badges.create_index([("user_id", 1), ("earned_at", -1)])
                 logger.info("Created index on user_badges.user_id_earned_at")
 
+            # User purchases indexes
+            indexes = current_app.mongo.db.user_purchases.index_information()
+            if 'user_id_1_purchased_at_-1' not in indexes:
+                current_app.mongo.db.user_purchases.create_index([("user_id", 1), ("purchased_at", -1)])
+                logger.info("Created index on user_purchases.user_id_purchased_at")
+            if 'user_id_1_item_id_1' not in indexes:
+                current_app.mongo.db.user_purchases.create_index([("user_id", 1), ("item_id", 1)])
+                logger.info("Created index on user_purchases.user_id_item_id")
+
+            # User progress indexes; progress is upserted by user and module
+            indexes = current_app.mongo.db.user_progress.index_information()
+            if 'user_id_1_module_1' not in indexes:
+                try:
+                    current_app.mongo.db.user_progress.create_index([("user_id", 1), ("module", 1)], unique=True)
+                    logger.info("Created unique index on user_progress.user_id_module")
+                except Exception as e:
+                    logger.error(f"Error creating user_progress.user_id_module index: {str(e)}")
+            if 'module_1_stats.correct_-1' not in indexes:
+                current_app.mongo.db.user_progress.create_index([("module", 1), ("stats.correct", -1)])
+                logger.info("Created index on user_progress.module_stats.correct")
+
+            # Clubs and club memberships indexes
+            indexes = current_app.mongo.db.clubs.index_information()
+            if 'is_active_1_created_at_-1' not in indexes:
+                current_app.mongo.db.clubs.create_index([("is_active", 1), ("created_at", -1)])
+                logger.info("Created index on clubs.is_active_created_at")
+            if 'creator_id_1_is_active_1_created_at_-1' not in indexes:
+                current_app.mongo.db.clubs.create_index([("creator_id", 1), ("is_active", 1), ("created_at", -1)])
+                logger.info("Created index on clubs.creator_id_is_active_created_at")
+
+            indexes = current_app.mongo.db.club_memberships.index_information()
+            if 'club_id_1_user_id_1' not in indexes:
+                try:
+                    current_app.mongo.db.club_memberships.create_index([("club_id", 1), ("user_id", 1)], unique=True)
+                    logger.info("Created unique index on club_memberships.club_id_user_id")
+                except Exception as e:
+                    logger.error(f"Error creating club_memberships.club_id_user_id index: {str(e)}")
+            if 'user_id_1_joined_at_-1' not in indexes:
+                current_app.mongo.db.club_memberships.create_index([("user_id", 1), ("joined_at", -1)])
+                logger.info("Created index on club_memberships.user_id_joined_at")
+            if 'club_id_1_role_1' not in indexes:
+                current_app.mongo.db.club_memberships.create_index([("club_id", 1), ("role", 1)])
+                logger.info("Created index on club_memberships.club_id_role")
+            if 'club_id_1_joined_at_1' not in indexes:
+                current_app.mongo.db.club_memberships.create_index([("club_id", 1), ("joined_at", 1)])
+                logger.info("Created index on club_memberships.club_id_joined_at")
+
+            # Club presence snapshots expire with the worker that wrote them
+            indexes = current_app.mongo.db.club_presence.index_information()
+            if 'expires_at_1' not in indexes:
+                current_app.mongo.db.club_presence.create_index("expires_at", expireAfterSeconds=0)
+                logger.info("Created TTL index on club_presence.expires_at")
+            if 'club_id_1' not in indexes:
+                current_app.mongo.db.club_presence.create_index("club_id")
+                logger.info("Created index on club_presence.club_id")
+
+            # Flashcards indexes
+            indexes = current_app.mongo.db.flashcards.index_information()
+            if 'user_id_1_next_review_at_1' not in indexes:
+                current_app.mongo.db.flashcards.create_index([("user_id", 1), ("next_review_at", 1)])
+                logger.info("Created index on flashcards.user_id_next_review_at")
+            if 'user_id_1_created_at_-1' not in indexes:
+                current_app.mongo.db.flashcards.create_index([("user_id", 1), ("created_at", -1)])
+                logger.info("Created index on flashcards.user_id_created_at")
+
+            # Quiz answers indexes
+            indexes = current_app.mongo.db.quiz_answers.index_information()
+            if 'user_id_1_submitted_at_-1__id_-1' not in indexes:
+                current_app.mongo.db.quiz_answers.create_index([("user_id", 1), ("submitted_at", -1), ("_id", -1)])
+                logger.info("Created index on quiz_answers.user_id_submitted_at")
+
             # User goals indexes
             indexes = current_app.mongo.db.user_goals.index_information()
             if 'user_id_1_is_active_1' not in indexes:
@@ -207,6 +345,15 @@ class DatabaseManager:
                 current_app.mongo.db.activity_log.create_index("action")
                 logger.info("Created index on activity_log.action")
 
+            # Active timers collection indexes
+            indexes = current_app.mongo.db.active_timers.index_information()
+            if 'user_id_1' not in indexes:
+                try:
+                    current_app.mongo.db.active_timers.create_index("user_id", unique=True)
+                    logger.info("Created unique index on active_timers.user_id")
+                except Exception as e:
+                    logger.error(f"Error creating active_timers.user_id index: {str(e)}")
+
             # Quotes collection indexes
             indexes = current_app.mongo.db.quotes.index_information()
             if 'user_id_1_status_1' not in indexes:
@@ -267,6 +414,49 @@ class DatabaseManager:
                 current_app.mongo.db.testimonials.create_index("created_at")
                 logger.info("Created index on testimonials.created_at")
 
+            # Maintenance runs collection indexes
+            indexes = current_app.mongo.db.maintenance_runs.index_information()
+            if 'created_at_-1' not in indexes:
+                current_app.mongo.db.maintenance_runs.create_index([("created_at", -1)])
+                logger.info("Created index on maintenance_runs.created_at")
+            if 'cleanup_type_1' not in indexes:
+                try:
+                    current_app.mongo.db.maintenance_runs.create_index(
+                        "cleanup_type", unique=True,
+                        partialFilterExpression={'active': True}
+                    )
+                    logger.info("Created unique index on active maintenance_runs.cleanup_type")
+                except Exception as e:
+                    logger.error(f"Error creating maintenance_runs.cleanup_type index: {str(e)}")
+
+            # Jobs collection indexes
+            indexes = current_app.mongo.db.jobs.index_information()
+            if 'status_1_run_at_1' not in indexes:
+                current_app.mongo.db.jobs.create_index([("status", 1), ("run_at", 1)])
+                logger.info("Created index on jobs.status_run_at")
+            if 'status_1_lease_expires_at_1' not in indexes:
+                current_app.mongo.db.jobs.create_index([("status", 1), ("lease_expires_at", 1)])
+                logger.info("Created index on jobs.status_lease_expires_at")
+            if 'created_at_-1' not in indexes:
+                current_app.mongo.db.jobs.create_index([("created_at", -1)])
+                logger.info("Created index on jobs.created_at")
+
+            # Daily rollups collection indexes
+            indexes = current_app.mongo.db.daily_rollups.index_information()
+            if 'user_id_1_day_1' not in indexes:
+                current_app.mongo.db.daily_rollups.create_index([("user_id", 1), ("day", 1)], unique=True)
+                logger.info("Created unique index on daily_rollups.user_id_day")
+
+            # Book takeaways and quotes collection indexes
+            for collection in ('book_takeaways', 'book_quotes'):
+                indexes = current_app.mongo.db[collection].index_information()
+                if 'book_id_1_date_-1' not in indexes:
+                    current_app.mongo.db[collection].create_index([("book_id", 1), ("date", -1)])
+                    logger.info(f"Created index on {collection}.book_id_date")
+                if 'user_id_1' not in indexes:
+                    current_app.mongo.db[collection].create_index("user_id")
+                    logger.info(f"Created index on {collection}.user_id")
+
             logger.info("Database indexes created successfully")
 
         except Exception as e:
@@ -304,6 +494,8 @@ class DatabaseManager:
                 'updated_at': datetime.utcnow(),
                 'total_points': 0,
                 'level': 1,
+                'entitlements': [],
+                'search_keys': UserModel.build_search_keys(admin_username, admin_email, 'Administrator'),
                 'profile': {
                     'display_name': 'Administrator',
                     'bio': 'System Administrator',
@@ -397,6 +589,265 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error during avatar migration: {str(e)}")
     
+    @staticmethod
+    def _migrate_book_search_terms():
+        """Backfill prefix search terms on books created before search existed"""
+        try:
+            books = current_app.mongo.db.books.find(
+                {'search_terms': {'$exists': False}},
+                {'title': 1, 'authors': 1, 'genre': 1}
+            ).batch_size(500)
+            operations = []
+            updated_count = 0
+
+            for book in books:
+                operations.append(UpdateOne(
+                    {'_id': book['_id']},
+                    {'$set': {'search_terms': BookModel.build_search_terms(
+                        book.get('title'), book.get('authors'), book.get('genre')
+                    )}}
+                ))
+                if len(operations) >= 500:
+                    updated_count += current_app.mongo.db.books.bulk_write(operations, ordered=False).modified_count
+                    operations = []
+
+            if operations:
+                updated_count += current_app.mongo.db.books.bulk_write(operations, ordered=False).modified_count
+
+            if updated_count:
+                logger.info(f"Book search terms migration completed: Updated {updated_count} books")
+
+        except Exception as e:
+            logger.error(f"Error during book search terms migration: {str(e)}")
+    
+    @staticmethod
+    def _migrate_user_search_keys():
+        """Backfill normalized search keys used by the admin user directory"""
+        try:
+            users = current_app.mongo.db.users.find(
+                {'search_keys': {'$exists': False}},
+                {'username': 1, 'email': 1, 'profile.display_name': 1}
+            ).batch_size(500)
+            operations = []
+            updated_count = 0
+
+            for user in users:
+                operations.append(UpdateOne(
+                    {'_id': user['_id']},
+                    {'$set': {'search_keys': UserModel.build_search_keys(
+                        user.get('username'), user.get('email'), user.get('profile', {}).get('display_name')
+                    )}}
+                ))
+                if len(operations) >= 500:
+                    updated_count += current_app.mongo.db.users.bulk_write(operations, ordered=False).modified_count
+                    operations = []
+
+            if operations:
+                updated_count += current_app.mongo.db.users.bulk_write(operations, ordered=False).modified_count
+
+            if updated_count:
+                logger.info(f"User search keys migration completed: Updated {updated_count} users")
+
+        except Exception as e:
+            logger.error(f"Error during user search keys migration: {str(e)}")
+    
+    @staticmethod
+    def _migrate_book_annotations():
+        """Move takeaways and quotes embedded in book documents into their own collections"""
+        try:
+            embedded = {'$or': [
+                {'key_takeaways': {'$exists': True}},
+                {'quotes': {'$exists': True}},
+                {'reading_sessions': {'$exists': True}}
+            ]}
+            books = current_app.mongo.db.books.find(
+                embedded, {'user_id': 1, 'key_takeaways': 1, 'quotes': 1}
+            ).batch_size(100)
+            takeaway_ops, quote_ops, book_ops = [], [], []
+            moved_count = 0
+
+            def flush():
+                # Annotations are upserted by _id before the arrays are dropped,
+                # so an interrupted run can simply be repeated
+                if takeaway_ops:
+                    current_app.mongo.db.book_takeaways.bulk_write(takeaway_ops, ordered=False)
+                if quote_ops:
+                    current_app.mongo.db.book_quotes.bulk_write(quote_ops, ordered=False)
+                if book_ops:
+                    current_app.mongo.db.books.bulk_write(book_ops, ordered=False)
+                del takeaway_ops[:], quote_ops[:], book_ops[:]
+
+            for book in books:
+                for field, operations, keys in (
+                    ('key_takeaways', takeaway_ops, ('text', 'page_reference')),
+                    ('quotes', quote_ops, ('text', 'page', 'context'))
+                ):
+                    for position, entry in enumerate(book.get(field) or []):
+                        annotation_id = entry.get('id')
+                        if not ObjectId.is_valid(annotation_id):
+                            # Derived from the entry itself, so a repeated run upserts the same document
+                            source = f"{book['_id']}:{field}:{position}:{entry.get('text')}:{entry.get('date')}"
+                            annotation_id = ObjectId(hashlib.sha1(source.encode('utf-8')).digest()[:12])
+                        document = {key: entry.get(key) for key in keys}
+                        document.update({
+                            'book_id': book['_id'],
+                            'user_id': book.get('user_id'),
+                            'date': entry.get('date') or datetime.utcnow()
+                        })
+                        operations.append(UpdateOne(
+                            {'_id': ObjectId(annotation_id)},
+                            {'$setOnInsert': document},
+                            upsert=True
+                        ))
+                        moved_count += 1
+                book_ops.append(UpdateOne(
+                    {'_id': book['_id']},
+                    {'$unset': {'key_takeaways': '', 'quotes': '', 'reading_sessions': ''}}
+                ))
+                if len(book_ops) >= 100:
+                    flush()
+
+            flush()
+
+            if moved_count:
+                logger.info(f"Book annotations migration completed: Moved {moved_count} takeaways and quotes")
+
+        except Exception as e:
+            logger.error(f"Error during book annotations migration: {str(e)}")
+    
+    @staticmethod
+    def _migrate_user_entitlements():
+        """Backfill users.entitlements from the themes, avatar styles, frames and titles they purchased"""
+        from blueprints.rewards.services import RewardService
+        try:
+            updated_count = 0
+            while True:
+                user_ids = [user['_id'] for user in current_app.mongo.db.users.find(
+                    {'entitlements': {'$exists': False}}, {'_id': 1}
+                ).limit(500)]
+                if not user_ids:
+                    break
+                owned = RewardService.entitlements_from_purchases(user_ids)
+                operations = [
+                    UpdateOne({'_id': user_id}, {'$addToSet': {'entitlements': {'$each': sorted(owned[user_id])}}})
+                    for user_id in user_ids
+                ]
+                updated_count += current_app.mongo.db.users.bulk_write(operations, ordered=False).modified_count
+
+            if updated_count:
+                logger.info(f"User entitlements migration completed: Updated {updated_count} users")
+
+        except Exception as e:
+            logger.error(f"Error during user entitlements migration: {str(e)}")
+    
+    @staticmethod
+    def _migrate_quiz_stats():
+        """Build lifetime quiz stats from quiz_answers for players who answered before they were kept"""
+        try:
+            answered = set(current_app.mongo.db.quiz_answers.distinct('user_id'))
+            if not answered:
+                return
+            have_stats = {
+                progress['user_id'] for progress in current_app.mongo.db.user_progress.find(
+                    {'module': 'quiz', 'stats': {'$exists': True}}, {'user_id': 1}
+                )
+            }
+            operations = []
+            updated_count = 0
+
+            for user_id in answered - have_stats:
+                stats = {'attempts': 0, 'correct': 0, 'current_streak': 0, 'best_streak': 0}
+                answers = current_app.mongo.db.quiz_answers.find(
+                    {'user_id': user_id}, {'is_correct': 1}
+                ).sort([('submitted_at', 1), ('_id', 1)])
+                for answer in answers:
+                    stats['attempts'] += 1
+                    if answer.get('is_correct'):
+                        stats['correct'] += 1
+                        stats['current_streak'] += 1
+                        stats['best_streak'] = max(stats['best_streak'], stats['current_streak'])
+                    else:
+                        stats['current_streak'] = 0
+                operations.append(UpdateOne(
+                    {'user_id': user_id, 'module': 'quiz'},
+                    {'$set': {'stats': stats}},
+                    upsert=True
+                ))
+                if len(operations) >= 500:
+                    current_app.mongo.db.user_progress.bulk_write(operations, ordered=False)
+                    updated_count += len(operations)
+                    operations = []
+
+            if operations:
+                current_app.mongo.db.user_progress.bulk_write(operations, ordered=False)
+                updated_count += len(operations)
+
+            if updated_count:
+                logger.info(f"Quiz stats migration completed: Updated {updated_count} players")
+
+        except Exception as e:
+            logger.error(f"Error during quiz stats migration: {str(e)}")
+    
+    @staticmethod
+    def _migrate_flashcard_schedule():
+        """Give existing flashcards a spaced-repetition schedule, due from when they were created"""
+        try:
+            result = current_app.mongo.db.flashcards.update_many(
+                {'next_review_at': {'$exists': False}},
+                [{'$set': {
+                    'next_review_at': {'$ifNull': ['$created_at', '$$NOW']},
+                    'review_count': {'$ifNull': ['$review_count', 0]},
+                    'ease': 2.5,
+                    'repetitions': 0,
+                    'interval_days': 0
+                }}]
+            )
+            if result.modified_count:
+                logger.info(f"Flashcard schedule migration completed: Updated {result.modified_count} cards")
+
+        except Exception as e:
+            logger.error(f"Error during flashcard schedule migration: {str(e)}")
+    
+    @staticmethod
+    def _migrate_club_memberships():
+        """Move the members and admins arrays of club documents into club_memberships"""
+        try:
+            clubs = current_app.mongo.db.clubs.find(
+                {'$or': [{'members': {'$exists': True}}, {'admins': {'$exists': True}}]},
+                {'members': 1, 'admins': 1, 'created_at': 1}
+            ).batch_size(100)
+            migrated_count = 0
+
+            for club in clubs:
+                admins = {str(user_id) for user_id in club.get('admins') or []}
+                members = {str(user_id) for user_id in club.get('members') or []} | admins
+                joined_at = club.get('created_at') or datetime.utcnow()
+                # Upserts keep the run repeatable; roles already in the collection win
+                operations = [
+                    UpdateOne(
+                        {'club_id': club['_id'], 'user_id': user_id},
+                        {'$setOnInsert': {'role': 'admin' if user_id in admins else 'member', 'joined_at': joined_at}},
+                        upsert=True
+                    )
+                    for user_id in members
+                ]
+                if operations:
+                    current_app.mongo.db.club_memberships.bulk_write(operations, ordered=False)
+                current_app.mongo.db.clubs.update_one({'_id': club['_id']}, {
+                    '$set': {
+                        'member_count': current_app.mongo.db.club_memberships.count_documents({'club_id': club['_id']}),
+                        'admin_count': current_app.mongo.db.club_memberships.count_documents({'club_id': club['_id'], 'role': 'admin'})
+                    },
+                    '$unset': {'members': '', 'admins': ''}
+                })
+                migrated_count += 1
+
+            if migrated_count:
+                logger.info(f"Club memberships migration completed: Migrated {migrated_count} clubs")
+
+        except Exception as e:
+            logger.error(f"Error during club memberships migration: {str(e)}")
+    
     @staticmethod
     def _initialize_default_data():
         """Initialize default application data"""
@@ -452,52 +903,154 @@ class DatabaseManager:
             logger.error(f"Error initializing default data: {str(e)}")
 
 class ClubModel:
+    """Clubs and their memberships.
+
+    Members live in club_memberships, one {club_id, user_id, role, joined_at}
+    document each; the club only keeps member_count and admin_count.
+    """
+
+    # Fields returned by club listings
+    LIST_PROJECTION = {
+        'name': 1, 'description': 1, 'topic': 1, 'creator_id': 1,
+        'created_at': 1, 'member_count': 1, 'is_active': 1
+    }
+
     @staticmethod
     def create_club(name, description, topic, creator_id, **kwargs):
+        now = datetime.utcnow()
         club = {
             'name': name,
             'description': description,
             'topic': topic,
             'creator_id': creator_id,
-            'members': [creator_id],
-            'created_at': datetime.utcnow(),
-            'admins': [creator_id],
+            'member_count': 1,
+            'admin_count': 1,
+            'created_at': now,
             'goals': [],
             'shared_quotes': [],
             'is_active': True,
             **kwargs
         }
-        return current_app.mongo.db.clubs.insert_one(club)
+        result = current_app.mongo.db.clubs.insert_one(club)
+        current_app.mongo.db.club_memberships.insert_one({
+            'club_id': result.inserted_id,
+            'user_id': creator_id,
+            'role': 'admin',
+            'joined_at': now
+        })
+        return result
 
     @staticmethod
     def add_member(club_id, user_id):
-        return current_app.mongo.db.clubs.update_one({'_id': ObjectId(club_id)}, {'$addToSet': {'members': user_id}})
+        """Join a club, returns True if the user was not a member yet"""
+        club_id = ObjectId(club_id)
+        result = current_app.mongo.db.club_memberships.update_one(
+            {'club_id': club_id, 'user_id': user_id},
+            {'$setOnInsert': {'role': 'member', 'joined_at': datetime.utcnow()}},
+            upsert=True
+        )
+        if result.upserted_id:
+            current_app.mongo.db.clubs.update_one({'_id': club_id}, {'$inc': {'member_count': 1}})
+            return True
+        return False
 
     @staticmethod
     def add_admin(club_id, user_id):
-        return current_app.mongo.db.clubs.update_one({'_id': ObjectId(club_id)}, {'$addToSet': {'admins': user_id}})
+        """Make a user (joining them if needed) an admin of the club"""
+        club_id = ObjectId(club_id)
+        before = current_app.mongo.db.club_memberships.find_one_and_update(
+            {'club_id': club_id, 'user_id': user_id},
+            {'$set': {'role': 'admin'}, '$setOnInsert': {'joined_at': datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            current_app.mongo.db.clubs.update_one({'_id': club_id}, {'$inc': {'member_count': 1, 'admin_count': 1}})
+        elif before.get('role') != 'admin':
+            current_app.mongo.db.clubs.update_one({'_id': club_id}, {'$inc': {'admin_count': 1}})
+        return before
+
+    @staticmethod
+    def remove_admin(club_id, user_id):
+        """Demote an admin to member, never the last one. Returns (success, error)"""
+        club_id = ObjectId(club_id)
+        club = current_app.mongo.db.clubs.find_one_and_update(
+            {'_id': club_id, 'admin_count': {'$gt': 1}},
+            {'$inc': {'admin_count': -1}}
+        )
+        if not club:
+            return False, 'Cannot remove last admin'
+        result = current_app.mongo.db.club_memberships.update_one(
+            {'club_id': club_id, 'user_id': user_id, 'role': 'admin'},
+            {'$set': {'role': 'member'}}
+        )
+        if not result.modified_count:
+            current_app.mongo.db.clubs.update_one({'_id': club_id}, {'$inc': {'admin_count': 1}})
+            return False, 'User is not an admin of this club'
+        return True, None
+
+    @staticmethod
+    def get_role(club_id, user_id):
+        """'admin', 'member' or None"""
+        membership = current_app.mongo.db.club_memberships.find_one(
+            {'club_id': ObjectId(club_id), 'user_id': str(user_id)}, {'role': 1}
+        )
+        return membership['role'] if membership else None
+
+    @staticmethod
+    def get_roles(club_ids, user_id):
+        """{club_id: role} of one user across many clubs"""
+        memberships = current_app.mongo.db.club_memberships.find(
+            {'user_id': str(user_id), 'club_id': {'$in': list(club_ids)}}, {'club_id': 1, 'role': 1}
+        )
+        return {membership['club_id']: membership['role'] for membership in memberships}
+
+    @staticmethod
+    def get_admins(club_id):
+        """User ids of a club's admins"""
+        return [membership['user_id'] for membership in current_app.mongo.db.club_memberships.find(
+            {'club_id': ObjectId(club_id), 'role': 'admin'}, {'user_id': 1}
+        ).sort('joined_at', 1)]
+
+    @staticmethod
+    def get_members(club_id, page=1, per_page=50):
+        """One page of a club's memberships, oldest first"""
+        return list(current_app.mongo.db.club_memberships.find(
+            {'club_id': ObjectId(club_id)}, {'user_id': 1, 'role': 1, 'joined_at': 1}
+        ).sort([('joined_at', 1), ('_id', 1)]).skip((page - 1) * per_page).limit(per_page))
 
     @staticmethod
     def get_club(club_id):
         return current_app.mongo.db.clubs.find_one({'_id': ObjectId(club_id)})
 
     @staticmethod
-    def get_all_clubs():
-        return list(current_app.mongo.db.clubs.find({'is_active': True}))
+    def get_all_clubs(page=1, per_page=20):
+        """One page of active clubs, newest first. Returns (clubs, total)"""
+        query = {'is_active': True}
+        clubs = list(current_app.mongo.db.clubs.find(query, ClubModel.LIST_PROJECTION)
+                     .sort([('created_at', -1), ('_id', -1)]).skip((page - 1) * per_page).limit(per_page))
+        return clubs, current_app.mongo.db.clubs.count_documents(query)
 
     @staticmethod
-    def get_user_clubs(user_id):
-        return list(current_app.mongo.db.clubs.find({
-            'members': user_id,
-            'is_active': True
-        }))
+    def get_user_clubs(user_id, page=1, per_page=20):
+        """One page of the clubs a user joined, latest first. Returns (clubs, total)"""
+        query = {'user_id': user_id}
+        memberships = list(current_app.mongo.db.club_memberships.find(query, {'club_id': 1})
+                           .sort([('joined_at', -1), ('_id', -1)]).skip((page - 1) * per_page).limit(per_page))
+        club_ids = [membership['club_id'] for membership in memberships]
+        clubs = {club['_id']: club for club in current_app.mongo.db.clubs.find(
+            {'_id': {'$in': club_ids}, 'is_active': True}, ClubModel.LIST_PROJECTION
+        )}
+        total = current_app.mongo.db.club_memberships.count_documents(query)
+        return [clubs[club_id] for club_id in club_ids if club_id in clubs], total
 
     @staticmethod
-    def get_created_clubs(creator_id):
-        return list(current_app.mongo.db.clubs.find({
-            'creator_id': creator_id,
-            'is_active': True
-        }))
+    def get_created_clubs(creator_id, page=1, per_page=20):
+        """One page of the clubs a user created, newest first. Returns (clubs, total)"""
+        query = {'creator_id': creator_id, 'is_active': True}
+        clubs = list(current_app.mongo.db.clubs.find(query, ClubModel.LIST_PROJECTION)
+                     .sort([('created_at', -1), ('_id', -1)]).skip((page - 1) * per_page).limit(per_page))
+        return clubs, current_app.mongo.db.clubs.count_documents(query)
 
 class ClubPostModel:
     @staticmethod
@@ -534,19 +1087,25 @@ class ClubChatMessageModel:
 class FlashcardModel:
     @staticmethod
     def create_flashcard(user_id, front, back, tags=None):
+        now = datetime.utcnow()
         card = {
             'user_id': user_id,
             'front': front,
             'back': back,
             'tags': tags or [],
-            'created_at': datetime.utcnow(),
-            'review_count': 0
+            'created_at': now,
+            'review_count': 0,
+            # Spaced-repetition state, new cards are due right away
+            'ease': 2.5,
+            'repetitions': 0,
+            'interval_days': 0,
+            'next_review_at': now
         }
         return current_app.mongo.db.flashcards.insert_one(card)
 
     @staticmethod
     def get_user_flashcards(user_id):
-        return list(current_app.mongo.db.flashcards.find({'user_id': user_id}))
+        return list(current_app.mongo.db.flashcards.find({'user_id': user_id}).sort('created_at', -1))
 
 class QuizQuestionModel:
     @staticmethod
@@ -578,8 +1137,11 @@ class QuizAnswerModel:
         return current_app.mongo.db.quiz_answers.insert_one(ans)
 
     @staticmethod
-    def get_user_answers(user_id):
-        return list(current_app.mongo.db.quiz_answers.find({'user_id': user_id}))
+    def get_user_answers(user_id, page=1, per_page=20):
+        """One page of a user's answers, newest first"""
+        return list(current_app.mongo.db.quiz_answers.find({'user_id': user_id})
+                    .sort([('submitted_at', -1), ('_id', -1)])
+                    .skip((page - 1) * per_page).limit(per_page))
 
 class UserProgressModel:
     @staticmethod
@@ -590,6 +1152,49 @@ class UserProgressModel:
             upsert=True
         )
 
+    @staticmethod
+    def update_fields(user_id, module, **fields):
+        """Set some progress fields, keeping the others"""
+        update = {f'data.{key}': value for key, value in fields.items()}
+        update['updated_at'] = datetime.utcnow()
+        return current_app.mongo.db.user_progress.update_one(
+            {'user_id': user_id, 'module': module},
+            {'$set': update},
+            upsert=True
+        )
+
+    @staticmethod
+    def record_answer(user_id, module, is_correct):
+        """Count an answer in one upsert and return the progress after it.
+
+        Besides the current round's score in ``data`` this keeps lifetime
+        ``stats`` (attempts, correct, current and best streak), which
+        update_progress leaves alone when a new round starts.
+        """
+        now = datetime.utcnow()
+        correct = 1 if is_correct else 0
+
+        def counter(path, step):
+            return {'$add': [{'$ifNull': [f'${path}', 0]}, step]}
+
+        return current_app.mongo.db.user_progress.find_one_and_update(
+            {'user_id': user_id, 'module': module},
+            [
+                {'$set': {
+                    'data.score': counter('data.score', correct),
+                    'data.answered': counter('data.answered', 1),
+                    'data.last_answered': now,
+                    'stats.attempts': counter('stats.attempts', 1),
+                    'stats.correct': counter('stats.correct', correct),
+                    'stats.current_streak': counter('stats.current_streak', 1) if is_correct else 0,
+                    'updated_at': now
+                }},
+                {'$set': {'stats.best_streak': {'$max': [{'$ifNull': ['$stats.best_streak', 0]}, '$stats.current_streak']}}}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
     @staticmethod
     def get_progress(user_id, module):
         return current_app.mongo.db.user_progress.find_one({'user_id': user_id, 'module': module})
@@ -837,6 +1442,21 @@ class TestimonialModel:
             logger.error(f"Error getting testimonial statistics: {str(e)}")
             return {}
 
+def invalidate_analytics(user_id, *kinds):
+    """Drop cached per-user analytics after a write to books, sessions or tasks"""
+    from blueprints.analytics.services import AnalyticsService
+    AnalyticsService.invalidate(ObjectId(user_id), *kinds)
+
+def record_rollup(user_id, when=None, category=None, **counters):
+    """Add counters to the user's daily rollup used by the chart endpoints"""
+    from blueprints.analytics.rollups import DailyRollups
+    DailyRollups.record(user_id, when, category=category, **counters)
+
+def update_library_facets(user_id, before=None, after=None):
+    """Keep the library status, genre and author counts in step with a book write"""
+    from blueprints.nook.library import LibraryService
+    LibraryService.book_changed(user_id, before, after)
+
 class UserModel:
     """User model with CRUD operations and utilities"""
     
@@ -866,6 +1486,8 @@ class UserModel:
                 'last_login': None,
                 'total_points': 0,
                 'level': 1,
+                'entitlements': [],
+                'search_keys': UserModel.build_search_keys(username, email, kwargs.get('display_name', username)),
                 'profile': {
                     'display_name': kwargs.get('display_name', username),
                     'bio': kwargs.get('bio', ''),
@@ -965,6 +1587,29 @@ class UserModel:
             logger.error(f"Error getting username for user_id {user_id}: {str(e)}")
             return None
     
+    @staticmethod
+    def build_search_keys(username, email, display_name=None):
+        """Lowercased keys for prefix search: full names plus each word of the display name"""
+        keys = {value.strip().lower() for value in (username, email, display_name) if value and value.strip()}
+        if display_name:
+            keys.update(re.findall(r'\w+', display_name.lower()))
+        return sorted(keys)
+    
+    @staticmethod
+    def refresh_search_keys(user_id):
+        """Recompute search keys after a username, email or display name change"""
+        user = current_app.mongo.db.users.find_one(
+            {'_id': ObjectId(user_id)},
+            {'username': 1, 'email': 1, 'profile.display_name': 1}
+        )
+        if user:
+            current_app.mongo.db.users.update_one(
+                {'_id': user['_id']},
+                {'$set': {'search_keys': UserModel.build_search_keys(
+                    user.get('username'), user.get('email'), user.get('profile', {}).get('display_name')
+                )}}
+            )
+    
     @staticmethod
     def update_user(user_id, update_data):
         """Update user data"""
@@ -976,6 +1621,9 @@ class UserModel:
                 {'$set': update_data}
             )
             
+            if any(key in update_data for key in ('username', 'email', 'profile', 'profile.display_name')):
+                UserModel.refresh_search_keys(user_id)
+            
             if result.modified_count > 0:
                 ActivityLogger.log_activity(
                     user_id=ObjectId(user_id),
@@ -1020,6 +1668,13 @@ class UserModel:
 class BookModel:
     """Book model with CRUD operations"""
     
+    # Fields list views need; keeps descriptions, reviews and notes off list pages
+    SUMMARY_PROJECTION = {
+        'user_id': 1, 'title': 1, 'authors': 1, 'genre': 1, 'status': 1,
+        'cover_image': 1, 'cover_url': 1, 'page_count': 1, 'total_pages': 1,
+        'current_page': 1, 'rating': 1, 'added_at': 1, 'pdf_path': 1, 'is_encrypted': 1
+    }
+    
     @staticmethod
     def create_book(user_id, title, authors=None, **kwargs):
         """Create a new book entry"""
@@ -1037,7 +1692,6 @@ class BookModel:
                 'status': kwargs.get('status', 'to_read'),
                 'rating': kwargs.get('rating'),
                 'review': kwargs.get('review', ''),
-                'quotes': kwargs.get('quotes', []),
                 'notes': kwargs.get('notes', []),
                 'tags': kwargs.get('tags', []),
                 'added_at': datetime.utcnow(),
@@ -1045,10 +1699,13 @@ class BookModel:
                 'finished_at': kwargs.get('finished_at'),
                 'updated_at': datetime.utcnow(),
                 'pdf_path': kwargs.get('pdf_path'),
-                'is_encrypted': kwargs.get('is_encrypted', False)
+                'is_encrypted': kwargs.get('is_encrypted', False),
+                'search_terms': BookModel.build_search_terms(title, authors, kwargs.get('genre', 'General'))
             }
             
             result = current_app.mongo.db.books.insert_one(book_data)
+            invalidate_analytics(user_id, 'books')
+            update_library_facets(user_id, after=book_data)
             
             ActivityLogger.log_activity(
                 user_id=ObjectId(user_id),
@@ -1063,6 +1720,55 @@ class BookModel:
             logger.error(f"Error creating book: {str(e)}")
             return None
     
+    @staticmethod
+    def build_search_terms(title, authors=None, genre=None):
+        """Lowercased word tokens of title, authors and genre, used for prefix search"""
+        text = ' '.join([title or ''] + list(authors or []) + [genre or ''])
+        return sorted(set(re.findall(r'\w+', text.lower())))
+    
+    @staticmethod
+    def search_books(query, user_id=None, filters=None, page=1, per_page=20, sort=None):
+        """Search books by relevance, treating the last word as a prefix. Returns (books, total)"""
+        try:
+            match = dict(filters or {})
+            if user_id:
+                match['user_id'] = ObjectId(user_id)
+            
+            tokens = re.findall(r'\w+', (query or '').lower())
+            if query and query[-1].isspace():
+                words, prefix = tokens, None
+            else:
+                words, prefix = tokens[:-1], (tokens[-1] if tokens else None)
+            
+            conditions = []
+            if words:
+                match['$text'] = {'$search': ' '.join(words)}
+                conditions.append({'search_terms': {'$all': words}})
+            if prefix:
+                conditions.append({'search_terms': {'$regex': f'^{re.escape(prefix)}'}})
+            if conditions:
+                match['$and'] = conditions
+            
+            projection = dict(BookModel.SUMMARY_PROJECTION)
+            if words:
+                projection['score'] = {'$meta': 'textScore'}
+                order = [('score', {'$meta': 'textScore'}), ('added_at', -1)]
+            else:
+                order = sort or [('added_at', -1)]
+            
+            skip = (page - 1) * per_page
+            books = list(current_app.mongo.db.books.find(match, projection)
+                        .sort(order)
+                        .skip(skip)
+                        .limit(per_page))
+            total_books = current_app.mongo.db.books.count_documents(match)
+            
+            return books, total_books
+            
+        except Exception as e:
+            logger.error(f"Error searching books: {str(e)}")
+            return [], 0
+    
     @staticmethod
     def update_book_status(book_id, status, user_id):
         """Update book reading status"""
@@ -1072,7 +1778,12 @@ class BookModel:
                 'updated_at': datetime.utcnow()
             }
             
-            if status == 'reading' and not current_app.mongo.db.books.find_one({'_id': ObjectId(book_id)}).get('started_at'):
+            book = current_app.mongo.db.books.find_one(
+                {'_id': ObjectId(book_id)},
+                {'status': 1, 'genre': 1, 'authors': 1, 'started_at': 1}
+            )
+            
+            if status == 'reading' and not book.get('started_at'):
                 update_data['started_at'] = datetime.utcnow()
             elif status == 'finished':
                 update_data['finished_at'] = datetime.utcnow()
@@ -1083,6 +1794,8 @@ class BookModel:
             )
             
             if result.modified_count > 0:
+                invalidate_analytics(user_id, 'books')
+                update_library_facets(user_id, book, dict(book, status=status))
                 if status == 'finished':
                     from blueprints.rewards.services import RewardService
                     book = current_app.mongo.db.books.find_one({'_id': ObjectId(book_id)})
@@ -1110,6 +1823,57 @@ class BookModel:
             logger.error(f"Error updating book status: {str(e)}")
             return False
 
+class BookAnnotationModel:
+    """Key takeaways and quotes a user records against one of their books"""
+    
+    COLLECTIONS = {'takeaways': 'book_takeaways', 'quotes': 'book_quotes'}
+    
+    @staticmethod
+    def add(kind, book_id, user_id, **fields):
+        """Store a takeaway or quote, returns its id or None if the book is not the user's"""
+        try:
+            if not current_app.mongo.db.books.count_documents({'_id': ObjectId(book_id), 'user_id': ObjectId(user_id)}, limit=1):
+                return None
+            annotation = dict(fields, book_id=ObjectId(book_id), user_id=ObjectId(user_id), date=datetime.utcnow())
+            result = current_app.mongo.db[BookAnnotationModel.COLLECTIONS[kind]].insert_one(annotation)
+            return result.inserted_id
+        except Exception as e:
+            logger.error(f"Error adding book {kind}: {str(e)}")
+            return None
+    
+    @staticmethod
+    def get_page(kind, book_id, user_id, page=1, per_page=10):
+        """Newest first page of a book's takeaways or quotes. Returns (items, total)"""
+        try:
+            query = {'book_id': ObjectId(book_id), 'user_id': ObjectId(user_id)}
+            collection = current_app.mongo.db[BookAnnotationModel.COLLECTIONS[kind]]
+            items = list(collection.find(query, {'book_id': 0, 'user_id': 0})
+                         .sort('date', -1)
+                         .skip((page - 1) * per_page)
+                         .limit(per_page))
+            return items, collection.count_documents(query)
+        except Exception as e:
+            logger.error(f"Error getting book {kind}: {str(e)}")
+            return [], 0
+    
+    @staticmethod
+    def delete_for_book(book_id):
+        """Remove every takeaway and quote of a deleted book"""
+        for collection in BookAnnotationModel.COLLECTIONS.values():
+            current_app.mongo.db[collection].delete_many({'book_id': ObjectId(book_id)})
+    
+    @staticmethod
+    def serialize(item):
+        """JSON view of a takeaway or quote"""
+        return {
+            'id': str(item['_id']),
+            'text': item.get('text', ''),
+            'page_reference': item.get('page_reference'),
+            'page': item.get('page'),
+            'context': item.get('context'),
+            'date': item['date'].strftime('%Y-%m-%d') if item.get('date') else None
+        }
+
 class TaskModel:
     """Task model for productivity tracking"""
     
@@ -1130,6 +1894,8 @@ class TaskModel:
             }
             
             result = current_app.mongo.db.completed_tasks.insert_one(task_data)
+            invalidate_analytics(user_id, 'tasks')
+            record_rollup(user_id, task_data['completed_at'], category=task_data['category'], tasks=1, focus_minutes=duration)
             
             ActivityLogger.log_activity(
                 user_id=ObjectId(user_id),
@@ -1168,6 +1934,8 @@ class ReadingSessionModel:
                     {'_id': ObjectId(book_id)},
                     {'$inc': {'current_page': pages_read}}
                 )
+            invalidate_analytics(user_id, 'books', 'sessions')
+            record_rollup(user_id, session_data['date'], pages=pages_read, reading_minutes=session_data['duration'], reading_sessions=1)
             
             ActivityLogger.log_activity(
                 user_id=ObjectId(user_id),
@@ -1211,15 +1979,7 @@ class AdminUtils:
     def get_all_users(page=1, per_page=50, search=None):
         """Get paginated list of all users"""
         try:
-            query = {}
-            if search:
-                query = {
-                    '$or': [
-                        {'username': {'$regex': search, '$options': 'i'}},
-                        {'email': {'$regex': search, '$options': 'i'}},
-                        {'profile.display_name': {'$regex': search, '$options': 'i'}}
-                    ]
-                }
+            query = AdminUtils.user_search_query(search) if search else {}
             
             skip = (page - 1) * per_page
             users = list(current_app.mongo.db.users.find(query)
@@ -1235,6 +1995,24 @@ class AdminUtils:
             logger.error(f"Error getting users: {str(e)}")
             return [], 0
     
+    @staticmethod
+    def user_search_query(search):
+        """Anchored prefix match on the lowercased search keys, served by the search_keys index"""
+        prefix = search.strip().lower()
+        return {'search_keys': {'$regex': f'^{re.escape(prefix)}'}}
+    
+    @staticmethod
+    def search_users(search, limit=10):
+        """Top matching users for autocomplete"""
+        try:
+            return list(current_app.mongo.db.users.find(
+                AdminUtils.user_search_query(search),
+                {'username': 1, 'email': 1, 'profile.display_name': 1, 'is_admin': 1, 'is_active': 1}
+            ).sort('created_at', -1).limit(limit))
+        except Exception as e:
+            logger.error(f"Error searching users: {str(e)}")
+            return []
+    
     @staticmethod
     def update_user_points(user_id, points, description="Admin adjustment"):
         """Admin function to update user points"""
@@ -1263,8 +2041,10 @@ class AdminUtils:
             return False
     
     @staticmethod
-    def reset_user_progress(user_id, reset_type='all'):
-        """Admin function to reset user progress"""
+    def reset_user_progress(user_id, reset_type='all', on_step=None):
+        """Admin function to reset user progress, calling on_step(name) after each step"""
+        from utils.jobs import JobLeaseLost
+        on_step = on_step or (lambda step: None)
         try:
             user_id = ObjectId(user_id)
             
@@ -1275,16 +2055,31 @@ class AdminUtils:
                     {'_id': user_id},
                     {'$set': {'total_points': 0, 'level': 1}}
                 )
+                on_step('rewards')
             
             if reset_type in ['all', 'books']:
                 current_app.mongo.db.books.delete_many({'user_id': user_id})
+                current_app.mongo.db.library_facets.delete_many({'user_id': user_id})
+                current_app.mongo.db.book_takeaways.delete_many({'user_id': user_id})
+                current_app.mongo.db.book_quotes.delete_many({'user_id': user_id})
                 current_app.mongo.db.reading_sessions.delete_many({'user_id': user_id})
+                on_step('books')
             
             if reset_type in ['all', 'tasks']:
                 current_app.mongo.db.completed_tasks.delete_many({'user_id': user_id})
+                on_step('tasks')
             
             if reset_type in ['all', 'goals']:
                 current_app.mongo.db.user_goals.delete_many({'user_id': user_id})
+                on_step('goals')
+            
+            invalidate_analytics(user_id)
+            
+            # Rebuild the user's chart rollups from whatever data remains
+            from blueprints.analytics.rollups import DailyRollups
+            current_app.mongo.db.daily_rollups.delete_many({'user_id': user_id})
+            DailyRollups.rebuild(user_id)
+            on_step('rollups')
             
             current_app.mongo.db.users.update_one(
                 {'_id': user_id},
@@ -1312,6 +2107,8 @@ class AdminUtils:
             
             return True
             
+        except JobLeaseLost:
+            raise
         except Exception as e:
             logger.error(f"Error resetting user progress: {str(e)}")
             return False
@@ -1535,6 +2332,7 @@ class QuoteModel:
             }
             
             result = current_app.mongo.db.quotes.insert_one(quote_data)
+            bump_data_version(user_id)
             
             ActivityLogger.log_activity(
                 user_id=ObjectId(user_id),
@@ -1664,6 +2462,7 @@ class QuoteModel:
                 {'_id': ObjectId(quote_id)},
                 {'$set': update_data}
             )
+            bump_data_version(quote['user_id'])
             
             return result.modified_count > 0, None
             
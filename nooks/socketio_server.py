@@ -2,17 +2,40 @@ from flask import Flask, session, request
 from flask_socketio import SocketIO, join_room, leave_room, emit
 from flask_login import current_user
 from models import ClubChatMessageModel
+from blueprints.hook.timers import user_room
+from blueprints.nooks_club.presence import ClubPresence
 import os
 
 from app import app  # Use the main app instance
 
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Set SOCKETIO_MESSAGE_QUEUE (e.g. redis://) when running several Socket.IO
+# workers so room broadcasts reach clients connected to the others
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
+socketio.start_background_task(ClubPresence.run_snapshots, app, socketio.sleep)
+
+def broadcast_presence(club_id):
+    online_count, _ = ClubPresence.online(club_id)
+    emit('presence', {'club_id': club_id, 'online_count': online_count}, room=club_id)
+
+@socketio.on('connect')
+def handle_connect():
+    # Private room for pushes such as timer state changes
+    if current_user.is_authenticated:
+        join_room(user_room(current_user.id))
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    for club_id in ClubPresence.disconnect(request.sid):
+        broadcast_presence(club_id)
 
 @socketio.on('join_club')
 def handle_join_club(data):
     club_id = data.get('club_id')
     user_id = str(current_user.id) if hasattr(current_user, 'id') else None
     join_room(club_id)
+    if user_id and club_id:
+        ClubPresence.join(club_id, request.sid, user_id, current_user.username)
+        broadcast_presence(club_id)
     emit('status', {'msg': f'User {user_id} has joined the club.'}, room=club_id)
 
 @socketio.on('leave_club')
@@ -20,8 +43,15 @@ def handle_leave_club(data):
     club_id = data.get('club_id')
     user_id = str(current_user.id) if hasattr(current_user, 'id') else None
     leave_room(club_id)
+    if club_id:
+        ClubPresence.leave(club_id, request.sid)
+        broadcast_presence(club_id)
     emit('status', {'msg': f'User {user_id} has left the club.'}, room=club_id)
 
+@socketio.on('presence_heartbeat')
+def handle_presence_heartbeat(data=None):
+    ClubPresence.heartbeat(request.sid)
+
 @socketio.on('send_message')
 def handle_send_message(data):
     club_id = data.get('club_id')
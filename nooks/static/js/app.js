@@ -3,7 +3,7 @@
 // Service Worker Registration
 if ('serviceWorker' in navigator) {
     window.addEventListener('load', () => {
-        navigator.serviceWorker.register('/static/sw.js')
+        navigator.serviceWorker.register('/sw.js')
             .then((registration) => {
                 console.log('SW registered: ', registration);
             })
@@ -200,4 +200,4 @@ function selectBook(googleBooksId, title, authors, description, coverImage, page
 document.addEventListener('DOMContentLoaded', () => {
     autoSave('add-book-form', 'add-book-draft');
     autoSave('timer-form', 'timer-draft');
-});
\ No newline at end of file
+});
\ No newline at end of file
@@ -1,5 +1,7 @@
 // Club Chat Frontend Integration (Socket.IO)
 const socket = io();
+// Keeps this tab counted as online, see HEARTBEAT_SECONDS in nooks_club/presence.py
+const PRESENCE_HEARTBEAT_MS = 25000;
 const clubId = document.getElementById('club-chat-box')?.dataset.clubId;
 const chatBox = document.getElementById('chat-box');
 const chatInput = document.getElementById('chat-input');
@@ -7,6 +9,7 @@ const chatForm = document.getElementById('chat-form');
 
 if (clubId) {
   socket.emit('join_club', { club_id: clubId });
+  setInterval(() => socket.emit('presence_heartbeat'), PRESENCE_HEARTBEAT_MS);
 
   socket.on('receive_message', function(data) {
     const msgDiv = document.createElement('div');
@@ -1,21 +1,34 @@
 // Quiz Question Review Frontend
-function loadQuizReview() {
-  fetch('/nooks_club/api/quiz/review')
+let quizReviewPage = 0;
+let quizReviewCount = 0;
+
+function loadQuizReview(more) {
+  if (!more) {
+    quizReviewPage = 0;
+    quizReviewCount = 0;
+    document.getElementById('quiz-review').innerHTML = '';
+  }
+  fetch(`/nooks_club/api/quiz/review?page=${quizReviewPage + 1}`)
     .then(res => res.json())
     .then(data => {
       const review = data.review;
       const reviewDiv = document.getElementById('quiz-review');
-      reviewDiv.innerHTML = '';
-      review.forEach((item, i) => {
+      quizReviewPage = data.page;
+      review.forEach((item) => {
+        quizReviewCount += 1;
         const card = document.createElement('div');
         card.className = 'card mb-2';
         card.innerHTML = `<div class='card-body'>
-          <strong>Q${i+1}:</strong> ${item.question}<br>
+          <strong>Q${quizReviewCount}:</strong> ${item.question}<br>
           <span>Your answer: <b>${item.your_answer}</b> ${item.is_correct ? '✅' : '❌'}</span><br>
           <span>Correct answer: <b>${item.correct_answer}</b></span><br>
           <small class='text-muted'>Answered at: ${new Date(item.answered_at).toLocaleString()}</small>
         </div>`;
         reviewDiv.appendChild(card);
       });
+      const moreButton = document.getElementById('quiz-review-more');
+      if (moreButton) {
+        moreButton.classList.toggle('d-none', !data.has_more);
+      }
     });
 }
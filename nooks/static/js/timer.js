@@ -1,5 +1,8 @@
 // Timer functionality for Hook
 
+// Status polling while no Socket.IO connection delivers timer_state pushes
+const TIMER_POLL_MS = 15000;
+
 class Timer {
     constructor() {
         this.duration = 25 * 60; // 25 minutes in seconds
@@ -10,10 +13,13 @@ class Timer {
         this.taskName = '';
         this.timerType = 'work';
         this.category = 'general';
+        this.pollTimer = null;
+        this.lastLocalChange = 0;
         
         this.initializeElements();
         this.bindEvents();
         this.checkActiveTimer();
+        this.subscribe();
     }
     
     initializeElements() {
@@ -84,6 +90,7 @@ class Timer {
             return;
         }
         
+        this.lastLocalChange = Date.now();
         if (!this.isRunning) {
             this.taskName = this.taskNameInput.value.trim();
             this.duration = parseInt(this.durationInput.value) * 60;
@@ -114,6 +121,7 @@ class Timer {
     }
     
     pause() {
+        this.lastLocalChange = Date.now();
         this.isPaused = !this.isPaused;
         
         if (this.isPaused) {
@@ -351,33 +359,101 @@ class Timer {
     }
     
     checkActiveTimer() {
+        // Sync on load; later changes arrive over Socket.IO, or by polling without it
         fetch('/hook/get_timer_status')
         .then(response => response.json())
         .then(data => {
             if (data.active) {
-                this.taskName = data.task_name;
-                this.timerType = data.timer_type;
-                this.timeLeft = Math.floor(data.remaining);
-                this.duration = this.timeLeft; // Approximate
-                
-                this.taskNameInput.value = this.taskName;
-                this.updateDisplay();
-                this.updateTimerInfo();
-                
-                if (!data.is_paused) {
-                    this.start();
-                } else {
-                    this.isRunning = true;
-                    this.isPaused = true;
-                    this.updateButtons();
-                    this.hideSetup();
-                }
+                this.applyState(data);
             }
         })
         .catch(error => {
             console.error('Error checking timer status:', error);
         });
     }
+    
+    subscribe() {
+        // Poll until a socket is connected, and again whenever it drops
+        this.startPolling();
+        if (typeof io === 'undefined') {
+            return;
+        }
+        this.socket = io();
+        this.socket.on('connect', () => this.stopPolling());
+        this.socket.on('disconnect', () => this.startPolling());
+        this.socket.on('connect_error', () => this.startPolling());
+        this.socket.on('timer_state', data => this.applyState(data));
+    }
+    
+    startPolling() {
+        if (!this.pollTimer) {
+            this.pollTimer = setInterval(() => this.poll(), TIMER_POLL_MS);
+        }
+    }
+    
+    stopPolling() {
+        clearInterval(this.pollTimer);
+        this.pollTimer = null;
+    }
+    
+    poll() {
+        // A local change may not have reached the server yet, and a finished
+        // timer stays active on the server until the completion form is sent
+        const completing = document.getElementById('completionModal').classList.contains('show');
+        if (completing || Date.now() - this.lastLocalChange < TIMER_POLL_MS) {
+            return;
+        }
+        fetch('/hook/get_timer_status')
+        .then(response => response.json())
+        .then(data => this.applyState(data))
+        .catch(error => {
+            console.error('Error polling timer status:', error);
+        });
+    }
+    
+    applyState(data) {
+        clearInterval(this.interval);
+        
+        if (!data.active) {
+            // Completed or cancelled elsewhere; clear locally without calling the server again
+            if (this.isRunning) {
+                this.isRunning = false;
+                this.isPaused = false;
+                this.timeLeft = this.duration;
+                this.updateDisplay();
+                this.updateButtons();
+                this.showSetup();
+                document.querySelector('.card').classList.remove('timer-active');
+            }
+            return;
+        }
+        
+        if (!this.isRunning) {
+            this.duration = Math.floor(data.remaining); // Approximate
+        }
+        this.taskName = data.task_name;
+        this.timerType = data.timer_type;
+        this.category = data.category;
+        this.timeLeft = Math.floor(data.remaining);
+        this.isRunning = true;
+        this.isPaused = data.is_paused;
+        
+        this.taskNameInput.value = this.taskName;
+        this.updateDisplay();
+        this.updateTimerInfo();
+        this.updateButtons();
+        this.hideSetup();
+        
+        if (this.isPaused) {
+            this.pauseBtn.innerHTML = '<i class="bi bi-play-fill"></i> Resume';
+        } else {
+            this.pauseBtn.innerHTML = '<i class="bi bi-pause-fill"></i> Pause';
+            this.interval = setInterval(() => {
+                this.tick();
+            }, 1000);
+            document.querySelector('.card').classList.add('timer-active');
+        }
+    }
 }
 
 // Initialize timer when page loads
@@ -389,4 +465,4 @@ document.addEventListener('DOMContentLoaded', () => {
     
     // Initialize timer
     new Timer();
-});
\ No newline at end of file
+});
\ No newline at end of file
@@ -1,77 +1,143 @@
 // Service Worker for Nook & Hook PWA
+//
+// Served from /sw.js by utils/assets.py, which prepends ASSET_VERSION and
+// PRECACHE_URLS (the fingerprinted static/dist files) from the asset manifest. Any asset change yields a
+// new script, a new cache name and a fresh precache.
 
-const CACHE_NAME = 'nook-hook-v1';
-const urlsToCache = [
-    '/',
-    '/static/css/style.css',
-    '/static/js/app.js',
-    '/static/manifest.json',
-    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
-    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
-    'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/bootstrap-icons.css'
+const STATIC_CACHE = `nook-hook-static-${ASSET_VERSION}`;
+const API_CACHE = 'nook-hook-api';
+
+// Never cached: sign-in state, PDFs and uploads, admin and exports
+const NETWORK_ONLY = [
+    /^\/auth\//,
+    /^\/nook\/serve_pdf\//,
+    /^\/static\/uploads\//,
+    /^\/admin\//,
+    /^\/api\/export/,
+    /\.pdf$/i
+];
+
+// Per-user JSON APIs: always fetched (the ETag makes an unchanged answer a
+// bodyless 304), the cached copy is only served while offline
+const NETWORK_FIRST = [
+    /^\/api\/user\/stats$/,
+    /^\/api\/dashboard\/summary$/,
+    /^\/api\/achievements\/progress$/,
+    /^\/api\/reading\/progress$/,
+    /^\/api\/tasks\/analytics$/,
+    /^\/dashboard\/api\//,
+    /^\/rewards\/api\//
 ];
 
-// Install event
+const matches = (patterns, path) => patterns.some((pattern) => pattern.test(path));
+
+// Install event: precache every fingerprinted static asset
 self.addEventListener('install', (event) => {
     event.waitUntil(
-        caches.open(CACHE_NAME)
-            .then((cache) => {
-                return cache.addAll(urlsToCache);
-            })
-    );
-});
-
-// Fetch event
-self.addEventListener('fetch', (event) => {
-    event.respondWith(
-        caches.match(event.request)
-            .then((response) => {
-                // Return cached version or fetch from network
-                if (response) {
-                    return response;
-                }
-                
-                return fetch(event.request).then((response) => {
-                    // Don't cache non-successful responses
-                    if (!response || response.status !== 200 || response.type !== 'basic') {
-                        return response;
-                    }
-                    
-                    // Clone the response
-                    const responseToCache = response.clone();
-                    
-                    caches.open(CACHE_NAME)
-                        .then((cache) => {
-                            cache.put(event.request, responseToCache);
-                        });
-                    
-                    return response;
-                });
-            })
-            .catch(() => {
-                // Return offline page for navigation requests
-                if (event.request.destination === 'document') {
-                    return caches.match('/offline.html');
-                }
-            })
+        caches.open(STATIC_CACHE)
+            .then((cache) => cache.addAll(PRECACHE_URLS))
+            .then(() => self.skipWaiting())
     );
 });
 
-// Activate event
+// Activate event: drop caches of older asset versions
 self.addEventListener('activate', (event) => {
     event.waitUntil(
         caches.keys().then((cacheNames) => {
             return Promise.all(
                 cacheNames.map((cacheName) => {
-                    if (cacheName !== CACHE_NAME) {
+                    if (cacheName !== STATIC_CACHE && cacheName !== API_CACHE) {
                         return caches.delete(cacheName);
                     }
                 })
             );
-        })
+        }).then(() => self.clients.claim())
     );
 });
 
+// Fetch event: pick a strategy by route class
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    const url = new URL(request.url);
+
+    if (request.method !== 'GET' || url.origin !== self.location.origin) {
+        return;
+    }
+
+    if (matches(NETWORK_ONLY, url.pathname)) {
+        if (url.pathname.startsWith('/auth/')) {
+            // Signing in or out must never leave another user's data behind
+            event.waitUntil(caches.delete(API_CACHE));
+        }
+        return;
+    }
+
+    if (url.pathname.startsWith('/static/')) {
+        const fingerprinted = url.pathname.startsWith('/static/dist/') || url.searchParams.has('v');
+        event.respondWith(fingerprinted ? cacheFirst(request) : staleWhileRevalidate(request, STATIC_CACHE));
+        return;
+    }
+
+    if (matches(NETWORK_FIRST, url.pathname)) {
+        event.respondWith(networkFirst(request, API_CACHE));
+    }
+
+    // Pages carry user data and CSRF tokens, they always go to the network
+});
+
+// Only complete answers are stored; a redirect is usually the sign-in page
+const cacheable = (response) => response.ok && !response.redirected;
+
+// Fingerprinted URLs (static/dist or ?v=) never change content, the cache is always right
+function cacheFirst(request) {
+    return caches.match(request).then((cached) => {
+        return cached || fetch(request).then((response) => {
+            if (cacheable(response)) {
+                const copy = response.clone();
+                caches.open(STATIC_CACHE).then((cache) => cache.put(request, copy));
+            }
+            return response;
+        });
+    });
+}
+
+function staleWhileRevalidate(request, cacheName) {
+    return caches.open(cacheName).then((cache) => {
+        return cache.match(request).then((cached) => {
+            const network = fetch(request).then((response) => {
+                if (cacheable(response)) {
+                    cache.put(request, response.clone());
+                }
+                return response;
+            });
+            if (cached) {
+                // The refresh is best effort, offline the cached copy stands
+                network.catch(() => {});
+                return cached;
+            }
+            return network;
+        });
+    });
+}
+
+function networkFirst(request, cacheName) {
+    return caches.open(cacheName).then((cache) => {
+        return fetch(request).then((response) => {
+            if (cacheable(response)) {
+                cache.put(request, response.clone());
+            }
+            return response;
+        }).catch((error) => {
+            return cache.match(request).then((cached) => {
+                if (cached) {
+                    return cached;
+                }
+                throw error;
+            });
+        });
+    });
+}
+
 // Background sync for offline actions
 self.addEventListener('sync', (event) => {
     if (event.tag === 'background-sync') {
@@ -85,4 +151,4 @@ function doBackgroundSync() {
         // Implement sync logic here
         resolve();
     });
-}
\ No newline at end of file
+}
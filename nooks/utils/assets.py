@@ -0,0 +1,190 @@
+from flask import Response, current_app, request, send_from_directory, url_for
+import mimetypes
+import hashlib
+import gzip
+import json
+import os
+import logging
+
+try:
+    import brotli
+except ImportError:  # gzip variants only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Static folders whose files are fingerprinted and precached by the service worker;
+# uploads are per-user encrypted PDFs and must never be listed
+ASSET_DIRS = ('css', 'js', 'icons', 'images')
+
+# Fingerprinted copies and their compressed variants, under static/
+DIST_DIR = 'dist'
+
+# Text formats worth precompressing; images are already compressed
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.ico', '.webmanifest')
+
+# Preferred first when the client accepts both
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def build_asset_manifest(static_folder):
+    """{path relative to static/: short content hash} for every static asset"""
+    manifest = {}
+    for directory in ASSET_DIRS:
+        for root, _, files in os.walk(os.path.join(static_folder, directory)):
+            for name in files:
+                path = os.path.join(root, name)
+                manifest[os.path.relpath(path, static_folder).replace(os.sep, '/')] = _file_hash(path)
+    manifest['manifest.json'] = _file_hash(os.path.join(static_folder, 'manifest.json'))
+    return dict(sorted(manifest.items()))
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def _write(static_folder, relative, data, overwrite=False):
+    """Atomically write a file under static/, skipping content-addressed files that exist"""
+    path = os.path.join(static_folder, relative)
+    if not overwrite and os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def build_assets(static_folder, manifest=None, prune=False):
+    """Write fingerprinted copies and .br/.gz variants of every asset to static/dist.
+
+    Returns and saves as dist/manifest.json a mapping of each original path
+    to {'path': fingerprinted path, 'encodings': precompressed encodings}.
+    """
+    manifest = manifest or build_asset_manifest(static_folder)
+    built = {}
+    for filename, digest in manifest.items():
+        stem, ext = os.path.splitext(filename)
+        target = f'{DIST_DIR}/{stem}.{digest}{ext}'
+        with open(os.path.join(static_folder, filename), 'rb') as f:
+            data = f.read()
+        _write(static_folder, target, data)
+
+        encodings = []
+        if ext.lower() in COMPRESSIBLE:
+            for encoding, suffix in ENCODINGS:
+                if encoding == 'br' and not brotli:
+                    continue
+                compressed = brotli.compress(data) if encoding == 'br' else gzip.compress(data, compresslevel=9, mtime=0)
+                if len(compressed) < len(data):
+                    _write(static_folder, target + suffix, compressed)
+                    encodings.append(encoding)
+        built[filename] = {'path': target, 'encodings': encodings}
+
+    _write(static_folder, f'{DIST_DIR}/manifest.json',
+           json.dumps(built, indent=2, sort_keys=True).encode(), overwrite=True)
+
+    if prune:
+        keep = {f'{DIST_DIR}/manifest.json'}
+        for entry in built.values():
+            keep.add(entry['path'])
+            keep.update(entry['path'] + suffix for encoding, suffix in ENCODINGS if encoding in entry['encodings'])
+        for root, _, files in os.walk(os.path.join(static_folder, DIST_DIR)):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.relpath(path, static_folder).replace(os.sep, '/') not in keep:
+                    os.remove(path)
+    return built
+
+
+def load_built_assets(static_folder, manifest):
+    """The dist manifest if it matches the current sources, building it if not"""
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, 'manifest.json')) as f:
+            built = json.load(f)
+        if set(built) == set(manifest) and all(
+            f'.{digest}' in built[filename]['path'] and os.path.exists(os.path.join(static_folder, built[filename]['path']))
+            for filename, digest in manifest.items()
+        ):
+            return built
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        return build_assets(static_folder, manifest)
+    except OSError as e:
+        # Read-only deploys without a prebuilt dist fall back to ?v= URLs
+        logger.error(f"Error building static assets: {str(e)}")
+        return {}
+
+
+def asset_version(manifest):
+    """Single hash of the whole manifest, changes whenever any asset does"""
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def service_worker():
+    """The service worker script with the current manifest baked in"""
+    manifest = current_app.extensions['asset_manifest']
+    precache = [url_for('static', filename=filename) for filename in manifest]
+    with open(os.path.join(current_app.static_folder, 'sw.js')) as f:
+        script = f.read()
+    header = (
+        f"const ASSET_VERSION = {json.dumps(current_app.config['ASSET_VERSION'])};\n"
+        f"const PRECACHE_URLS = {json.dumps(precache)};\n\n"
+    )
+    response = Response(header + script, mimetype='application/javascript')
+    # Browsers must always revalidate the worker itself to pick up new versions
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def serve_static(filename):
+    """Static files, with precompressed variants and immutable caching for fingerprinted ones"""
+    variants = current_app.extensions['asset_variants']
+    if filename not in variants:
+        response = current_app.send_static_file(filename)
+        if request.args.get('v'):
+            response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in ENCODINGS:
+        if encoding in variants[filename] and encoding in request.accept_encodings:
+            response = send_from_directory(current_app.static_folder, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Disposition', None)
+            break
+    else:
+        response = send_from_directory(current_app.static_folder, filename, mimetype=mimetype)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def register_assets(app):
+    """
+    Hash static assets once at startup, make sure their fingerprinted and
+    precompressed copies exist, point url_for('static') at them and serve
+    the service worker from /sw.js so it controls the whole site.
+    """
+    manifest = build_asset_manifest(app.static_folder)
+    built = load_built_assets(app.static_folder, manifest)
+    app.extensions['asset_manifest'] = manifest
+    app.extensions['asset_variants'] = {entry['path']: entry['encodings'] for entry in built.values()}
+    app.config['ASSET_VERSION'] = asset_version(manifest)
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint != 'static':
+            return
+        filename = values.get('filename')
+        if filename in built:
+            values['filename'] = built[filename]['path']
+        elif filename in manifest and 'v' not in values:
+            values['v'] = manifest[filename]
+
+    app.view_functions['static'] = serve_static
+    app.add_url_rule('/sw.js', 'service_worker', service_worker)
@@ -0,0 +1,146 @@
+"""Check that the data-version ETag endpoints answer a revalidation without querying Mongo.
+
+    MONGO_URI=mongodb://localhost:27017/nooks_dev python -m utils.etag_query_check
+
+signs in a throwaway user with the test client, fetches every endpoint
+decorated with etag_by_data_version, then repeats the request with the
+ETag it got. current_app.mongo.db is wrapped with a counter while the
+repeat runs; the 304 must come back with no query besides the Flask-Login
+user load. A data version bump must then turn the tag over. The user is
+removed afterwards.
+"""
+from datetime import datetime
+from bson import ObjectId
+from pymongo.collection import Collection
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+ETAG_ENDPOINTS = [
+    '/api/user/stats',
+    '/api/dashboard/summary',
+    '/api/achievements/progress',
+    '/dashboard/api/stats',
+    '/rewards/api/user_points'
+]
+
+# The user loader reads the signed-in user on every request, 304 or not
+ALLOWED_QUERIES = [('users', 'find_one')]
+
+
+class QueryCounter:
+    """Records (collection, method) for every collection call while enabled"""
+
+    def __init__(self):
+        self.enabled = False
+        self.calls = []
+
+
+class CountingCollection:
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if self._counter.enabled:
+                self._counter.calls.append((self._collection.name, name))
+            return attr(*args, **kwargs)
+        return call
+
+
+class CountingDatabase:
+    """Stands in for app.mongo.db, handing out counting collections"""
+
+    def __init__(self, db, counter):
+        self._db = db
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return CountingCollection(self._db[name], self._counter)
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        if isinstance(attr, Collection):
+            return CountingCollection(attr, self._counter)
+        return attr
+
+
+def check(app, endpoints=ETAG_ENDPOINTS):
+    """Run the check against every endpoint, returns a list of failure messages"""
+    db = app.mongo.db
+    counter = QueryCounter()
+    username = f'etag_{ObjectId()}'
+    # users.email is uniquely indexed, so every run needs its own address
+    user_id = db.users.insert_one({
+        'username': username,
+        'email': f'{username}@etag.invalid',
+        'is_active': True,
+        'created_at': datetime.utcnow(),
+        'total_points': 0,
+        'level': 1,
+        'entitlements': [],
+        'data_version': 0
+    }).inserted_id
+
+    failures = []
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+        session['user_id'] = str(user_id)
+
+    app.mongo.db = CountingDatabase(db, counter)
+    try:
+        for path in endpoints:
+            first = client.get(path)
+            etag = first.headers.get('ETag')
+            if first.status_code != 200 or not etag:
+                failures.append(f'{path}: expected 200 with an ETag, got {first.status_code}')
+                continue
+
+            counter.calls, counter.enabled = [], True
+            repeat = client.get(path, headers={'If-None-Match': etag})
+            counter.enabled = False
+            extra = list(counter.calls)
+            for allowed in ALLOWED_QUERIES:
+                if allowed in extra:
+                    extra.remove(allowed)
+            if repeat.status_code != 304:
+                failures.append(f'{path}: expected 304, got {repeat.status_code}')
+            elif extra:
+                failures.append(f'{path}: 304 issued {len(extra)} queries: {extra}')
+            else:
+                logger.info(f'{path}: 304 with no queries')
+
+            db.users.update_one({'_id': user_id}, {'$inc': {'data_version': 1}})
+            changed = client.get(path, headers={'If-None-Match': etag})
+            if changed.status_code != 200:
+                failures.append(f'{path}: expected 200 after a data version bump, got {changed.status_code}')
+    finally:
+        app.mongo.db = db
+        db.users.delete_one({'_id': user_id})
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', help='endpoints to check, default all ETag endpoints')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app import app
+    app.config['TESTING'] = True
+    failures = check(app, args.paths or ETAG_ENDPOINTS)
+    for failure in failures:
+        logger.error(failure)
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+from flask import current_app
+from bson import ObjectId
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ReturnDocument
+import threading
+import socket
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Registered job handlers, keyed by job type
+JOB_HANDLERS = {}
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 30
+LEASE_SECONDS = 300
+POLL_INTERVAL_SECONDS = 2
+
+
+def register_job(job_type):
+    """Register a function as the handler for a job type.
+
+    The handler is called as handler(job, **payload) inside an application
+    context; ``job`` is a JobContext used to report progress.
+    """
+    def decorator(f):
+        JOB_HANDLERS[job_type] = f
+        return f
+    return decorator
+
+
+class JobLeaseLost(Exception):
+    """The job's lease expired and another worker claimed it"""
+
+
+def lease_filter(job):
+    """Matches a job only while the claim that returned this document still owns it.
+
+    Every claim increments attempts, so worker plus attempts identifies one
+    claim even when the same worker picks the job up again.
+    """
+    return {'_id': job['_id'], 'worker': job.get('worker'), 'attempts': job.get('attempts', 0)}
+
+
+class JobContext:
+    """Handle passed to job handlers for progress reporting"""
+
+    def __init__(self, job):
+        self.id = job['_id']
+        self.job_type = job['job_type']
+        self.attempts = job.get('attempts', 0)
+        self.created_by = job.get('created_by')
+        self.lease = lease_filter(job)
+
+    def update_progress(self, current=None, total=None, message=None):
+        """Record progress and extend the lease held on the job.
+
+        Long-running handlers must call this more often than LEASE_SECONDS;
+        raises JobLeaseLost if the job was reclaimed in the meantime.
+        """
+        update = {
+            'updated_at': datetime.utcnow(),
+            'lease_expires_at': datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)
+        }
+        if current is not None:
+            update['progress.current'] = current
+        if total is not None:
+            update['progress.total'] = total
+        if message is not None:
+            update['progress.message'] = message
+        result = current_app.mongo.db.jobs.update_one(self.lease, {'$set': update})
+        if not result.matched_count:
+            raise JobLeaseLost(f'Job {self.id} was reclaimed by another worker')
+
+    def set_result(self, result):
+        """Store a small result document on the job"""
+        update = current_app.mongo.db.jobs.update_one(self.lease, {'$set': {'result': result}})
+        if not update.matched_count:
+            raise JobLeaseLost(f'Job {self.id} was reclaimed by another worker')
+
+
+class JobQueue:
+    """Mongo-backed persistent queue for background jobs"""
+
+    @staticmethod
+    def enqueue(job_type, payload=None, created_by=None, max_attempts=DEFAULT_MAX_ATTEMPTS, run_at=None):
+        """Add a job to the queue, returns (job_id, error)"""
+        try:
+            if job_type not in JOB_HANDLERS:
+                return None, f'Unknown job type: {job_type}'
+
+            now = datetime.utcnow()
+            job_data = {
+                'job_type': job_type,
+                'payload': payload or {},
+                'status': 'pending',
+                'attempts': 0,
+                'max_attempts': max_attempts,
+                'run_at': run_at or now,
+                'progress': {'current': 0, 'total': None, 'message': None},
+                'result': None,
+                'error': None,
+                'created_by': ObjectId(created_by) if created_by else None,
+                'worker': None,
+                'lease_expires_at': None,
+                'created_at': now,
+                'updated_at': now,
+                'started_at': None,
+                'finished_at': None
+            }
+            result = current_app.mongo.db.jobs.insert_one(job_data)
+            return result.inserted_id, None
+
+        except Exception as e:
+            logger.error(f"Error enqueueing {job_type} job: {str(e)}")
+            return None, str(e)
+
+    @staticmethod
+    def claim_next(worker_name):
+        """Atomically claim the next due job, or a running job whose lease expired"""
+        now = datetime.utcnow()
+        return current_app.mongo.db.jobs.find_one_and_update(
+            {
+                '$or': [
+                    {'status': 'pending', 'run_at': {'$lte': now}},
+                    {'status': 'running', 'lease_expires_at': {'$lt': now}}
+                ]
+            },
+            {
+                '$set': {
+                    'status': 'running',
+                    'worker': worker_name,
+                    'lease_expires_at': now + timedelta(seconds=LEASE_SECONDS),
+                    'started_at': now,
+                    'updated_at': now
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('run_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def execute(job):
+        """Run a claimed job and record success, retry or failure"""
+        db = current_app.mongo.db
+        handler = JOB_HANDLERS.get(job['job_type'])
+
+        try:
+            if not handler:
+                raise RuntimeError(f"No handler registered for job type {job['job_type']}")
+
+            handler(JobContext(job), **job.get('payload', {}))
+
+            result = db.jobs.update_one(
+                lease_filter(job),
+                {'$set': {
+                    'status': 'completed',
+                    'error': None,
+                    'lease_expires_at': None,
+                    'finished_at': datetime.utcnow(),
+                    'updated_at': datetime.utcnow()
+                }}
+            )
+            if result.matched_count:
+                logger.info(f"Job {job['_id']} ({job['job_type']}) completed")
+            else:
+                logger.warning(f"Job {job['_id']} ({job['job_type']}) finished after its lease was lost, status left to the new owner")
+
+        except JobLeaseLost as e:
+            logger.warning(f"Job {job['_id']} ({job['job_type']}) stopped: {str(e)}")
+
+        except Exception as e:
+            logger.error(f"Job {job['_id']} ({job['job_type']}) failed on attempt {job['attempts']}: {str(e)}")
+            update = {
+                'error': str(e),
+                'lease_expires_at': None,
+                'updated_at': datetime.utcnow()
+            }
+            if job['attempts'] < job.get('max_attempts', DEFAULT_MAX_ATTEMPTS):
+                delay = RETRY_BASE_SECONDS * (2 ** (job['attempts'] - 1))
+                update['status'] = 'pending'
+                update['run_at'] = datetime.utcnow() + timedelta(seconds=delay)
+            else:
+                update['status'] = 'failed'
+                update['finished_at'] = datetime.utcnow()
+            # A reclaimed job's outcome belongs to the worker that holds it now
+            db.jobs.update_one(lease_filter(job), {'$set': update})
+
+    @staticmethod
+    def get_job(job_id):
+        """Get a job document"""
+        try:
+            return current_app.mongo.db.jobs.find_one({'_id': ObjectId(job_id)})
+        except Exception as e:
+            logger.error(f"Error getting job: {str(e)}")
+            return None
+
+    @staticmethod
+    def get_recent_jobs(status=None, job_type=None, page=1, per_page=50):
+        """Get paginated jobs, newest first"""
+        try:
+            query = {}
+            if status:
+                query['status'] = status
+            if job_type:
+                query['job_type'] = job_type
+
+            skip = (page - 1) * per_page
+            jobs = list(current_app.mongo.db.jobs.find(query, {'payload': 0})
+                        .sort('created_at', -1)
+                        .skip(skip)
+                        .limit(per_page))
+            total_jobs = current_app.mongo.db.jobs.count_documents(query)
+            return jobs, total_jobs
+
+        except Exception as e:
+            logger.error(f"Error getting jobs: {str(e)}")
+            return [], 0
+
+    @staticmethod
+    def retry_job(job_id):
+        """Requeue a failed or cancelled job for immediate execution"""
+        try:
+            result = current_app.mongo.db.jobs.update_one(
+                {'_id': ObjectId(job_id), 'status': {'$in': ['failed', 'cancelled']}},
+                {'$set': {
+                    'status': 'pending',
+                    'attempts': 0,
+                    'run_at': datetime.utcnow(),
+                    'error': None,
+                    'finished_at': None,
+                    'updated_at': datetime.utcnow()
+                }}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Error retrying job: {str(e)}")
+            return False
+
+    @staticmethod
+    def cancel_job(job_id):
+        """Cancel a job that has not started yet"""
+        try:
+            result = current_app.mongo.db.jobs.update_one(
+                {'_id': ObjectId(job_id), 'status': 'pending'},
+                {'$set': {
+                    'status': 'cancelled',
+                    'finished_at': datetime.utcnow(),
+                    'updated_at': datetime.utcnow()
+                }}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Error cancelling job: {str(e)}")
+            return False
+
+    @staticmethod
+    def serialize(job):
+        """Convert a job document into a JSON-friendly dict"""
+        return {
+            'id': str(job['_id']),
+            'job_type': job['job_type'],
+            'status': job['status'],
+            'attempts': job.get('attempts', 0),
+            'max_attempts': job.get('max_attempts', DEFAULT_MAX_ATTEMPTS),
+            'progress': job.get('progress', {}),
+            'result': job.get('result'),
+            'error': job.get('error'),
+            'created_at': job['created_at'].isoformat() if job.get('created_at') else None,
+            'updated_at': job['updated_at'].isoformat() if job.get('updated_at') else None,
+            'finished_at': job['finished_at'].isoformat() if job.get('finished_at') else None
+        }
+
+
+class JobWorker:
+    """Polls the job queue and runs claimed jobs on a thread pool"""
+
+    def __init__(self, app, max_workers=2):
+        self.app = app
+        self.max_workers = max_workers
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.slots = threading.Semaphore(max_workers)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._poll, name='job-poller', daemon=True)
+        self.thread.start()
+        logger.info(f"Job worker {self.name} started with {self.max_workers} threads")
+
+    def stop(self):
+        self.stop_event.set()
+        self.executor.shutdown(wait=False)
+
+    def _poll(self):
+        while not self.stop_event.is_set():
+            self.slots.acquire()
+            job = None
+            try:
+                with self.app.app_context():
+                    job = JobQueue.claim_next(self.name)
+            except Exception as e:
+                logger.error(f"Job worker poll failed: {str(e)}")
+
+            if job:
+                self.executor.submit(self._run, job)
+            else:
+                self.slots.release()
+                self.stop_event.wait(POLL_INTERVAL_SECONDS)
+
+    def _run(self, job):
+        try:
+            with self.app.app_context():
+                JobQueue.execute(job)
+        finally:
+            self.slots.release()
+
+
+def init_job_worker(app):
+    """Start the background job worker unless disabled in config"""
+    if not app.config.get('JOB_WORKER_ENABLED', True):
+        logger.info("Job worker disabled")
+        return None
+    worker = JobWorker(app, max_workers=app.config.get('JOB_WORKERS', 2))
+    worker.start()
+    app.extensions['job_worker'] = worker
+    return worker
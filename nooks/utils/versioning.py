@@ -0,0 +1,55 @@
+from functools import wraps
+from flask import current_app, request, make_response
+from flask_login import current_user
+from bson import ObjectId
+from datetime import datetime
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def bump_data_version(user_id):
+    """Mark a user's books, tasks, rewards or quotes as changed"""
+    try:
+        current_app.mongo.db.users.update_one({'_id': ObjectId(user_id)}, {'$inc': {'data_version': 1}})
+    except Exception as e:
+        logger.error(f"Error bumping data version for user {user_id}: {str(e)}")
+
+
+def get_data_version(user_id):
+    """Current data version of a user, 0 until their first tracked write"""
+    user = current_app.mongo.db.users.find_one({'_id': ObjectId(user_id)}, {'data_version': 1})
+    return (user or {}).get('data_version', 0)
+
+
+def etag_by_data_version(daily=False):
+    """Serve a user's JSON with an ETag built from their data version.
+
+    A matching If-None-Match is answered with 304 before the view runs,
+    from the data version loaded with the signed-in user, so the 304 path
+    issues no query of its own (see utils/etag_query_check.py). Views
+    reporting "today" or streak figures pass ``daily=True`` so the tag also
+    turns over at midnight.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            version = getattr(current_user, 'data_version', None)
+            if version is None:
+                version = get_data_version(current_user.id)
+            parts = [request.endpoint, current_user.id, str(version)]
+            if daily:
+                parts.append(datetime.now().strftime('%Y-%m-%d'))
+            etag = hashlib.sha1(':'.join(parts).encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.set_etag(etag, weak=True)
+            # Browsers must revalidate, which is exactly the cheap path above
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator